@@ -0,0 +1,272 @@
+"""Fake package manager executables used by the unipkg benchmarks
+
+The benchmark harness writes small wrapper scripts named apt, apt-get, apt-cache, dpkg-query,
+pip, pip3 and npm into a temporary directory on PATH, each calling main() below. Output is generated
+from a synthetic catalog that only depends on its size, so every run sees identical data.
+
+The fakes are configured through environment variables:
+
+UNIPKG_BENCH_PACKAGES
+    Number of packages in the synthetic catalog, default 1000
+UNIPKG_BENCH_LATENCY
+    Seconds each invocation sleeps before producing output, default 0
+"""
+
+import os
+import sys
+import json
+import time
+from typing import Iterator, List, Tuple
+
+PREFIXES = ['lib', 'py', 'node', 'python3-', 'x', 'g', 'k', 'open', 'fast', 'micro', 'gnu', 'net']
+WORDS = ['core', 'tool', 'util', 'json', 'http', 'crypt', 'image', 'audio', 'video', 'data', 'stream', 'parse',
+         'config', 'log', 'test', 'cache', 'sql', 'xml', 'yaml', 'font', 'ssl', 'zip', 'math', 'text',
+         'term', 'cli', 'async', 'graph', 'shell', 'proto', 'mail', 'auth']
+
+# Every INSTALLED_EVERY-th catalog package is reported as installed
+INSTALLED_EVERY = 10
+
+# Every OUTDATED_EVERY-th installed package is installed at an older version than the catalog has
+OUTDATED_EVERY = 3
+
+# Search results stop after this many rows, like the real tools do for very broad keys
+MAX_SEARCH_RESULTS = 100000
+
+
+def get_catalog_size() -> int:
+    return int(os.environ.get('UNIPKG_BENCH_PACKAGES', '1000'))
+
+
+def get_package(index : int) -> Tuple[str, str, str]:
+    """Function that gets the (name, version, description) of a catalog package, derived from its index only
+    """
+
+    name = f'{PREFIXES[index % len(PREFIXES)]}{WORDS[(index * 7) % len(WORDS)]}-{index}'
+    version = f'{index % 7}.{index % 13}.{index % 31}'
+    description = f'{WORDS[(index * 3) % len(WORDS)]} and {WORDS[(index * 5) % len(WORDS)]} support for {WORDS[(index * 11) % len(WORDS)]}'
+    return name, version, description
+
+
+def iter_catalog(size : int=None) -> Iterator[Tuple[str, str, str]]:
+    size = get_catalog_size() if size is None else size
+    for index in range(size):
+        yield get_package(index)
+
+
+def iter_installed(size : int=None) -> Iterator[Tuple[str, str, str]]:
+    size = get_catalog_size() if size is None else size
+    for index in range(0, size, INSTALLED_EVERY):
+        name, version, description = get_package(index)
+        if is_outdated(index):
+            # Older than the catalog version for dpkg, which is the only version ordering unipkg computes itself
+            version = f'{version}~rc1'
+        yield name, version, description
+
+
+def is_outdated(index : int) -> bool:
+    return index % (INSTALLED_EVERY * OUTDATED_EVERY) == 0
+
+
+def iter_outdated(size : int=None) -> Iterator[Tuple[str, str, str]]:
+    """Generator yielding (name, installed version, catalog version) for every installed package with a newer catalog version
+    """
+
+    size = get_catalog_size() if size is None else size
+    for index in range(0, size, INSTALLED_EVERY * OUTDATED_EVERY):
+        name, version, _ = get_package(index)
+        yield name, f'{version}~rc1', version
+
+
+def iter_matches(search_key : str, size : int=None) -> Iterator[Tuple[int, str, str, str]]:
+    terms = search_key.lower().split()
+    num_found = 0
+    for index, (name, version, description) in enumerate(iter_catalog(size)):
+        haystack = f'{name} {description}'
+        if all(term in haystack for term in terms):
+            yield index, name, version, description
+            num_found += 1
+            if num_found >= MAX_SEARCH_RESULTS:
+                return
+
+
+def write_apt_lists(lists_dir : str, size : int) -> None:
+    """Function that writes the catalog as an apt lists directory, for use with unipkg.indexes.AptCatalogIndex
+    """
+
+    os.makedirs(lists_dir, exist_ok=True)
+    with open(os.path.join(lists_dir, 'bench.example_dists_stable_main_binary-amd64_Packages'), 'w') as lists_fp:
+        for name, version, description in iter_catalog(size):
+            lists_fp.write(f'Package: {name}\nVersion: {version}\nDescription: {description}\n\n')
+
+
+def write_dpkg_status(status_file : str, size : int) -> None:
+    """Function that writes the installed packages as a dpkg status file, for use with unipkg.indexes.DpkgStatusIndex
+    """
+
+    os.makedirs(os.path.dirname(status_file), exist_ok=True)
+    with open(status_file, 'w') as status_fp:
+        for name, version, description in iter_installed(size):
+            status_fp.write(f'Package: {name}\nStatus: install ok installed\nVersion: {version}\nDescription: {description}\n\n')
+
+
+def write_node_modules(root_dir : str, size : int) -> None:
+    """Function that writes the installed packages as a global node_modules directory, for use with unipkg.indexes.NpmGlobalIndex
+    """
+
+    for name, version, description in iter_installed(size):
+        package_dir = os.path.join(root_dir, name)
+        os.makedirs(package_dir, exist_ok=True)
+        with open(os.path.join(package_dir, 'package.json'), 'w') as manifest_fp:
+            json.dump({'name' : name, 'version' : version, 'description' : description}, manifest_fp)
+
+
+def write_site_packages(site_dir : str, size : int) -> None:
+    """Function that writes the installed packages as *.dist-info directories, for use with unipkg.indexes.PythonDistIndex
+    """
+
+    for name, version, description in iter_installed(size):
+        dist_info_dir = os.path.join(site_dir, f'{name.replace("-", "_")}-{version}.dist-info')
+        os.makedirs(dist_info_dir, exist_ok=True)
+        with open(os.path.join(dist_info_dir, 'METADATA'), 'w') as metadata_fp:
+            metadata_fp.write(f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\nSummary: {description}\nRequires-Dist: {WORDS[0]}\n\n{description}\n')
+
+
+def write_simple_index(index_file : str, size : int) -> None:
+    """Function that writes the catalog as a PEP 691 json simple index page, for use with unipkg.simple_index.SimpleNameIndex
+    """
+
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    with open(index_file, 'w') as index_fp:
+        json.dump({'meta' : {'api-version' : '1.0', '_last-serial' : size}, 'projects' : [{'name' : name} for name, _, _ in iter_catalog(size)]}, index_fp)
+
+
+def run_transaction(tool : str, package_names : List[str]) -> int:
+    for name in package_names:
+        if name.startswith('broken'):
+            print(f'E: Unable to locate package {name}')
+            return 100
+    for name in package_names:
+        print(f'{tool}: processing {name}')
+    return 0
+
+
+def run_apt(args : List[str]) -> int:
+    if args[0] == 'list' and '--upgradable' in args:
+        print('Listing...')
+        for name, installed_version, version in iter_outdated():
+            print(f'{name}/stable {version} amd64 [upgradable from: {installed_version}]')
+        return 0
+    return 100
+
+
+def run_apt_get(args : List[str]) -> int:
+    if args[0] == '--version':
+        print('apt 2.6.1 (amd64)')
+        return 0
+    return run_transaction('apt-get', [arg for arg in args[1:] if not arg.startswith('-')])
+
+
+def run_apt_cache(args : List[str]) -> int:
+    if args[0] == 'search':
+        for _, name, _, description in iter_matches(' '.join(args[1:])):
+            print(f'{name} - {description}')
+        return 0
+    elif args[0] == 'show':
+        catalog = {name : (version, description) for name, version, description in iter_catalog()}
+        missing = [name for name in args[1:] if name not in catalog]
+        if len(missing) > 0:
+            print('E: No packages found')
+            return 100
+        for name in args[1:]:
+            version, description = catalog[name]
+            print(f'Package: {name}\nVersion: {version}\nPriority: optional\nSection: bench\nDescription: {description}\n')
+        return 0
+    return 100
+
+
+def run_dpkg_query(args : List[str]) -> int:
+    for name, version, _ in iter_installed():
+        print(f'{name}\t{version}\tinstalled')
+    return 0
+
+
+def run_pip(args : List[str]) -> int:
+    if args[0] == '--version':
+        print(f'pip 23.0 from {os.path.dirname(os.path.abspath(__file__))} (python {sys.version_info[0]}.{sys.version_info[1]})')
+        return 0
+    elif args[0] == 'list' and '--outdated' in args:
+        print(json.dumps([{'name' : name, 'version' : installed_version, 'latest_version' : version, 'latest_filetype' : 'wheel'}
+                          for name, installed_version, version in iter_outdated()]))
+        return 0
+    elif args[0] == 'list':
+        for name, version, _ in iter_catalog():
+            print(f'{name}=={version}')
+        return 0
+    elif args[0] == 'search':
+        for index, name, version, description in iter_matches(' '.join(args[1:])):
+            print(f'{name} ({version})  - {description}')
+            if index % INSTALLED_EVERY == 0:
+                print(f'  INSTALLED: {version} (latest)')
+        return 0
+    return run_transaction('pip', [arg for arg in args[1:] if not arg.startswith('-')])
+
+
+def run_npm(args : List[str]) -> int:
+    if args[0] == '--version':
+        print('9.8.1')
+        return 0
+    elif args[0] == 'search':
+        search_key = ' '.join(arg for arg in args[1:] if not arg.startswith('-'))
+        # Same layout as npm 7 and later, one result per line
+        print('[')
+        for position, (_, name, version, description) in enumerate(iter_matches(search_key)):
+            if position > 0:
+                print(',')
+            print(json.dumps({'name' : name, 'version' : version, 'description' : description, 'keywords' : [], 'date' : '2024-01-01T00:00:00.000Z'}))
+        print(']')
+        return 0
+    elif args[0] == 'outdated':
+        outdated = {name : {'current' : installed_version, 'wanted' : version, 'latest' : version, 'location' : ''}
+                    for name, installed_version, version in iter_outdated()}
+        print(json.dumps(outdated, indent=2))
+        return 1 if len(outdated) > 0 else 0
+    return run_transaction('npm', [arg for arg in args[1:] if not arg.startswith('-')])
+
+
+TOOLS = {
+    'apt'           : run_apt,
+    'apt-get'       : run_apt_get,
+    'apt-cache'     : run_apt_cache,
+    'dpkg-query'    : run_dpkg_query,
+    'pip'           : run_pip,
+    'pip3'          : run_pip,
+    'npm'           : run_npm,
+}
+
+
+def main(tool : str, args : List[str]) -> int:
+    time.sleep(float(os.environ.get('UNIPKG_BENCH_LATENCY', '0')))
+    if len(args) == 0:
+        return 1
+    return TOOLS[tool](args)
+
+
+WRAPPER_TEMPLATE = '''#!{python}
+import sys
+sys.path.insert(0, {tools_dir!r})
+import fake_tools
+sys.exit(fake_tools.main({tool!r}, sys.argv[1:]))
+'''
+
+
+def install_fake_tools(bin_dir : str) -> None:
+    """Function that writes an executable wrapper for every fake tool into bin_dir
+    """
+
+    os.makedirs(bin_dir, exist_ok=True)
+    tools_dir = os.path.dirname(os.path.abspath(__file__))
+    for tool in TOOLS:
+        wrapper_path = os.path.join(bin_dir, tool)
+        with open(wrapper_path, 'w') as wrapper_fp:
+            wrapper_fp.write(WRAPPER_TEMPLATE.format(python=sys.executable, tools_dir=tools_dir, tool=tool))
+        os.chmod(wrapper_path, 0o755)
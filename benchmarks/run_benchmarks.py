@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""Benchmark harness for unipkg
+
+Runs searching (per manager, across all of them, and narrowed as you type), listing, checking
+for updates, snapshots and their diffs, ranking, package list updates and applying operations
+against the fake package manager executables in fake_tools.py, for a range of catalog sizes, and
+writes p50/p99 latency and throughput for each case as a json baseline. Given an earlier baseline with --compare, cases
+whose p50 got slower than the tolerance allows are reported, and the exit code is nonzero.
+
+Example:
+
+    python benchmarks/run_benchmarks.py --sizes 1000,10000 --output baseline.json
+    python benchmarks/run_benchmarks.py --sizes 1000,10000 --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from typing import Callable, Dict, List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import fake_tools
+
+DEFAULT_SIZES = [1000, 10000, 200000]
+SEARCH_KEY = 'json'
+
+
+def get_percentile(timings : List[float], percentile : float) -> float:
+    """Function that gets a nearest-rank percentile of a list of timings
+    """
+
+    ordered = sorted(timings)
+    rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure(case : str, manager_name : str, size : int, func : Callable[[], int], repeat : int) -> Dict:
+    """Function that times repeated runs of a benchmark case, after one warm up run
+
+    Parameters
+    ----------
+    func : callable
+        Runs the case once, and returns the number of rows it produced
+
+    Returns
+    -------
+    result : dict
+        Timings in milliseconds, the row count and rows per second at the median
+    """
+
+    result = {'case' : case, 'manager' : manager_name, 'size' : size}
+    try:
+        func()
+        timings = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            rows = func()
+            timings.append(time.perf_counter() - start_time)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        return result
+
+    p50 = get_percentile(timings, 50)
+    result.update({
+        'runs'      : repeat,
+        'rows'      : rows,
+        'p50_ms'    : round(p50 * 1000, 3),
+        'p99_ms'    : round(get_percentile(timings, 99) * 1000, 3),
+        'mean_ms'   : round(sum(timings) / len(timings) * 1000, 3),
+        'rows_per_s': round(rows / p50, 1) if p50 > 0 else None,
+    })
+    return result
+
+
+def count_rows(ret) -> int:
+    """Function that checks the (packages, ..., err) tuple returned by a PackageManager, and counts the packages
+    """
+
+    if ret is None:
+        raise NotImplementedError('not supported by this manager')
+    if ret[0] is None:
+        raise RuntimeError(ret[1])
+    return len(ret[0])
+
+
+def get_managers(work_dir : str, size : int) -> Dict:
+    """Function that creates the benchmarked managers. Apt is run both from its index files, and through apt-cache
+    """
+
+    import unipkg.package_managers as PKG_MANAGERS
+    import unipkg.indexes as IDX
+
+    lists_dir = os.path.join(work_dir, f'lists-{size}')
+    status_file = os.path.join(work_dir, f'status-{size}')
+    fake_tools.write_apt_lists(lists_dir, size)
+    fake_tools.write_dpkg_status(status_file, size)
+    node_modules_dir = os.path.join(work_dir, f'node_modules-{size}')
+    fake_tools.write_node_modules(node_modules_dir, size)
+    site_dir = os.path.join(work_dir, f'site-packages-{size}')
+    fake_tools.write_site_packages(site_dir, size)
+    # pip searches a local copy of the simple index, the stand-in index is a json page on disk
+    simple_index_file = os.path.join(work_dir, f'simple-{size}.json')
+    fake_tools.write_simple_index(simple_index_file, size)
+    os.environ['PIP_INDEX_URL'] = simple_index_file
+
+    apt_index = PKG_MANAGERS.Aptitude()
+    apt_index.catalog_index = IDX.AptCatalogIndex(lists_dir, architecture='amd64')
+    apt_index.status_index = IDX.DpkgStatusIndex(status_file)
+
+    apt_cache = PKG_MANAGERS.Aptitude()
+    apt_cache.catalog_index = IDX.AptCatalogIndex(os.path.join(work_dir, 'no-lists'))
+    apt_cache.status_index = IDX.DpkgStatusIndex(os.path.join(work_dir, 'no-status'))
+
+    pip = PKG_MANAGERS.Pip('pip')
+    pip._dist_index = IDX.PythonDistIndex([site_dir])
+
+    npm = PKG_MANAGERS.Npm('npm')
+    npm._global_index = IDX.NpmGlobalIndex(node_modules_dir)
+
+    return {
+        'apt-index' : apt_index,
+        'apt-cache' : apt_cache,
+        'pip'       : pip,
+        'npm'       : npm,
+    }
+
+
+def run_manager_cases(work_dir : str, size : int, repeat : int) -> List[Dict]:
+    results = []
+    managers = get_managers(work_dir, size)
+    for manager_name, manager in managers.items():
+        results.append(measure('search_for_packages', manager_name, size, lambda : count_rows(manager.search_for_packages(SEARCH_KEY)), repeat))
+        if not manager_name.startswith('apt'):
+            results.append(measure('list_packages', manager_name, size, lambda : count_rows(manager.list_packages()), repeat))
+        results.append(measure('get_outdated_packages', manager_name, size, lambda : count_rows(manager.get_outdated_packages()), repeat))
+
+    # Every manager at once, through the engine behind the Update button, with results reused while nothing changes
+    import unipkg.updates as UPD
+    all_managers = [managers[name] for name in ['apt-index', 'pip', 'npm']]
+    results.append(measure('check_updates', 'apt+pip+npm', size, lambda : sum(len(outdated) for outdated in UPD.UpdateChecker(ttl=0).check(all_managers)[0].values()), repeat))
+    update_checker = UPD.UpdateChecker()
+    results.append(measure('check_updates_unchanged', 'apt+pip+npm', size, lambda : sum(len(outdated) for outdated in update_checker.check(all_managers)[0].values()), repeat))
+
+    import unipkg.search as SEARCH
+    results.append(measure('search_all', 'apt+pip+npm', size, lambda : len(SEARCH.search_all(all_managers, SEARCH_KEY)[0]), repeat))
+
+    # Search-as-you-type answers a refined key from the results of the shorter one, ex. jso -> json
+    base_packages = managers['apt-index'].search_for_packages(SEARCH_KEY[:-1])[0]
+    results.append(measure('narrow_results', 'apt-index', size, lambda : len(SEARCH.narrow_results(base_packages, SEARCH_KEY)), repeat))
+
+    # Snapshots record every manager at once, diffs compare the whole catalog against the live installed index
+    import unipkg.snapshot as SNAP
+    results.append(measure('take_snapshot', 'apt+pip+npm', size, lambda : sum(len(packages) for packages in SNAP.take_snapshot(all_managers)[0]['managers'].values()), repeat))
+    wanted = {name : version for name, version, _ in fake_tools.iter_catalog(size)}
+    apt_manager = managers['apt-index']
+    results.append(measure('diff_packages', 'apt-index', size, lambda : len(SNAP.diff_packages('apt', wanted, apt_manager.get_installed_versions())), repeat))
+
+    names = [name for name, _, _ in fake_tools.iter_catalog(size)]
+    pip_manager = managers['pip']
+    results.append(measure('get_best_match_packages', 'pip', size, lambda : len(pip_manager.get_best_match_packages(names, SEARCH_KEY)), repeat))
+    return results
+
+
+def create_tui_manager():
+    """Function that creates a UniPkgManager on a py_cui root that is never started
+    """
+
+    import py_cui
+    import unipkg
+
+    return unipkg.UniPkgManager(py_cui.PyCUI(7, 7))
+
+
+def run_update_list_case(size : int, repeat : int) -> Dict:
+    import unipkg
+    import unipkg.packages as PKG
+
+    manager = create_tui_manager()
+    manager.active_package_manager = unipkg.supported_package_managers['pip']
+    packages = [PKG.PipPackage(name, version, description, False) for name, version, description in fake_tools.iter_catalog(size)]
+
+    def update_package_selection_list():
+        manager.update_package_selection_list(packages)
+        return len(packages)
+
+    result = measure('update_package_selection_list', 'pip', size, update_package_selection_list, repeat)
+    manager.shutdown()
+    return result
+
+
+def run_apply_case(num_apply_ops : int, repeat : int) -> Dict:
+    import unipkg
+    import unipkg.operations as OPS
+
+    manager = create_tui_manager()
+
+    def apply_op():
+        # Half the operations go to apt and half to pip, so they are scheduled on two lock chains
+        manager.marked_ops.clear()
+        for index, (name, version, description) in enumerate(fake_tools.iter_catalog(num_apply_ops)):
+            package_manager = unipkg.supported_package_managers['apt' if index % 2 == 0 else 'pip']
+            pkg = package_manager.package_class(name, version, description, False)
+            manager.marked_ops.add(OPS.PackageOp(pkg, OPS.OP_INSTALL, package_manager))
+        manager.root.show_loading_bar_popup('Applying...', len(manager.marked_ops))
+        manager.apply_op()
+        if len(manager.marked_ops) > 0:
+            raise RuntimeError(f'{len(manager.marked_ops)} operations were not applied')
+        return num_apply_ops
+
+    result = measure('apply_op', 'apt+pip', num_apply_ops, apply_op, repeat)
+    manager.shutdown()
+    return result
+
+
+def compare_results(results : List[Dict], baseline_file : str, tolerance : float) -> List[str]:
+    """Function that lists the cases whose p50 regressed by more than tolerance against a baseline
+    """
+
+    with open(baseline_file, 'r') as baseline_fp:
+        baseline = json.load(baseline_fp)
+    baseline_results = {(result['case'], result['manager'], result['size']) : result for result in baseline['results']}
+
+    regressions = []
+    for result in results:
+        old_result = baseline_results.get((result['case'], result['manager'], result['size']))
+        if old_result is None or 'p50_ms' not in old_result or 'p50_ms' not in result:
+            continue
+        if result['p50_ms'] > old_result['p50_ms'] * (1 + tolerance):
+            regressions.append(f'{result["case"]} ({result["manager"]}, {result["size"]}): p50 {old_result["p50_ms"]} ms -> {result["p50_ms"]} ms')
+    return regressions
+
+
+def parse_args(args : List[str]=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark unipkg against fake package manager executables.')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES), help='Comma separated catalog sizes')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds each fake tool invocation sleeps')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case')
+    parser.add_argument('--apply-ops', type=int, default=100, help='Number of operations applied by the apply_op case')
+    parser.add_argument('--skip-tui', action='store_true', help='Skip the cases that need py_cui')
+    parser.add_argument('--output', help='Write the json baseline here instead of stdout')
+    parser.add_argument('--compare', help='Baseline json to check for regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p50 slowdown when comparing')
+    return parser.parse_args(args)
+
+
+def main(args : List[str]=None) -> int:
+    args = parse_args(args)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    work_dir = tempfile.mkdtemp(prefix='unipkg-bench-')
+    bin_dir = os.path.join(work_dir, 'bin')
+    fake_tools.install_fake_tools(bin_dir)
+    os.environ['PATH'] = f'{bin_dir}{os.pathsep}{os.environ.get("PATH", "")}'
+    os.environ['XDG_CACHE_HOME'] = os.path.join(work_dir, 'cache')
+    os.environ['UNIPKG_BENCH_LATENCY'] = str(args.latency)
+
+    results = []
+    try:
+        for size in sizes:
+            os.environ['UNIPKG_BENCH_PACKAGES'] = str(size)
+            results.extend(run_manager_cases(work_dir, size, args.repeat))
+            if not args.skip_tui:
+                results.append(run_update_list_case(size, args.repeat))
+            sys.stderr.write(f'Finished catalog size {size}\n')
+        if not args.skip_tui:
+            # Transactions do not depend on the catalog size, so they are only measured once
+            results.append(run_apply_case(args.apply_ops, args.repeat))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta' : {
+            'python'    : platform.python_version(),
+            'platform'  : platform.platform(),
+            'sizes'     : sizes,
+            'latency'   : args.latency,
+            'repeat'    : args.repeat,
+            'search_key': SEARCH_KEY,
+        },
+        'results' : results,
+    }
+    report_str = json.dumps(report, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as output_fp:
+            output_fp.write(report_str + '\n')
+    else:
+        print(report_str)
+
+    if args.compare is not None:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        for regression in regressions:
+            sys.stderr.write(f'Regression: {regression}\n')
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import unipkg.command_handler as EXE
+import unipkg.operations as OPS
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.packages as PKG
+
+
+class FakeManager:
+    """Manager whose transactions fail whenever they include a broken package"""
+
+    def __init__(self, name : str, broken=(), lock_name : str=None):
+        self.name = name
+        self.broken = set(broken)
+        self.lock_name = name if lock_name is None else lock_name
+        self.transactions = []
+
+    def get_lock_name(self) -> str:
+        return self.lock_name
+
+    def apply_packages(self, op, packages, password, as_admin=False):
+        names = [pkg.name for pkg in packages]
+        self.transactions.append((op, names))
+        broken = [name for name in names if name in self.broken]
+        if len(broken) > 0:
+            return f'E: Unable to locate package {broken[0]}', 100
+        return 'ok', 0
+
+
+def create_ops(manager, names, op=OPS.OP_INSTALL):
+    return [OPS.PackageOp(PKG.Package(name, '', '', False), op, manager) for name in names]
+
+
+def test_apply_batch_single_transaction_when_everything_succeeds():
+    manager = FakeManager('apt')
+    package_ops = create_ops(manager, ['a', 'b', 'c'])
+    results = []
+
+    succeeded, failed = OPS.apply_batch(manager, OPS.OP_INSTALL, package_ops, None, on_result=lambda *result : results.append(result[:2]))
+
+    assert succeeded == package_ops
+    assert failed == []
+    assert manager.transactions == [(OPS.OP_INSTALL, ['a', 'b', 'c'])]
+    assert results == [(package_op, True) for package_op in package_ops]
+
+
+def test_apply_batch_bisects_to_the_broken_package():
+    names = [f'pkg{index}' for index in range(8)]
+    manager = FakeManager('apt', broken=['pkg2'])
+    package_ops = create_ops(manager, names)
+
+    succeeded, failed = OPS.apply_batch(manager, OPS.OP_INSTALL, package_ops, None)
+
+    assert [package_op.pkg.name for package_op in succeeded] == [name for name in names if name != 'pkg2']
+    assert [(package_op.pkg.name, out) for package_op, out in failed] == [('pkg2', 'E: Unable to locate package pkg2')]
+    # One failed transaction per level of the bisection, plus its successful sibling
+    assert manager.transactions == [
+        (OPS.OP_INSTALL, names),
+        (OPS.OP_INSTALL, names[:4]),
+        (OPS.OP_INSTALL, names[:2]),
+        (OPS.OP_INSTALL, names[2:4]),
+        (OPS.OP_INSTALL, ['pkg2']),
+        (OPS.OP_INSTALL, ['pkg3']),
+        (OPS.OP_INSTALL, names[4:]),
+    ]
+
+
+def test_apply_batch_reports_every_broken_package():
+    manager = FakeManager('pip', broken=['b', 'e'])
+    succeeded, failed = OPS.apply_batch(manager, OPS.OP_INSTALL, create_ops(manager, ['a', 'b', 'c', 'd', 'e']), None)
+
+    assert [package_op.pkg.name for package_op in succeeded] == ['a', 'c', 'd']
+    assert [package_op.pkg.name for package_op, _ in failed] == ['b', 'e']
+
+
+def test_apply_batch_empty():
+    manager = FakeManager('apt')
+    assert OPS.apply_batch(manager, OPS.OP_INSTALL, [], None) == ([], [])
+    assert manager.transactions == []
+
+
+def test_group_package_ops_orders_removals_first_per_manager():
+    apt, pip = FakeManager('apt'), FakeManager('pip')
+    package_ops = (create_ops(apt, ['a'], OPS.OP_INSTALL) + create_ops(pip, ['p'], OPS.OP_UPDATE)
+                   + create_ops(apt, ['b'], OPS.OP_UNINSTALL) + create_ops(apt, ['c'], OPS.OP_INSTALL))
+
+    groups = OPS.group_package_ops(package_ops)
+
+    assert [(manager.name, op, [package_op.pkg.name for package_op in ops]) for manager, op, ops in groups] == [
+        ('apt', OPS.OP_UNINSTALL, ['b']),
+        ('apt', OPS.OP_INSTALL, ['a', 'c']),
+        ('pip', OPS.OP_UPDATE, ['p']),
+    ]
+
+
+def test_apt_batch_is_one_command(monkeypatch):
+    commands = []
+    monkeypatch.setattr(EXE, 'execute_command', lambda command, as_admin, **kwargs : commands.append((command, as_admin)) or ('', 0))
+    apt = PKG_MANAGERS.Aptitude()
+    package_ops = create_ops(apt, ['jq', 'curl']) + create_ops(apt, ['vim'], OPS.OP_UNINSTALL)
+
+    succeeded, failed = OPS.apply_scheduled(OPS.group_package_ops(package_ops), 'secret')
+
+    assert len(succeeded) == 3 and failed == []
+    assert commands == [('apt-get remove -y vim', False), ('apt-get install -y jq curl', False)]
@@ -0,0 +1,120 @@
+import os
+import time
+import threading
+
+import unipkg.command_handler as EXE
+import unipkg.operations as OPS
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.packages as PKG
+
+
+class FakeManager:
+    """Manager whose transactions fail whenever they include a broken package"""
+
+    def __init__(self, name : str, broken=(), lock_name : str=None):
+        self.name = name
+        self.broken = set(broken)
+        self.lock_name = name if lock_name is None else lock_name
+        self.transactions = []
+
+    def get_lock_name(self) -> str:
+        return self.lock_name
+
+    def apply_packages(self, op, packages, password, as_admin=False):
+        names = [pkg.name for pkg in packages]
+        self.transactions.append((op, names))
+        broken = [name for name in names if name in self.broken]
+        if len(broken) > 0:
+            return f'E: Unable to locate package {broken[0]}', 100
+        return 'ok', 0
+
+
+def create_ops(manager, names, op=OPS.OP_INSTALL):
+    return [OPS.PackageOp(PKG.Package(name, '', '', False), op, manager) for name in names]
+
+
+def test_apply_scheduled_runs_every_group():
+    apt, pip = FakeManager('apt', broken=['x']), FakeManager('pip')
+    package_ops = create_ops(apt, ['a', 'x']) + create_ops(apt, ['r'], OPS.OP_UNINSTALL) + create_ops(pip, ['p'])
+
+    succeeded, failed = OPS.apply_scheduled(OPS.group_package_ops(package_ops), None)
+
+    assert sorted(package_op.pkg.name for package_op in succeeded) == ['a', 'p', 'r']
+    assert [package_op.pkg.name for package_op, _ in failed] == ['x']
+    assert apt.transactions[0] == (OPS.OP_UNINSTALL, ['r'])
+
+
+def test_get_distinct_managers_keeps_first_per_lock():
+    pip = FakeManager('pip', lock_name='pip:/usr/bin/python3')
+    pip3 = FakeManager('pip3', lock_name='pip:/usr/bin/python3')
+    npm = FakeManager('npm')
+
+    assert OPS.get_distinct_managers([pip, npm, pip3]) == [pip, npm]
+
+
+def test_pip_interpreter_from_env_shebang(tmp_path, monkeypatch):
+    interpreter = tmp_path / 'python3.11'
+    interpreter.write_bytes(b'\x7fELF')
+    pip_script = tmp_path / 'pip'
+    pip_script.write_text('#!/usr/bin/env -S python3 -E\n')
+    shim = tmp_path / 'pip3'
+    shim.write_text('#!/usr/bin/env bash\nexec pyenv exec pip3 "$@"\n')
+    paths = {'pip' : str(pip_script), 'pip3' : str(shim), 'python3' : str(interpreter), 'bash' : '/bin/bash'}
+    monkeypatch.setattr(PKG_MANAGERS.shutil, 'which', paths.get)
+
+    assert PKG_MANAGERS.Pip('pip').get_interpreter() == os.path.realpath(str(interpreter))
+    assert PKG_MANAGERS.Pip('pip').get_lock_name() == f'pip:{os.path.realpath(str(interpreter))}'
+    # A shell wrapper says nothing about the environment, so it keeps a lock of its own
+    assert PKG_MANAGERS.Pip('pip3').get_interpreter() is None
+    assert PKG_MANAGERS.Pip('pip3').get_lock_name() == 'pip3'
+
+
+class SlowManager(FakeManager):
+    """Manager whose transactions take a while, recording how many ran at once overall and per lock"""
+
+    active = {}
+    peaks = {}
+    lock = threading.Lock()
+
+    def apply_packages(self, op, packages, password, as_admin=False):
+        with SlowManager.lock:
+            SlowManager.active[self.lock_name] = SlowManager.active.get(self.lock_name, 0) + 1
+            SlowManager.peaks[self.lock_name] = max(SlowManager.peaks.get(self.lock_name, 0), SlowManager.active[self.lock_name])
+        time.sleep(0.3)
+        with SlowManager.lock:
+            SlowManager.active[self.lock_name] -= 1
+        return super().apply_packages(op, packages, password, as_admin=as_admin)
+
+
+def test_apply_scheduled_runs_independent_locks_in_parallel():
+    SlowManager.active.clear()
+    SlowManager.peaks.clear()
+    apt, dpkg = SlowManager('apt', lock_name='dpkg'), SlowManager('snap-apt', lock_name='dpkg')
+    pip, npm = SlowManager('pip'), SlowManager('npm')
+    package_ops = create_ops(apt, ['a']) + create_ops(dpkg, ['d']) + create_ops(pip, ['p']) + create_ops(npm, ['n'])
+    start = time.monotonic()
+
+    succeeded, failed = OPS.apply_scheduled(OPS.group_package_ops(package_ops), None)
+
+    elapsed = time.monotonic() - start
+    assert len(succeeded) == 4 and failed == []
+    # The two dpkg groups run one after another, alongside pip and npm
+    assert SlowManager.peaks == {'dpkg' : 1, 'pip' : 1, 'npm' : 1}
+    assert 0.55 <= elapsed < 1.1
+
+
+def test_apply_scheduled_workers_join_the_callers_operation():
+    engine = EXE.get_engine()
+    seen = []
+
+    class RecordingManager(FakeManager):
+        def apply_packages(self, op, packages, password, as_admin=False):
+            seen.append(engine.get_current_operation())
+            return super().apply_packages(op, packages, password, as_admin=as_admin)
+
+    apt, pip = RecordingManager('apt'), RecordingManager('pip')
+    groups = OPS.group_package_ops(create_ops(apt, ['a']) + create_ops(pip, ['p']))
+    operation = engine.submit_operation(lambda : OPS.apply_scheduled(groups, None), group='apply')
+    operation.future.result(timeout=5)
+
+    assert seen == [operation, operation]
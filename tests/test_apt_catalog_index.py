@@ -0,0 +1,87 @@
+import os
+
+import unipkg.command_handler as EXE
+import unipkg.indexes as IDX
+import unipkg.package_managers as PKG_MANAGERS
+
+
+def write_file(file_path, text):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file_fp:
+        file_fp.write(text)
+
+
+def test_apt_catalog_index_picks_newest_version_across_suites(tmp_path):
+    lists_dir = str(tmp_path / 'lists')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable_main_binary-amd64_Packages'),
+               'Package: curl\nVersion: 7.88.1-10\nDescription: command line tool for transferring data\n\n'
+               'Package: jq\nVersion: 1.6-2\nDescription-md5: 0123\n\n')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable-updates_main_binary-amd64_Packages'),
+               'Package: curl\nVersion: 7.88.1-10+deb12u1\nDescription: command line tool for transferring data\n\n'
+               'Package: jq\nVersion: 1.6-2~bpo1\n\n')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable_main_i18n_Translation-en'),
+               'Package: jq\nDescription-md5: 0123\nDescription-en: lightweight JSON processor\n\n')
+    index = IDX.AptCatalogIndex(lists_dir, architecture='amd64')
+
+    assert index.is_available()
+    assert index.get('curl') == ('7.88.1-10+deb12u1', 'command line tool for transferring data')
+    assert index.get('jq') == ('1.6-2', 'lightweight JSON processor')
+    assert index.get('missing') is None
+
+
+def test_apt_catalog_index_search_needs_every_term(tmp_path):
+    lists_dir = str(tmp_path / 'lists')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable_main_binary-amd64_Packages'),
+               'Package: jq\nVersion: 1.6\nDescription: lightweight JSON processor\n\n'
+               'Package: python3-json5\nVersion: 0.9\nDescription: Python implementation of JSON5\n\n'
+               'Package: curl\nVersion: 7.88\nDescription: transfer tool\n\n')
+    index = IDX.AptCatalogIndex(lists_dir, architecture='amd64')
+
+    assert sorted(name for name, _, _ in index.search('json')) == ['jq', 'python3-json5']
+    assert index.search('JSON processor') == [('jq', '1.6', 'lightweight JSON processor')]
+    assert index.search('json curl') == []
+
+
+def test_apt_parse_search_output():
+    out = 'curl - command line tool for transferring data with URL syntax\n\nlibcurl4 - easy-to-use client-side URL transfer library - runtime\nlonely\n'
+    results = PKG_MANAGERS.Aptitude().parse_search_output(out)
+
+    assert results == [
+        ('curl', '', 'command line tool for transferring data with URL syntax'),
+        ('libcurl4', '', 'easy-to-use client-side URL transfer library - runtime'),
+        ('lonely', '', ''),
+    ]
+
+
+def test_apt_catalog_index_rebuilds_only_when_lists_change(tmp_path):
+    list_file = str(tmp_path / 'lists' / 'deb_dists_stable_main_binary-amd64_Packages')
+    write_file(list_file, 'Package: jq\nVersion: 1.6\n\n')
+    index = IDX.AptCatalogIndex(str(tmp_path / 'lists'), architecture='amd64')
+
+    assert index.refresh()
+    assert not index.refresh()
+
+    write_file(list_file, 'Package: jq\nVersion: 1.7\n\n')
+    os.utime(list_file, (0, 12345))
+    assert index.get('jq') == ('1.7', '')
+
+
+def test_apt_search_uses_the_index_without_apt_cache(tmp_path, monkeypatch):
+    write_file(str(tmp_path / 'lists' / 'deb_dists_stable_main_binary-amd64_Packages'),
+               'Package: libjson-c5\nVersion: 0.16\nDescription: JSON manipulation library\n\n'
+               'Package: jq\nVersion: 1.6-2\nDescription: lightweight JSON processor\n\n'
+               'Package: json-glib-tools\nVersion: 1.6\nDescription: GLib JSON manipulation tools\n\n')
+    write_file(str(tmp_path / 'status'), 'Package: jq\nStatus: install ok installed\nVersion: 1.6-1\n\n')
+    def execute_command(*args, **kwargs):
+        raise AssertionError('apt-cache should not run')
+    monkeypatch.setattr(EXE, 'execute_command', execute_command)
+    apt = PKG_MANAGERS.Aptitude()
+    apt.catalog_index = IDX.AptCatalogIndex(str(tmp_path / 'lists'), architecture='amd64')
+    apt.status_index = IDX.DpkgStatusIndex(str(tmp_path / 'status'))
+
+    packages, _, err = apt.search_for_packages('json')
+
+    assert err == 0
+    # Installed matches come first, with their installed version
+    assert [(pkg.name, pkg.version, pkg.installed) for pkg in packages] == [
+        ('jq', '1.6-1', True), ('json-glib-tools', '1.6', False), ('libjson-c5', '0.16', False)]
@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import subprocess
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+
+
+def run_benchmarks(tmp_path, *args):
+    return subprocess.run([sys.executable, os.path.join(BENCHMARKS_DIR, 'run_benchmarks.py'), '--sizes', '200', '--repeat', '1',
+                           '--apply-ops', '4', *args], capture_output=True, text=True, cwd=str(tmp_path), timeout=120)
+
+
+def test_baseline_covers_every_case_and_is_deterministic(tmp_path):
+    reports = []
+    for name in ['first.json', 'second.json']:
+        result = run_benchmarks(tmp_path, '--output', str(tmp_path / name))
+        assert result.returncode == 0, result.stderr
+        with open(tmp_path / name) as report_fp:
+            reports.append(json.load(report_fp))
+
+    cases = {result['case'] for result in reports[0]['results']}
+    assert {'search_for_packages', 'list_packages', 'get_best_match_packages', 'update_package_selection_list', 'apply_op'} <= cases
+    for result in reports[0]['results']:
+        assert {'p50_ms', 'p99_ms', 'rows_per_s'} <= set(result)
+    # Timings vary between runs, but the synthetic catalog, and so the rows each case handles, does not
+    rows = [[(result['case'], result['manager'], result['rows']) for result in report['results']] for report in reports]
+    assert rows[0] == rows[1]
+
+
+def test_compare_reports_regressions(tmp_path):
+    baseline_file = tmp_path / 'baseline.json'
+    result = run_benchmarks(tmp_path, '--skip-tui', '--output', str(baseline_file))
+    assert result.returncode == 0, result.stderr
+
+    with open(baseline_file) as baseline_fp:
+        baseline = json.load(baseline_fp)
+    for baseline_result in baseline['results']:
+        baseline_result['p50_ms'] = 0.0
+    with open(baseline_file, 'w') as baseline_fp:
+        json.dump(baseline, baseline_fp)
+
+    result = run_benchmarks(tmp_path, '--skip-tui', '--output', str(tmp_path / 'current.json'), '--compare', str(baseline_file))
+    assert result.returncode == 1
+    assert 'Regression: search_for_packages' in result.stderr
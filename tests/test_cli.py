@@ -0,0 +1,153 @@
+import io
+import os
+import sys
+import json
+import subprocess
+
+import unipkg
+import unipkg.cli as CLI
+import unipkg.command_handler as EXE
+import unipkg.indexes as IDX
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.packages as PKG
+
+
+def write_file(file_path, text):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file_fp:
+        file_fp.write(text)
+
+
+def create_apt(tmp_path):
+    status_file = str(tmp_path / 'status')
+    write_file(status_file,
+               'Package: jq\nStatus: install ok installed\nVersion: 1.6-2\nDescription: lightweight and flexible\n\n'
+               'Package: curl\nStatus: install ok installed\nVersion: 7.88.1-10\n\n'
+               'Package: gone\nStatus: deinstall ok config-files\nVersion: 1.0\n\n')
+    lists_dir = str(tmp_path / 'lists')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable_main_binary-amd64_Packages'),
+               'Package: curl\nVersion: 7.88.1-10+deb12u5\nDescription: command line tool for transferring data\n\n')
+    apt = PKG_MANAGERS.Aptitude()
+    apt.status_index = IDX.DpkgStatusIndex(status_file)
+    apt.catalog_index = IDX.AptCatalogIndex(lists_dir, architecture='amd64')
+    return apt
+
+
+def run_cli(monkeypatch, managers, args):
+    monkeypatch.setattr(CLI, 'get_package_manager', lambda manager_name : managers.get(manager_name))
+    out_fp, err_fp = io.StringIO(), io.StringIO()
+    exit_code = CLI.run(unipkg.parse_args(args), out_fp=out_fp, err_fp=err_fp)
+    return exit_code, out_fp.getvalue(), err_fp.getvalue()
+
+
+def test_list_apt_json(tmp_path, monkeypatch):
+    apt = create_apt(tmp_path)
+
+    exit_code, out, err = run_cli(monkeypatch, {'apt' : apt}, ['list', '-m', 'apt', '--json'])
+
+    assert exit_code == 0, err
+    rows = [json.loads(line) for line in out.splitlines()]
+    assert rows == [
+        {'manager' : 'apt', 'name' : 'curl', 'version' : '7.88.1-10', 'description' : 'command line tool for transferring data', 'installed' : True},
+        {'manager' : 'apt', 'name' : 'jq', 'version' : '1.6-2', 'description' : '', 'installed' : True},
+    ]
+
+
+def test_list_apt_text(tmp_path, monkeypatch):
+    apt = create_apt(tmp_path)
+
+    exit_code, out, _ = run_cli(monkeypatch, {'apt' : apt}, ['list', '-m', 'apt'])
+
+    assert exit_code == 0
+    assert [line.split('|')[0].strip() for line in out.splitlines()] == ['curl', 'jq']
+
+
+def test_unavailable_manager(monkeypatch):
+    exit_code, out, err = run_cli(monkeypatch, {}, ['list', '-m', 'apt'])
+
+    assert exit_code == 2
+    assert out == ''
+    assert 'apt is not available' in err
+
+
+class FakeManager:
+
+    package_class = PKG.Package
+
+    def __init__(self, name : str, results=(), broken=(), error : EXE.CommandError=None):
+        self.name = name
+        self.results = list(results)
+        self.broken = set(broken)
+        self.error = error
+        self.transactions = []
+
+    def stream_search_for_packages(self, search_key):
+        if self.error is not None:
+            raise self.error
+        yield [PKG.Package(name, '1.0', f'{name} package', False) for name in self.results[:2]]
+        yield [PKG.Package(name, '1.0', f'{name} package', False) for name in self.results[2:]]
+
+    def apply_packages(self, op, packages, password, as_admin=False):
+        names = [pkg.name for pkg in packages]
+        self.transactions.append((op, names))
+        if any(name in self.broken for name in names):
+            return 'E: Unable to locate package', 100
+        return 'ok', 0
+
+    def get_package_details(self, packages):
+        return {pkg.name : f'{pkg.name} details' for pkg in packages}
+
+
+def test_search_json_with_limit(monkeypatch):
+    npm = FakeManager('npm', ['json', 'jsonnet', 'json5'])
+
+    exit_code, out, _ = run_cli(monkeypatch, {'npm' : npm}, ['search', 'json', '-m', 'npm', '--json', '-n', '2'])
+
+    assert exit_code == 0
+    assert [json.loads(line) for line in out.splitlines()] == [
+        {'manager' : 'npm', 'name' : 'json', 'version' : '1.0', 'description' : 'json package', 'installed' : False},
+        {'manager' : 'npm', 'name' : 'jsonnet', 'version' : '1.0', 'description' : 'jsonnet package', 'installed' : False},
+    ]
+
+
+def test_search_command_error(monkeypatch):
+    npm = FakeManager('npm', error=EXE.CommandError('npm ERR! network\n', 1))
+
+    exit_code, out, err = run_cli(monkeypatch, {'npm' : npm}, ['search', 'json', '-m', 'npm'])
+
+    assert (exit_code, out, err) == (1, '', 'Error: npm ERR! network\n')
+
+
+def test_install_reports_each_package(monkeypatch):
+    pip = FakeManager('pip', broken=['nosuchpkg'])
+
+    exit_code, out, _ = run_cli(monkeypatch, {'pip' : pip}, ['install', 'requests', 'nosuchpkg', '-m', 'pip', '--json'])
+
+    assert exit_code == 1
+    assert [(row['name'], row['op'], row['success']) for row in map(json.loads, out.splitlines())] == [
+        ('requests', 'Install', True), ('nosuchpkg', 'Install', False)]
+    assert pip.transactions[0] == ('Install', ['requests', 'nosuchpkg'])
+
+
+def test_remove_text(monkeypatch):
+    pip = FakeManager('pip')
+
+    exit_code, out, _ = run_cli(monkeypatch, {'pip' : pip}, ['remove', 'requests', '-m', 'pip'])
+
+    assert (exit_code, out) == (0, 'Done: Uninstall requests\n')
+
+
+def test_info_json(monkeypatch):
+    exit_code, out, _ = run_cli(monkeypatch, {'pip' : FakeManager('pip')}, ['info', 'requests', '-m', 'pip', '--json'])
+
+    assert exit_code == 0
+    assert json.loads(out)['info'] == 'requests details'
+
+
+def test_cli_never_imports_py_cui():
+    code = ('import sys, unipkg, unipkg.cli\n'
+            'unipkg.parse_args(["search", "json", "--json"])\n'
+            'assert "py_cui" not in sys.modules and "curses" not in sys.modules, sorted(sys.modules)\n')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,122 @@
+import sys
+import time
+import threading
+
+import pytest
+
+import unipkg.command_handler as EXE
+
+
+@pytest.fixture
+def engine():
+    engine = EXE.CommandEngine(max_concurrent_commands=2)
+    yield engine
+    engine.shutdown()
+
+
+def python_command(tmp_path, name, source):
+    script_file = tmp_path / name
+    script_file.write_text(source)
+    return f'{sys.executable} {script_file}'
+
+
+def test_run_command_returns_stdout_or_stderr(engine, tmp_path):
+    succeeds = python_command(tmp_path, 'ok.py', 'print("hello")\n')
+    fails = python_command(tmp_path, 'fail.py', 'import sys\nprint("ignored")\nsys.stderr.write("bad")\nsys.exit(4)\n')
+
+    assert engine.run_command(succeeds) == ('hello\n', 0)
+    assert engine.run_command(fails) == ('bad', 4)
+    assert engine.run_command('unipkg-no-such-executable')[1] == EXE.ERR_NOT_FOUND
+
+
+def test_run_command_timeout_kills_the_child(engine, tmp_path):
+    command = python_command(tmp_path, 'sleep.py', 'import time\ntime.sleep(30)\n')
+    start = time.monotonic()
+
+    out, err = engine.run_command(command, timeout=0.3)
+
+    assert err == EXE.ERR_TIMEOUT
+    assert 'timed out' in out
+    assert time.monotonic() - start < 10
+
+
+def test_concurrent_commands_are_bounded(engine, tmp_path):
+    command = python_command(tmp_path, 'sleep.py', 'import time\ntime.sleep(0.4)\n')
+    threads = [threading.Thread(target=engine.run_command, args=(command,)) for _ in range(4)]
+    start = time.monotonic()
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Two at a time, so two rounds
+    assert time.monotonic() - start >= 0.75
+
+
+def test_cancel_group_cancels_only_that_group(engine, tmp_path):
+    command = python_command(tmp_path, 'sleep.py', 'import time\ntime.sleep(30)\n')
+    quick = python_command(tmp_path, 'quick.py', 'import time\ntime.sleep(0.5)\nprint("done")\n')
+    results = {}
+    started = threading.Event()
+
+    def slow_op():
+        started.set()
+        try:
+            results['apt'] = engine.run_command(command)
+        except EXE.CommandCancelled as e:
+            results['apt'] = e.err
+        # Commands started by a cancelled operation are refused right away
+        try:
+            engine.run_command(quick)
+        except EXE.CommandCancelled:
+            results['after'] = 'refused'
+
+    def other_op():
+        results['npm'] = engine.run_command(quick)
+
+    apt_op = engine.submit_operation(slow_op, group='apt')
+    npm_op = engine.submit_operation(other_op, group='npm')
+    started.wait(5)
+    time.sleep(0.2)
+
+    assert engine.cancel_group('apt') == 1
+    apt_op.future.result(timeout=10)
+    npm_op.future.result(timeout=10)
+    assert results == {'apt' : EXE.ERR_CANCELLED, 'after' : 'refused', 'npm' : ('done\n', 0)}
+    assert engine.cancel_group('apt') == 0
+
+
+def test_current_operation_is_set_inside_operations(engine):
+    seen = []
+    operation = engine.submit_operation(lambda : seen.append(engine.get_current_operation()), group='pip')
+    operation.future.result(timeout=5)
+
+    assert seen == [operation]
+    assert engine.get_current_operation() is None
+
+
+def test_commands_cannot_block_the_loop_thread(engine, tmp_path):
+    command = python_command(tmp_path, 'ok.py', 'print("hello")\n')
+    engine.run_command(command)
+    errors = []
+
+    def run_on_loop():
+        try:
+            engine.run_command(command)
+        except RuntimeError as e:
+            errors.append(e)
+
+    engine.loop.call_soon_threadsafe(run_on_loop)
+    deadline = time.monotonic() + 5
+    while len(errors) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(errors) == 1
+
+
+def test_get_engine_is_recreated_after_shutdown():
+    engine = EXE.get_engine()
+    assert EXE.get_engine() is engine
+
+    engine.shutdown()
+    assert EXE.get_engine() is not engine
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import unipkg.command_handler as EXE
+import unipkg.indexes as IDX
+import unipkg.package_managers as PKG_MANAGERS
+
+
+def write_file(file_path, text):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file_fp:
+        file_fp.write(text)
+
+
+def test_dpkg_status_index_keeps_only_installed(tmp_path):
+    status_file = str(tmp_path / 'status')
+    write_file(status_file,
+               'Package: curl\nStatus: install ok installed\nVersion: 7.88.1-10\nDescription: transfer tool\n more text\n\n'
+               'Package: old\nStatus: deinstall ok config-files\nVersion: 1.0\n\n'
+               'Package: zlib1g\nStatus: install ok installed\nPriority: required\nVersion: 1:1.2.13\n\n')
+    index = IDX.DpkgStatusIndex(status_file)
+
+    assert index.is_available()
+    assert index.get_installed() == {'curl' : '7.88.1-10', 'zlib1g' : '1:1.2.13'}
+    assert index.is_installed('curl')
+    assert not index.is_installed('old')
+    assert index.get_version('zlib1g') == '1:1.2.13'
+
+
+def test_dpkg_status_index_rebuilds_when_status_changes(tmp_path):
+    status_file = str(tmp_path / 'status')
+    write_file(status_file, 'Package: curl\nStatus: install ok installed\nVersion: 1.0\n\n')
+    index = IDX.DpkgStatusIndex(status_file)
+    assert index.get_installed() == {'curl' : '1.0'}
+
+    write_file(status_file, 'Package: curl\nStatus: install ok installed\nVersion: 2.0\n\nPackage: wget\nStatus: install ok installed\nVersion: 1.21\n\n')
+    os.utime(status_file, (0, 12345))
+    assert index.get_installed() == {'curl' : '2.0', 'wget' : '1.21'}
+
+
+def test_dpkg_status_index_missing_file(tmp_path):
+    index = IDX.DpkgStatusIndex(str(tmp_path / 'missing'))
+    assert not index.is_available()
+    assert index.get_installed() == {}
+
+
+def test_apt_installed_versions_fall_back_to_dpkg_query(tmp_path, monkeypatch):
+    commands = []
+    def execute_command(command, as_admin, *args, **kwargs):
+        commands.append(command)
+        return 'curl\t7.88.1-10\tinstalled\nold\t1.0\tconfig-files\nbroken line\n', 0
+    monkeypatch.setattr(EXE, 'execute_command', execute_command)
+    apt = PKG_MANAGERS.Aptitude()
+    apt.status_index = IDX.DpkgStatusIndex(str(tmp_path / 'missing'))
+
+    assert apt.get_installed_versions() == {'curl' : '7.88.1-10'}
+    assert commands[0].startswith('dpkg-query -W')
+
+
+def test_apt_installed_versions_raise_when_dpkg_query_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(EXE, 'execute_command', lambda *args, **kwargs : ('dpkg-query: error', 2))
+    apt = PKG_MANAGERS.Aptitude()
+    apt.status_index = IDX.DpkgStatusIndex(str(tmp_path / 'missing'))
+
+    with pytest.raises(EXE.CommandError):
+        apt.get_installed_versions()
+    # The lenient variant used by searches reports nothing installed instead
+    assert apt.get_installed_packages() == {}
@@ -0,0 +1,148 @@
+import sys
+import time
+import threading
+
+import unipkg.command_handler as EXE
+import unipkg.packages as PKG
+import unipkg.search as SEARCH
+
+
+CATALOG = ['json-glib', 'jq', 'python3-jsonschema', 'curl', 'libjson-c5']
+
+
+class FakeManager:
+
+    def __init__(self, name : str='apt', search_is_exhaustive : bool=True, command : str=None):
+        self.name = name
+        self.search_is_exhaustive = search_is_exhaustive
+        self.command = command
+        self.queries = []
+
+    def search(self, query : str):
+        self.queries.append(query)
+        if self.command is not None:
+            out, err = EXE.execute_command(self.command, False)
+            if err != 0:
+                raise EXE.CommandError(out, err)
+        return [PKG.Package(name, '1.0', '', False) for name in CATALOG if all(term in name for term in query.split())]
+
+
+class Recorder:
+
+    def __init__(self):
+        self.answers = []
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def on_results(self, query, results):
+        with self._lock:
+            self.answers.append((query, [pkg.name for pkg in results]))
+
+    def on_error(self, query, error):
+        with self._lock:
+            self.errors.append((query, error))
+
+    def wait(self, num_answers : int, timeout : float=5) -> None:
+        deadline = time.monotonic() + timeout
+        while len(self.answers) + len(self.errors) < num_answers and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def create_search(delay : float=0.1):
+    recorder = Recorder()
+    search = SEARCH.IncrementalSearch(lambda manager, query : manager.search(query), recorder.on_results,
+                                      on_error=recorder.on_error, delay=delay)
+    return search, recorder
+
+
+def type_query(search, manager, query : str, pause : float=0.02) -> None:
+    for length in range(1, len(query) + 1):
+        search.update(manager, query[:length])
+        time.sleep(pause)
+
+
+def test_keystrokes_are_debounced():
+    search, recorder = create_search()
+    manager = FakeManager()
+
+    type_query(search, manager, 'json')
+    recorder.wait(2)
+    time.sleep(0.2)
+
+    assert manager.queries == ['json']
+    # The one character query is answered right away, without searching
+    assert recorder.answers == [('j', []), ('json', ['json-glib', 'python3-jsonschema', 'libjson-c5'])]
+
+
+def test_refinements_are_filtered_in_memory():
+    search, recorder = create_search()
+    manager = FakeManager()
+    search.update(manager, 'json')
+    recorder.wait(1)
+
+    search.update(manager, 'json sch')
+    search.update(manager, 'json-g')
+
+    assert manager.queries == ['json']
+    assert recorder.answers[1:] == [('json sch', ['python3-jsonschema']), ('json-g', ['json-glib'])]
+
+
+def test_non_exhaustive_managers_are_queried_again():
+    search, recorder = create_search()
+    manager = FakeManager('npm', search_is_exhaustive=False)
+    search.update(manager, 'json')
+    recorder.wait(1)
+
+    search.update(manager, 'json-g')
+    recorder.wait(2)
+
+    assert manager.queries == ['json', 'json-g']
+
+
+def test_superseded_queries_are_cancelled(tmp_path):
+    script_file = tmp_path / 'slow.py'
+    script_file.write_text('import time\ntime.sleep(30)\n')
+    slow = FakeManager(command=f'{sys.executable} {script_file}')
+    quick = FakeManager()
+    search, recorder = create_search(delay=0.05)
+
+    search.update(slow, 'jq')
+    deadline = time.monotonic() + 5
+    while len(slow.queries) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    start = time.monotonic()
+    search.update(quick, 'curl')
+    recorder.wait(1)
+
+    assert recorder.answers == [('curl', ['curl'])]
+    assert recorder.errors == []
+    assert time.monotonic() - start < 5
+
+
+def test_reset_drops_pending_queries_and_results():
+    search, recorder = create_search()
+    manager = FakeManager()
+    search.update(manager, 'json')
+    recorder.wait(1)
+
+    search.update(manager, 'curl')
+    search.reset()
+    time.sleep(0.3)
+    assert manager.queries == ['json']
+
+    # With the old results forgotten, refinements are sent again
+    search.update(manager, 'json-g')
+    recorder.wait(2)
+    assert manager.queries == ['json', 'json-g']
+
+
+def test_errors_are_reported():
+    search, recorder = create_search(delay=0.01)
+    manager = FakeManager(command='unipkg-no-such-executable')
+
+    search.update(manager, 'jq')
+    recorder.wait(1)
+
+    assert [(query, error.err) for query, error in recorder.errors] == [('jq', EXE.ERR_NOT_FOUND)]
+    assert recorder.answers == []
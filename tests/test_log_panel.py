@@ -0,0 +1,98 @@
+import unipkg.logs as LOGS
+
+
+class FakeTextBlock:
+
+    def __init__(self, viewport_height : int=3):
+        self.viewport_height = viewport_height
+        self.text = ''
+        self.num_renders = 0
+
+    def get_viewport_height(self) -> int:
+        return self.viewport_height
+
+    def set_text(self, text : str) -> None:
+        self.text = text
+        self.num_renders += 1
+
+    def clear(self) -> None:
+        self.text = ''
+
+
+def test_only_the_newest_visible_lines_are_rendered():
+    widget = FakeTextBlock(viewport_height=3)
+    log_panel = LOGS.LogPanel(widget, capacity=100)
+
+    for index in range(50):
+        log_panel.write(f'message {index}')
+
+    assert widget.text == 'message 49\nmessage 48\nmessage 47'
+
+
+def test_multiline_messages_keep_their_line_order():
+    widget = FakeTextBlock(viewport_height=4)
+    log_panel = LOGS.LogPanel(widget)
+
+    log_panel.write('Installing jq')
+    log_panel.write('out 1\nout 2')
+
+    assert log_panel.get_latest_lines(3) == ['out 1', 'out 2', 'Installing jq']
+    assert widget.text == 'out 1\nout 2\nInstalling jq'
+
+
+def test_capacity_bounds_the_messages_kept():
+    log_panel = LOGS.LogPanel(FakeTextBlock(), capacity=5)
+
+    for index in range(20):
+        log_panel.write(index)
+
+    assert log_panel.get_latest_lines(100) == ['19', '18', '17', '16', '15']
+
+
+def test_paused_panel_keeps_messages_without_rendering():
+    widget = FakeTextBlock()
+    log_panel = LOGS.LogPanel(widget)
+    log_panel.write('before')
+
+    log_panel.set_paused(True)
+    widget.set_text('Package details')
+    num_renders = widget.num_renders
+    log_panel.write('during')
+    assert (widget.text, widget.num_renders) == ('Package details', num_renders)
+
+    log_panel.set_paused(False)
+    assert widget.text == 'during\nbefore'
+
+
+def test_clear_empties_the_panel():
+    widget = FakeTextBlock()
+    log_panel = LOGS.LogPanel(widget)
+    log_panel.write('old')
+
+    log_panel.clear()
+
+    assert widget.text == ''
+    assert log_panel.get_latest_lines(10) == []
+
+
+def test_spill_file_keeps_messages_evicted_from_memory(tmp_path):
+    spill_file = tmp_path / 'logs' / 'unipkg.log'
+    log_panel = LOGS.LogPanel(FakeTextBlock(), capacity=2, spill_file=str(spill_file), max_spill_bytes=10 * 1024)
+
+    for index in range(5):
+        log_panel.write(f'message {index}')
+
+    assert log_panel.get_latest_lines(10) == ['message 4', 'message 3']
+    assert [line.split(' ', 2)[2] for line in spill_file.read_text().splitlines()] == [f'message {index}' for index in range(5)]
+
+
+def test_spill_file_rotates(tmp_path):
+    spill_file = tmp_path / 'unipkg.log'
+    log_panel = LOGS.LogPanel(FakeTextBlock(), spill_file=str(spill_file), max_spill_bytes=1024, spill_backups=2)
+
+    for index in range(200):
+        log_panel.write(f'message {index:04}')
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['unipkg.log', 'unipkg.log.1', 'unipkg.log.2']
+    assert spill_file.stat().st_size <= 1024
+    assert 'message 0199' in spill_file.read_text()
@@ -0,0 +1,147 @@
+import os
+import json
+
+import unipkg.command_handler as EXE
+import unipkg.indexes as IDX
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.packages as PKG
+
+
+def test_iter_json_array_decodes_items_split_across_lines():
+    lines = ['[', '{"name": "a",', '"version": "1.0"}', ',{"name": "b"}', ']']
+    assert list(PKG_MANAGERS.iter_json_array(lines)) == [{'name' : 'a', 'version' : '1.0'}, {'name' : 'b'}]
+
+
+def test_iter_json_array_several_items_per_line():
+    assert list(PKG_MANAGERS.iter_json_array(['[1, 2,', '3]'])) == [1, 2, 3]
+
+
+def test_npm_parse_search_output_marks_installed():
+    lines = ['[',
+             '{"name": "typescript", "version": "5.4.0", "description": "TypeScript is a language"}',
+             ',{"name": "ts-node", "version": "10.9.2", "description": null}',
+             ',"not a package"',
+             ']']
+    installed = {'typescript' : ('5.3.3', 'installed description')}
+    packages = list(PKG_MANAGERS.Npm('npm').parse_search_output(lines, installed))
+
+    assert [(pkg.name, pkg.version, pkg.description, pkg.installed) for pkg in packages] == [
+        ('typescript', '5.3.3', 'TypeScript is a language', True),
+        ('ts-node', '10.9.2', '', False),
+    ]
+
+
+def test_read_npmrc_value(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    npmrc = tmp_path / '.npmrc'
+    npmrc.write_text('; comment\n# prefix=/commented\nregistry=https://registry.example\nprefix = "${HOME}/global"\n')
+
+    assert PKG_MANAGERS.read_npmrc_value(str(npmrc), 'prefix') == f'{tmp_path}/global'
+    assert PKG_MANAGERS.read_npmrc_value(str(npmrc), 'cache') is None
+    assert PKG_MANAGERS.read_npmrc_value(str(tmp_path / 'missing'), 'prefix') is None
+
+
+def test_npm_global_root_follows_user_npmrc(tmp_path, monkeypatch):
+    npm_cli = tmp_path / 'usr' / 'lib' / 'node_modules' / 'npm' / 'bin' / 'npm-cli.js'
+    npm_cli.parent.mkdir(parents=True)
+    npm_cli.write_text('')
+    monkeypatch.setattr(PKG_MANAGERS.shutil, 'which', lambda name : str(npm_cli))
+    monkeypatch.delenv('NPM_CONFIG_PREFIX', raising=False)
+    monkeypatch.delenv('npm_config_prefix', raising=False)
+    monkeypatch.delenv('NPM_CONFIG_GLOBALCONFIG', raising=False)
+    monkeypatch.setenv('NPM_CONFIG_USERCONFIG', str(tmp_path / 'npmrc'))
+    npm = PKG_MANAGERS.Npm('npm')
+
+    assert npm.get_global_root() == str(tmp_path / 'usr' / 'lib' / 'node_modules')
+
+    (tmp_path / 'npmrc').write_text(f'prefix={tmp_path}/user\n')
+    assert npm.get_global_root() == str(tmp_path / 'user' / 'lib' / 'node_modules')
+
+
+def write_file(file_path, text):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file_fp:
+        file_fp.write(text)
+
+
+def write_manifest(package_dir, manifest):
+    os.makedirs(package_dir, exist_ok=True)
+    with open(os.path.join(package_dir, 'package.json'), 'w') as manifest_fp:
+        json.dump(manifest, manifest_fp)
+
+
+def test_npm_global_index_reads_scoped_packages_and_skips_broken_manifests(tmp_path):
+    root_dir = tmp_path / 'node_modules'
+    write_manifest(str(root_dir / 'npm'), {'name' : 'npm', 'version' : '9.8.1', 'description' : 'a package manager'})
+    write_manifest(str(root_dir / '@vue' / 'cli'), {'name' : '@vue/cli', 'version' : '5.0.8', 'description' : ['not', 'a', 'string']})
+    write_file(str(root_dir / 'broken' / 'package.json'), '{not json')
+    os.makedirs(str(root_dir / '.bin'))
+    index = IDX.NpmGlobalIndex(str(root_dir))
+
+    assert index.get_installed() == {'npm' : ('9.8.1', 'a package manager'), '@vue/cli' : ('5.0.8', '')}
+
+
+def test_npm_global_index_unavailable_without_root():
+    index = IDX.NpmGlobalIndex(None)
+    assert not index.is_available()
+    assert index.get_source_files() == []
+
+
+def test_npm_global_index_only_rereads_changed_manifests(tmp_path):
+    root_dir = tmp_path / 'node_modules'
+    write_manifest(str(root_dir / 'typescript'), {'name' : 'typescript', 'version' : '5.3.3'})
+    index = IDX.NpmGlobalIndex(str(root_dir))
+    assert index.get_installed() == {'typescript' : ('5.3.3', '')}
+
+    # Rewritten behind the index's back, with its old mtime
+    manifest_file = str(root_dir / 'typescript' / 'package.json')
+    manifest_mtime = os.stat(manifest_file).st_mtime
+    write_manifest(str(root_dir / 'typescript'), {'name' : 'typescript', 'version' : '9.9.9'})
+    os.utime(manifest_file, (manifest_mtime, manifest_mtime))
+    write_manifest(str(root_dir / 'eslint'), {'name' : 'eslint', 'version' : '8.57.0'})
+    os.utime(str(root_dir), (manifest_mtime + 10, manifest_mtime + 10))
+
+    assert index.get_installed() == {'typescript' : ('5.3.3', ''), 'eslint' : ('8.57.0', '')}
+
+
+def create_npm(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(EXE, 'execute_command', lambda command, as_admin, **kwargs : commands.append(command) or ('', 0))
+    npm = PKG_MANAGERS.Npm('npm')
+    npm._global_index = IDX.NpmGlobalIndex(str(tmp_path / 'node_modules'))
+    return npm, commands
+
+
+def test_npm_list_packages_reads_node_modules(tmp_path, monkeypatch):
+    npm, commands = create_npm(tmp_path, monkeypatch)
+    write_manifest(str(tmp_path / 'node_modules' / 'typescript'), {'name' : 'typescript', 'version' : '5.3.3', 'description' : 'TypeScript'})
+    write_manifest(str(tmp_path / 'node_modules' / '@vue' / 'cli'), {'name' : '@vue/cli', 'version' : '5.0.8'})
+
+    packages, err = npm.list_packages()
+
+    assert err == 0
+    assert [(pkg.name, pkg.version, pkg.description, pkg.installed) for pkg in packages] == [
+        ('@vue/cli', '5.0.8', '', True),
+        ('typescript', '5.3.3', 'TypeScript', True),
+    ]
+    assert commands == []
+
+
+def test_npm_list_packages_without_node_modules(tmp_path, monkeypatch):
+    npm, _ = create_npm(tmp_path, monkeypatch)
+
+    packages, _, err = npm.list_packages()
+
+    assert (packages, err) == (None, EXE.ERR_NOT_FOUND)
+
+
+def test_npm_transactions_are_batched(tmp_path, monkeypatch):
+    npm, commands = create_npm(tmp_path, monkeypatch)
+    packages = [PKG.NpmPackage(name, '', '', True) for name in ['typescript', '@vue/cli']]
+
+    npm.apply_packages('Install', packages, None)
+    npm.apply_packages('Update', packages, None)
+    npm.apply_packages('Uninstall', packages, None)
+
+    assert commands == ['npm install -g typescript @vue/cli', 'npm install -g typescript@latest @vue/cli@latest',
+                        'npm uninstall -g typescript @vue/cli']
@@ -0,0 +1,36 @@
+import unipkg.command_handler as EXE
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.packages as PKG
+
+
+SHOW_OUTPUT = ('Package: curl\nVersion: 7.88.1-10+deb12u5\nDescription: command line tool\n\n'
+               'Package: curl\nVersion: 7.88.1-10\nDescription: command line tool\n\n'
+               'Package: jq\nVersion: 1.6-2.1\nDescription: JSON processor\n\n')
+
+
+def test_apt_details_keep_installed_versions(monkeypatch):
+    commands = []
+    def execute_command(command, as_admin, *args, **kwargs):
+        commands.append(command)
+        return SHOW_OUTPUT, 0
+    monkeypatch.setattr(EXE, 'execute_command', execute_command)
+    curl = PKG.AptitudePackage('curl', '7.88.1-10', 'command line tool', True)
+    jq = PKG.AptitudePackage('jq', '', 'JSON processor', False)
+
+    details = PKG_MANAGERS.Aptitude().get_package_details([curl, jq])
+
+    # One apt-cache call for every package
+    assert commands == ['apt-cache show curl jq']
+    assert curl.version == '7.88.1-10'
+    assert curl.candidate_version == '7.88.1-10+deb12u5'
+    assert jq.version == '1.6-2.1'
+    assert details['curl'].split('|')[1].strip() == '7.88.1-10 -> 7.88.1-10+deb12u5'
+    assert details['jq'].split('|')[1].strip() == '1.6-2.1'
+
+
+def test_apt_details_hide_older_candidates():
+    pkg = PKG.AptitudePackage('cockpit', '310-1~bpo12+1', 'web console', True)
+    pkg.update_from_show_output('Package: cockpit\nVersion: 287-1\n')
+
+    assert pkg.version == '310-1~bpo12+1'
+    assert pkg.get_info_str().split('|')[1].strip() == '310-1~bpo12+1'
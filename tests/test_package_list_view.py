@@ -0,0 +1,90 @@
+import py_cui
+import pytest
+
+import unipkg.packages as PKG
+import unipkg.views as VIEWS
+
+
+def create_view(num_packages, window_size=100):
+    root = py_cui.PyCUI(3, 3)
+    menu = root.add_checkbox_menu('Packages', 0, 0, row_span=3, column_span=3)
+    view = VIEWS.PackageListView(menu, window_size=window_size)
+    view.set_packages([PKG.Package(f'pkg{index}', '1.0', '', index % 2 == 0) for index in range(num_packages)])
+    return view
+
+
+def press(view, key, times=1):
+    for _ in range(times):
+        view.menu._handle_key_press(key)
+
+
+def assert_selected(view, index):
+    assert view.get().name == f'pkg{index}'
+    # The selection is always drawn, whatever window it landed in
+    assert view.get() in view.get_visible_packages()
+    assert len(view.menu.get_item_list()) <= view.window_size
+
+
+def test_only_the_window_is_materialized():
+    view = create_view(1000)
+
+    assert len(view) == 1000
+    assert [pkg.name for pkg in view.menu.get_item_list()] == [f'pkg{index}' for index in range(100)]
+    assert view.menu.get_title() == 'Packages [1-100 of 1000]'
+    # Installed packages are shown checked
+    assert all(view.menu._selected_item_dict[pkg] == pkg.installed for pkg in view.menu.get_item_list())
+    assert_selected(view, 0)
+
+
+def test_arrows_slide_the_window():
+    view = create_view(1000)
+
+    press(view, py_cui.keys.KEY_DOWN_ARROW, 250)
+    assert_selected(view, 250)
+    assert view.window_start > 0
+
+    press(view, py_cui.keys.KEY_UP_ARROW, 250)
+    assert_selected(view, 0)
+    assert view.window_start == 0
+
+
+@pytest.mark.parametrize('num_pages', [1, 19, 20, 21, 60])
+def test_pages_move_by_the_menu_page_length(num_pages):
+    view = create_view(1000)
+    step = view.get_page_step()
+
+    press(view, py_cui.keys.KEY_PAGE_DOWN, num_pages)
+    assert_selected(view, num_pages * step)
+
+    press(view, py_cui.keys.KEY_PAGE_UP, num_pages)
+    assert_selected(view, 0)
+
+
+def test_home_and_end_jump_across_windows():
+    view = create_view(1000)
+
+    press(view, py_cui.keys.KEY_END)
+    assert_selected(view, 999)
+    assert view.menu.get_title() == 'Packages [901-1000 of 1000]'
+
+    press(view, py_cui.keys.KEY_HOME)
+    assert_selected(view, 0)
+    assert view.window_start == 0
+
+
+def test_append_only_fills_the_window():
+    view = create_view(60)
+
+    view.append([PKG.Package(f'pkg{index}', '1.0', '', False) for index in range(60, 300)])
+
+    assert len(view) == 300
+    assert len(view.menu.get_item_list()) == 100
+    assert view.menu.get_title() == 'Packages [1-100 of 300]'
+
+
+def test_short_lists_are_left_to_the_menu():
+    view = create_view(30)
+
+    press(view, py_cui.keys.KEY_DOWN_ARROW, 40)
+    assert_selected(view, 29)
+    assert view.menu.get_title() == 'Packages'
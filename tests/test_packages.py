@@ -0,0 +1,39 @@
+import pytest
+
+import unipkg.packages as PKG
+
+
+@pytest.mark.parametrize('package_class', [PKG.Package, PKG.PipPackage, PKG.NpmPackage, PKG.AptitudePackage])
+def test_packages_have_no_instance_dict(package_class):
+    pkg = package_class('jq', '1.6', 'JSON processor', False)
+
+    assert not hasattr(pkg, '__dict__')
+    with pytest.raises(AttributeError):
+        pkg.homepage = 'https://jqlang.github.io'
+
+
+def test_row_is_cached_until_it_changes():
+    pkg = PKG.Package('jq', '1.6', 'JSON processor', False)
+
+    row = str(pkg)
+    assert row == f'{"jq":<32} | {"1.6":<8} | JSON processor'
+    assert str(pkg) is row
+
+    pkg.version = '1.7'
+    assert str(pkg) == f'{"jq":<32} | {"1.7":<8} | JSON processor'
+    pkg.set_source('apt')
+    assert str(pkg) == f'{"apt":<6} | {"jq":<32} | {"1.7":<8} | JSON processor'
+
+
+def test_apt_rows_leave_out_the_version():
+    pkg = PKG.AptitudePackage('jq', '1.6-2', 'JSON processor', True)
+
+    assert str(pkg) == f'{"jq":<28} | JSON processor'
+
+
+def test_update_package_rows_show_the_version_diff():
+    pkg = PKG.UpdatePackage('curl', '7.88.1-10', '7.88.1-11', 'transfer tool', 'apt')
+
+    assert (pkg.installed, pkg.installed_version, pkg.new_version) == (True, '7.88.1-10', '7.88.1-11')
+    assert str(pkg) == f'{"apt":<6} | {"curl":<32} | {"7.88.1-10 -> 7.88.1-11":<24} | transfer tool'
+    assert not hasattr(pkg, '__dict__')
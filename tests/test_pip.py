@@ -0,0 +1,104 @@
+import os
+
+import unipkg.command_handler as EXE
+import unipkg.indexes as IDX
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.packages as PKG
+
+
+def test_pip_parse_list_output():
+    lines = ['requests==2.31.0', '', 'mypkg @ file:///src/mypkg', '  six==1.16.0  ']
+    packages = list(PKG_MANAGERS.Pip('pip').parse_list_output(lines))
+
+    assert [(pkg.name, pkg.version, pkg.installed) for pkg in packages] == [
+        ('requests', '2.31.0', True),
+        ('mypkg', '', True),
+        ('six', '1.16.0', True),
+    ]
+
+
+def write_metadata(metadata_file, name, version, summary='', requires=()):
+    os.makedirs(os.path.dirname(metadata_file), exist_ok=True)
+    with open(metadata_file, 'w') as metadata_fp:
+        metadata_fp.write(f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\nSummary: {summary}\n')
+        for requirement in requires:
+            metadata_fp.write(f'Requires-Dist: {requirement}\n')
+        metadata_fp.write('\nName: not a header\n')
+
+
+def create_site_dirs(tmp_path):
+    site_dir, user_site_dir = tmp_path / 'site-packages', tmp_path / 'user-site-packages'
+    write_metadata(str(site_dir / 'requests-2.31.0.dist-info' / 'METADATA'), 'requests', '2.31.0', 'HTTP for Humans.',
+                   ['idna<4,>=2.5', 'PySocks!=1.5.7,>=1.5.6; extra == "socks"'])
+    write_metadata(str(site_dir / 'six-1.16.0.egg-info' / 'PKG-INFO'), 'six', '1.16.0')
+    write_metadata(str(site_dir / 'legacy.egg-info'), 'legacy', '0.1')
+    # Legacy editable install
+    write_metadata(str(tmp_path / 'src' / 'mypkg' / 'mypkg.egg-info' / 'PKG-INFO'), 'mypkg', '0.0.1.dev0')
+    (site_dir / 'mypkg.egg-link').write_text(f'{tmp_path / "src" / "mypkg"}\n.\n')
+    (site_dir / 'broken.dist-info').mkdir()
+    (site_dir / 'broken.dist-info' / 'METADATA').write_text('Version: 1.0\n')
+    # Shadowed by the copy earlier on sys.path
+    write_metadata(str(user_site_dir / 'Six-1.15.0.dist-info' / 'METADATA'), 'Six', '1.15.0')
+    return [str(site_dir), str(user_site_dir)]
+
+
+def test_read_dist_metadata_stops_at_the_body(tmp_path):
+    metadata_file = str(tmp_path / 'METADATA')
+    write_metadata(metadata_file, 'requests', '2.31.0', 'HTTP for Humans.', ['idna<4,>=2.5'])
+
+    assert IDX.read_dist_metadata(metadata_file) == ('requests', '2.31.0', 'HTTP for Humans.', ('idna<4,>=2.5',))
+    assert IDX.read_dist_metadata(str(tmp_path / 'missing')) is None
+
+
+def test_python_dist_index_reads_every_kind_of_install(tmp_path):
+    index = IDX.PythonDistIndex(create_site_dirs(tmp_path))
+
+    installed = index.get_installed()
+
+    assert {name : metadata[1] for name, metadata in installed.items()} == {
+        'requests' : '2.31.0', 'six' : '1.16.0', 'legacy' : '0.1', 'mypkg' : '0.0.1.dev0'}
+    assert IDX.get_canonical_name('Zope.Interface_Foo') == 'zope-interface-foo'
+
+
+def test_python_dist_index_rescans_when_site_packages_changes(tmp_path):
+    site_dirs = create_site_dirs(tmp_path)
+    index = IDX.PythonDistIndex(site_dirs)
+    stamp = index.get_stamp()
+    assert 'idna' not in index.get_installed()
+
+    write_metadata(os.path.join(site_dirs[0], 'idna-3.6.dist-info', 'METADATA'), 'idna', '3.6')
+    os.utime(site_dirs[0], (os.stat(site_dirs[0]).st_mtime + 10,) * 2)
+
+    assert index.get_stamp() != stamp
+    assert index.get_installed()['idna'][1] == '3.6'
+
+
+def create_pip(tmp_path, monkeypatch):
+    def fail(command, *args, **kwargs):
+        raise AssertionError(f'ran {command}')
+
+    monkeypatch.setattr(EXE, 'execute_command', fail)
+    monkeypatch.setattr(EXE, 'stream_command', fail)
+    pip = PKG_MANAGERS.Pip('pip')
+    pip._site_dirs = create_site_dirs(tmp_path)
+    return pip
+
+
+def test_pip_list_packages_reads_site_packages(tmp_path, monkeypatch):
+    pip = create_pip(tmp_path, monkeypatch)
+
+    packages, err = pip.list_packages()
+
+    assert err == 0
+    assert [(pkg.name, pkg.version, pkg.installed) for pkg in packages] == [
+        ('legacy', '0.1', True), ('mypkg', '0.0.1.dev0', True), ('requests', '2.31.0', True), ('six', '1.16.0', True)]
+
+
+def test_pip_package_details_show_requirements(tmp_path, monkeypatch):
+    pip = create_pip(tmp_path, monkeypatch)
+    packages = [PKG.PipPackage('Requests', '', '', True), PKG.PipPackage('missing', '1.0', 'not installed', False)]
+
+    details = pip.get_package_details(packages)
+
+    assert details['Requests'].splitlines() == [f'{"Requests":<32} | 2.31.0   | HTTP for Humans.', '    Requires: idna<4,>=2.5']
+    assert details['missing'] == packages[1].get_info()
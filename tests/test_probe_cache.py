@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+
+import unipkg
+import unipkg.cache as CACHE
+import unipkg.command_handler as EXE
+import unipkg.registry as REGISTRY
+
+
+class FakeManager:
+
+    def __init__(self, installer_name : str, err : int):
+        self.installer_name = installer_name
+        self.err = err
+        self.num_probes = 0
+
+    def probe(self) -> int:
+        self.num_probes += 1
+        return self.err
+
+
+def test_probe_cache_keeps_definitive_results(tmp_path):
+    probe_cache = CACHE.ProbeCache(str(tmp_path / 'probes.json'))
+    manager = FakeManager('python3', 1)
+
+    assert not probe_cache.check(manager)
+    assert not probe_cache.check(manager)
+    assert manager.num_probes == 1
+
+
+def test_probe_cache_does_not_keep_timeouts(tmp_path):
+    probe_cache = CACHE.ProbeCache(str(tmp_path / 'probes.json'))
+    timed_out = FakeManager('python3', EXE.ERR_TIMEOUT)
+
+    assert not probe_cache.check(timed_out)
+    probe_cache.save()
+    assert probe_cache.entries == {}
+    assert not (tmp_path / 'probes.json').exists()
+
+    working = FakeManager('python3', 0)
+    assert probe_cache.check(working)
+
+
+def test_probe_cache_missing_executable(tmp_path):
+    probe_cache = CACHE.ProbeCache(str(tmp_path / 'probes.json'))
+    manager = FakeManager('unipkg-no-such-installer', 0)
+
+    assert not probe_cache.check(manager)
+    assert manager.num_probes == 0
+
+
+def test_probe_cache_persists_until_the_executable_changes(tmp_path, monkeypatch):
+    installer = tmp_path / 'bin' / 'fake-installer'
+    installer.parent.mkdir()
+    installer.write_text('')
+    monkeypatch.setattr(CACHE.shutil, 'which', lambda name : str(installer) if name == 'fake-installer' else None)
+    cache_file = str(tmp_path / 'probes.json')
+    probe_cache = CACHE.ProbeCache(cache_file)
+    assert probe_cache.check(FakeManager('fake-installer', 0))
+    probe_cache.save()
+
+    # A new process reads the result instead of probing
+    loaded = CACHE.ProbeCache(cache_file)
+    loaded.load()
+    manager = FakeManager('fake-installer', 1)
+    assert loaded.check(manager)
+    assert manager.num_probes == 0
+
+    os.utime(str(installer), (0, 0))
+    assert not loaded.check(manager)
+    assert manager.num_probes == 1
+
+
+def test_find_supported_package_managers_probes_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    monkeypatch.setattr(CACHE.shutil, 'which', lambda name : sys.executable)
+    # Every probe waits for all the others, so this only finishes if they run at once
+    barrier = threading.Barrier(3, timeout=5)
+
+    class BlockingManager(FakeManager):
+        def probe(self) -> int:
+            barrier.wait()
+            return super().probe()
+
+    registry = REGISTRY.ManagerRegistry(entry_point_group=None)
+    registry.register('a', lambda : BlockingManager('a', 0), 'a')
+    registry.register('b', lambda : BlockingManager('b', 1), 'b')
+    registry.register('c', lambda : BlockingManager('c', 0), 'c')
+    monkeypatch.setattr(unipkg, 'supported_package_managers', registry)
+    monkeypatch.setattr(REGISTRY.shutil, 'which', lambda name : sys.executable)
+
+    assert [manager.installer_name for manager in unipkg.find_supported_package_managers()] == ['a', 'c']
+    assert os.path.isfile(str(tmp_path / 'unipkg' / 'probes.json'))
@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+import unipkg.profiling as PROFILING
+
+
+def test_phases_are_measured_from_the_previous_mark():
+    profile = PROFILING.StartupProfile(start_time=10.0, budget=1.0)
+    profile.mark('import unipkg', mark_time=10.1)
+    profile.mark('probe managers', mark_time=10.4)
+
+    assert [(phase, round(duration, 6)) for phase, duration in profile.get_phases()] == [('import unipkg', 0.1), ('probe managers', 0.3)]
+    assert profile.get_total() == pytest.approx(0.4)
+    assert 'budget' not in profile.get_report()
+
+
+def test_report_flags_slow_startups():
+    profile = PROFILING.StartupProfile(start_time=0.0, budget=0.5)
+    profile.mark('first paint', mark_time=0.75)
+    out_fp = io.StringIO()
+
+    profile.report(out_fp)
+
+    assert out_fp.getvalue().splitlines() == [
+        'Startup profile:',
+        '  first paint                 750.0 ms',
+        '  total                       750.0 ms',
+        '  Over the 500 ms startup budget',
+    ]
+
+
+def test_marks_are_ignored_without_a_profile(monkeypatch):
+    monkeypatch.setattr(PROFILING, '_active_profile', None)
+    PROFILING.mark('probe managers')
+    assert PROFILING.get_profile() is None
+
+    profile = PROFILING.start_profile(start_time=0.0)
+    PROFILING.mark('probe managers', mark_time=0.2)
+    assert PROFILING.get_profile() is profile
+    assert profile.marks == [('probe managers', 0.2)]
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.ranking as RANK
+
+
+NAMES = ['python3-jsonschema', 'json', 'libjson-c5', 'jsonnet', 'jq', 'jsno', 'curl', 'JSON-glib', 'node-json5']
+
+
+def test_get_match_key_tiers():
+    query = 'json'
+    trigrams = RANK.get_trigrams(query)
+
+    assert RANK.get_match_key('json', query, trigrams) == (RANK.TIER_EXACT, 0)
+    assert RANK.get_match_key('jsonnet', query, trigrams) == (RANK.TIER_PREFIX, 7)
+    assert RANK.get_match_key('libjson-c5', query, trigrams) == (RANK.TIER_SUBSTRING, 10)
+    assert RANK.get_match_key('jsno', query, trigrams)[0] == RANK.TIER_FUZZY
+    assert RANK.get_match_key('curl', query, trigrams) == (RANK.TIER_UNRELATED, 0)
+
+
+def test_rank_names_orders_by_tier_then_length():
+    ranked = RANK.rank_names(NAMES, 'json')
+
+    assert ranked[:7] == ['json', 'jsonnet', 'JSON-glib', 'libjson-c5', 'node-json5', 'python3-jsonschema', 'jsno']
+    # Unrelated names are kept at the end, in their original order
+    assert ranked[7:] == ['jq', 'curl']
+
+
+def test_rank_names_top_k_drops_unrelated():
+    assert RANK.rank_names(NAMES, 'json', k=3) == ['json', 'jsonnet', 'JSON-glib']
+    assert RANK.rank_names(['curl', 'wget'], 'json', k=5) == ['curl', 'wget']
+    assert RANK.rank_names(NAMES, ' JSON ', k=1) == ['json']
+
+
+@pytest.mark.parametrize('built', [False, True])
+def test_ranking_index_tiers(built):
+    index = RANK.RankingIndex(NAMES + ['json'])
+    if built:
+        index.build()
+
+    assert len(index) == len(NAMES)
+    assert index.is_built() == built
+    assert index.search('json') == ['json', 'jsonnet', 'JSON-glib', 'libjson-c5', 'node-json5', 'python3-jsonschema', 'jsno']
+    assert index.search('json', k=2) == ['json', 'jsonnet']
+    assert index.search('   ') == []
+
+
+@pytest.mark.parametrize('query', ['json', 'js', 'j', 'sonn', 'jsonschema', 'jsnon', 'xyz', 'lib-json'])
+@pytest.mark.parametrize('k', [None, 3])
+def test_ranking_index_linear_and_indexed_searches_agree(query, k):
+    names = NAMES + [f'{prefix}json{suffix}' for prefix in ['', 'lib', 'py'] for suffix in ['', '-tools', '5', 'schema']]
+    linear = RANK.RankingIndex(names)
+    indexed = RANK.RankingIndex(names)
+    indexed.build()
+
+    assert linear.search(query, k=k) == indexed.search(query, k=k)
+
+
+def test_ranking_index_min_similarity_drops_weak_fuzzy_matches():
+    index = RANK.RankingIndex(['jsno', 'jason-parser-for-everything'])
+    index.build()
+
+    assert index.search('json', min_similarity=0) == ['jsno', 'jason-parser-for-everything']
+    assert index.search('json', min_similarity=0.5) == []
+
+
+@pytest.mark.parametrize('query', ['json', 'lib', 'py', 'x'])
+def test_rank_names_top_k_is_a_prefix_of_the_full_ranking(query):
+    rng = random.Random(4)
+    names = [''.join(rng.choice('jsonlibpyx-') for _ in range(rng.randint(2, 12))) for _ in range(2000)]
+    full = [name for name in RANK.rank_names(names, query)
+            if RANK.get_match_key(name.lower(), query, RANK.get_trigrams(query))[0] != RANK.TIER_UNRELATED]
+
+    for k in [1, 10, 100]:
+        assert RANK.rank_names(names, query, k=k) == full[:k]
+
+
+def test_get_best_match_packages_limits_results():
+    apt = PKG_MANAGERS.Aptitude()
+
+    assert apt.get_best_match_packages(NAMES, 'json', limit=2) == ['json', 'jsonnet']
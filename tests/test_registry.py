@@ -0,0 +1,91 @@
+import sys
+import subprocess
+
+import pytest
+
+import unipkg.registry as REGISTRY
+
+
+class FakeEntryPoint:
+
+    def __init__(self, name : str, factory):
+        self.name = name
+        self.factory = factory
+        self.num_loads = 0
+
+    def load(self):
+        self.num_loads += 1
+        return self.factory
+
+
+def create_registry():
+    created = []
+
+    def factory(name):
+        created.append(name)
+        return f'manager {name}'
+
+    registry = REGISTRY.ManagerRegistry(entry_point_group=None)
+    registry.register('apt', factory, 'apt-get', 'apt')
+    registry.register('npm', factory, 'npm', 'npm')
+    return registry, created
+
+
+def test_managers_are_created_once_on_first_lookup():
+    registry, created = create_registry()
+
+    assert registry.keys() == ['apt', 'npm']
+    assert 'npm' in registry
+    assert created == []
+
+    assert registry['npm'] == 'manager npm'
+    assert registry.get('npm') == 'manager npm'
+    assert created == ['npm']
+    assert registry.get('pip') is None
+    with pytest.raises(KeyError):
+        registry['pip']
+
+
+def test_import_path_factories_are_imported_lazily():
+    registry = REGISTRY.ManagerRegistry(entry_point_group=None)
+    registry.register('ordered', 'collections:OrderedDict')
+
+    assert isinstance(registry['ordered'], dict)
+
+
+def test_installed_names_need_the_executable_on_path(monkeypatch):
+    registry, created = create_registry()
+    registry.register('plugin', lambda : 'manager plugin')
+    monkeypatch.setattr(REGISTRY.shutil, 'which', {'npm' : '/usr/bin/npm'}.get)
+
+    assert registry.get_installed_names() == ['npm', 'plugin']
+    assert created == []
+
+
+def test_plugins_are_loaded_from_entry_points(monkeypatch):
+    plugin = FakeEntryPoint('brew', lambda : 'manager brew')
+    shadowed = FakeEntryPoint('apt', lambda : 'plugin apt')
+    groups = []
+    monkeypatch.setattr(REGISTRY, 'iter_entry_points', lambda group : groups.append(group) or iter([plugin, shadowed]))
+    registry = REGISTRY.ManagerRegistry(entry_point_group='unipkg.test')
+    registry.register('apt', lambda : 'manager apt', 'apt-get')
+
+    # Built in names are found without searching for plugins
+    assert registry['apt'] == 'manager apt'
+    assert groups == []
+
+    assert registry.keys() == ['apt', 'brew']
+    assert plugin.num_loads == 0
+    assert registry['brew'] == 'manager brew'
+    assert (plugin.num_loads, shadowed.num_loads) == (1, 0)
+    assert groups == ['unipkg.test']
+
+
+def test_importing_unipkg_creates_no_managers():
+    code = ('import sys, unipkg\n'
+            'unipkg.supported_package_managers.get_installed_names()\n'
+            'loaded = [name for name in ("unipkg.package_managers", "py_cui", "curses", "ctypes") if name in sys.modules]\n'
+            'assert loaded == [], loaded\n')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
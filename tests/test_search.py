@@ -0,0 +1,77 @@
+import pytest
+
+import unipkg.command_handler as EXE
+import unipkg.packages as PKG
+import unipkg.search as SEARCH
+
+
+class FakeManager:
+
+    def __init__(self, name : str, results=(), lock_name : str=None, error : Exception=None):
+        self.name = name
+        self.results = list(results)
+        self.lock_name = name if lock_name is None else lock_name
+        self.error = error
+        self.num_searches = 0
+
+    def get_lock_name(self) -> str:
+        return self.lock_name
+
+
+def search_func(manager, search_key):
+    manager.num_searches += 1
+    if manager.error is not None:
+        raise manager.error
+    return [PKG.Package(name, '1.0', '', False) for name in manager.results]
+
+
+def test_search_all_merges_by_rank_then_manager():
+    apt = FakeManager('apt', ['libjson-c5', 'json'])
+    npm = FakeManager('npm', ['jsonnet', 'json'])
+
+    merged, errors = SEARCH.search_all([apt, npm], 'json', search_func=search_func)
+
+    assert errors == {}
+    assert [(pkg.source, pkg.name) for pkg in merged] == [('apt', 'json'), ('npm', 'json'), ('npm', 'jsonnet'), ('apt', 'libjson-c5')]
+
+
+def test_search_all_searches_shared_locks_once():
+    pip = FakeManager('pip', ['requests'], lock_name='pip:/usr/bin/python3')
+    pip3 = FakeManager('pip3', ['requests'], lock_name='pip:/usr/bin/python3')
+
+    merged, _ = SEARCH.search_all([pip, pip3], 'requests', search_func=search_func)
+
+    assert [(pkg.source, pkg.name) for pkg in merged] == [('pip', 'requests')]
+    assert (pip.num_searches, pip3.num_searches) == (1, 0)
+
+
+def test_search_all_keeps_results_of_working_managers():
+    managers = [FakeManager('apt', ['jq']),
+                FakeManager('npm', error=EXE.CommandError('npm ERR! network', 1)),
+                FakeManager('pip', error=ValueError('unexpected output'))]
+    reported = []
+
+    merged, errors = SEARCH.search_all(managers, 'jq', search_func=search_func,
+                                       on_results=lambda manager, results, error : reported.append((manager.name, error)))
+
+    assert [pkg.name for pkg in merged] == ['jq']
+    assert errors == {'npm' : 'npm ERR! network', 'pip' : 'ValueError: unexpected output'}
+    # Every manager is reported once, in the order they finish
+    assert sorted(reported) == [('apt', None), ('npm', 'npm ERR! network'), ('pip', 'ValueError: unexpected output')]
+
+
+def test_search_all_propagates_cancellation():
+    managers = [FakeManager('apt', ['jq']), FakeManager('npm', error=EXE.CommandCancelled('npm search jq'))]
+
+    with pytest.raises(EXE.CommandCancelled):
+        SEARCH.search_all(managers, 'jq', search_func=search_func)
+
+
+def test_narrow_results_filters_and_ranks():
+    packages = [PKG.Package('python3-jsonschema', '', 'validate JSON', False), PKG.Package('jq', '', 'JSON processor', False),
+                PKG.Package('json-glib', '', 'GLib JSON library', False), PKG.Package('curl', '', 'transfer tool', False)]
+
+    assert SEARCH.is_refinement('json pro', 'json')
+    assert not SEARCH.is_refinement('jq', 'json')
+    assert [pkg.name for pkg in SEARCH.narrow_results(packages, 'json')] == ['json-glib', 'python3-jsonschema', 'jq']
+    assert [pkg.name for pkg in SEARCH.narrow_results(packages, 'json pro')] == ['jq']
@@ -0,0 +1,117 @@
+import os
+import gzip
+
+import unipkg.cache as CACHE
+
+
+ROWS = [('jq', '1.6', 'lightweight JSON processor', False), ('curl', '7.88', 'transfer tool', True)]
+
+
+class FakeClock:
+
+    def __init__(self, now : float=1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_search_cache_hit_and_key_normalization(tmp_path):
+    search_cache = CACHE.SearchCache(cache_file=str(tmp_path / 'searches.json.gz'))
+    search_cache.put('apt', 'JSON  Processor', ('lists', 1), ROWS)
+
+    assert search_cache.get('apt', 'json processor', ('lists', 1)) == ROWS
+    assert search_cache.get('pip', 'json processor', ('lists', 1)) is None
+
+
+def test_search_cache_expires_after_ttl(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(CACHE.time, 'time', clock)
+    search_cache = CACHE.SearchCache(ttl=60, cache_file=str(tmp_path / 'searches.json.gz'))
+    search_cache.put('apt', 'json', None, ROWS)
+
+    clock.now += 59
+    assert search_cache.get('apt', 'json', None) == ROWS
+    clock.now += 1
+    assert search_cache.get('apt', 'json', None) is None
+    # Expired entries are dropped, not just skipped
+    clock.now -= 30
+    assert search_cache.get('apt', 'json', None) is None
+
+
+def test_search_cache_invalidated_by_catalog_version(tmp_path):
+    search_cache = CACHE.SearchCache(cache_file=str(tmp_path / 'searches.json.gz'))
+    search_cache.put('apt', 'json', ('lists', 1), ROWS)
+
+    assert search_cache.get('apt', 'json', ('lists', 2)) is None
+    assert search_cache.get('apt', 'json', ('lists', 1)) is None
+
+
+def test_search_cache_evicts_least_recently_used_rows(tmp_path):
+    search_cache = CACHE.SearchCache(max_rows=4, cache_file=str(tmp_path / 'searches.json.gz'))
+    search_cache.put('apt', 'a', None, ROWS)
+    search_cache.put('apt', 'b', None, ROWS)
+    assert search_cache.get('apt', 'a', None) == ROWS
+    search_cache.put('apt', 'c', None, ROWS)
+
+    assert search_cache.get('apt', 'b', None) is None
+    assert search_cache.get('apt', 'a', None) == ROWS
+    assert search_cache.get('apt', 'c', None) == ROWS
+
+
+def test_search_cache_persists_valid_entries(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(CACHE.time, 'time', clock)
+    cache_file = str(tmp_path / 'searches.json.gz')
+    search_cache = CACHE.SearchCache(ttl=60, cache_file=cache_file)
+    search_cache.put('apt', 'json', ('lists', 1), ROWS)
+    clock.now += 30
+    search_cache.put('apt', 'curl', ('lists', 1), ROWS[1:])
+    search_cache.save()
+
+    clock.now += 40
+    loaded = CACHE.SearchCache(ttl=60, cache_file=cache_file)
+    loaded.load()
+    assert loaded.get('apt', 'json', ('lists', 1)) is None
+    assert loaded.get('apt', 'curl', ('lists', 1)) == ROWS[1:]
+
+
+def test_search_cache_ignores_unreadable_files(tmp_path):
+    cache_file = tmp_path / 'searches.json.gz'
+    search_cache = CACHE.SearchCache(cache_file=str(cache_file))
+    search_cache.load()
+    assert search_cache.get('apt', 'json', None) is None
+
+    cache_file.write_bytes(b'not gzip')
+    search_cache.load()
+    with gzip.open(cache_file, 'wt') as cache_fp:
+        cache_fp.write('[["apt", "json"')
+    search_cache.load()
+    assert search_cache.get('apt', 'json', None) is None
+
+
+def test_search_cache_only_saves_when_changed(tmp_path):
+    cache_file = tmp_path / 'cache' / 'searches.json.gz'
+    search_cache = CACHE.SearchCache(cache_file=str(cache_file))
+
+    search_cache.save()
+    assert not cache_file.exists()
+
+    search_cache.put('apt', 'json', None, ROWS)
+    search_cache.save()
+    os.utime(cache_file, (0, 0))
+    search_cache.save()
+    assert cache_file.stat().st_mtime == 0
+    assert [path.name for path in cache_file.parent.iterdir()] == ['searches.json.gz']
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru_cache = CACHE.LRUCache(2)
+    lru_cache.put('a', 1)
+    lru_cache.put('b', 2)
+    assert lru_cache.get('a') == 1
+    lru_cache.put('c', 3)
+
+    assert 'b' not in lru_cache
+    assert (lru_cache.get('a'), lru_cache.get('c'), lru_cache.get('b', 0)) == (1, 3, 0)
+    assert len(lru_cache) == 2
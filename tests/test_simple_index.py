@@ -0,0 +1,88 @@
+import os
+import json
+import threading
+
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.simple_index as SIMPLE
+
+
+def write_index(index_file, names):
+    with open(index_file, 'w') as index_fp:
+        json.dump({'meta' : {'_last-serial' : 1}, 'projects' : [{'name' : name} for name in names]}, index_fp)
+
+
+def test_parse_simple_index_json_and_html():
+    json_page = b'{"meta": {"api-version": "1.0"}, "projects": [{"name": "requests"}, {"name": "six", "summary": "py2/3"}, "bad"]}'
+    html_page = b'<html><body><a href="/simple/requests/">requests</a>\n<A HREF="/simple/six/"> six </A></body></html>'
+
+    assert SIMPLE.parse_simple_index(json_page, SIMPLE._SIMPLE_JSON_TYPE) == [('requests', ''), ('six', 'py2/3')]
+    assert SIMPLE.parse_simple_index(html_page, 'text/html') == [('requests', ''), ('six', '')]
+
+
+def test_sync_from_directory_is_conditional(tmp_path):
+    index_dir = tmp_path / 'simple'
+    for name in ['requests', 'six', '.hidden']:
+        os.makedirs(str(index_dir / name))
+    name_index = SIMPLE.SimpleNameIndex(str(index_dir), cache_file=str(tmp_path / 'cache' / 'simple.txt.gz'))
+
+    assert name_index.ensure_synced()
+    assert sorted(name_index.summaries) == ['requests', 'six']
+    # Unchanged, so nothing is read again
+    assert not name_index.sync()
+
+    loaded = SIMPLE.SimpleNameIndex(str(index_dir), cache_file=name_index.cache_file)
+    assert loaded.get_version() == name_index.get_version()
+    assert loaded.ensure_loaded()
+    assert [name for name, _ in loaded.search('request')] == ['requests']
+
+
+def test_failed_sync_is_not_retried_until_stale(tmp_path):
+    name_index = SIMPLE.SimpleNameIndex(str(tmp_path / 'missing.json'), cache_file=str(tmp_path / 'simple.txt.gz'))
+
+    assert not name_index.ensure_synced()
+    assert name_index.sync_failed > 0
+    assert not name_index.is_stale()
+
+
+def test_sync_fetches_without_holding_the_lock(tmp_path, monkeypatch):
+    index_file = str(tmp_path / 'simple.json')
+    write_index(index_file, ['requests'])
+    name_index = SIMPLE.SimpleNameIndex(index_file, cache_file=str(tmp_path / 'simple.txt.gz'))
+    name_index.sync()
+    write_index(index_file, ['requests', 'six'])
+    os.utime(index_file, (0, 0))
+
+    searches = []
+    fetch_local = name_index._fetch_local
+    def slow_fetch_local(*args):
+        # A search from another thread during the fetch still sees the old list
+        searcher = threading.Thread(target=lambda : searches.append(name_index.search('six')))
+        searcher.start()
+        searcher.join(timeout=5)
+        return fetch_local(*args)
+    monkeypatch.setattr(name_index, '_fetch_local', slow_fetch_local)
+
+    assert name_index.sync()
+    assert searches == [[]]
+    assert [name for name, _ in name_index.search('six')] == ['six']
+
+
+def test_prepare_search_never_syncs(tmp_path, monkeypatch):
+    index_file = str(tmp_path / 'simple.json')
+    write_index(index_file, ['requests', 'six'])
+    cache_file = str(tmp_path / 'simple.txt.gz')
+    name_index = SIMPLE.SimpleNameIndex(index_file, cache_file=cache_file)
+    monkeypatch.setattr(SIMPLE, 'get_name_index', lambda index_url=None : name_index)
+
+    PKG_MANAGERS.Pip('pip').prepare_search()
+    assert name_index.synced == 0
+    assert len(name_index) == 0
+
+    # With a local copy, it is loaded and indexed, still without checking the index
+    SIMPLE.SimpleNameIndex(index_file, cache_file=cache_file).sync()
+    write_index(index_file, ['requests', 'six', 'attrs'])
+    os.utime(index_file, (0, 0))
+    name_index = SIMPLE.SimpleNameIndex(index_file, cache_file=cache_file)
+    PKG_MANAGERS.Pip('pip').prepare_search()
+    assert sorted(name_index.summaries) == ['requests', 'six']
+    assert name_index._get_ranking_index().is_built()
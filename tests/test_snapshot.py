@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+import unipkg.command_handler as EXE
+import unipkg.operations as OPS
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.snapshot as SNAP
+
+
+def test_diff_packages():
+    wanted = {'curl' : '7.88', 'jq' : '1.6', 'wget' : '1.21', 'unpinned' : ''}
+    installed = {'curl' : '7.88', 'jq' : '1.7', 'vim' : '9.0', 'unpinned' : '3.0'}
+
+    diff = SNAP.diff_packages('apt', wanted, installed)
+
+    assert diff.manager_name == 'apt'
+    assert diff.to_install == {'wget' : '1.21'}
+    assert diff.to_remove == {'vim' : '9.0'}
+    # Packages recorded without a version are satisfied by any installed version
+    assert diff.to_change == {'jq' : ('1.7', '1.6')}
+    assert len(diff) == 3
+
+
+def test_diff_packages_in_sync():
+    packages = {'curl' : '7.88', 'jq' : '1.6'}
+    assert len(SNAP.diff_packages('apt', packages, dict(packages))) == 0
+
+
+def test_create_restore_ops_pins_versions():
+    apt = PKG_MANAGERS.Aptitude()
+    diff = SNAP.diff_packages('apt', {'jq' : '1.6', 'wget' : '1.21', 'new' : ''}, {'jq' : '1.7', 'vim' : '9.0'})
+
+    package_ops = SNAP.create_restore_ops(apt, diff)
+
+    assert [(package_op.op, package_op.pkg.name) for package_op in package_ops] == [
+        (OPS.OP_UNINSTALL, 'vim'),
+        (OPS.OP_INSTALL, 'jq=1.6'),
+        (OPS.OP_INSTALL, 'new'),
+        (OPS.OP_INSTALL, 'wget=1.21'),
+    ]
+    assert all(package_op.manager is apt for package_op in package_ops)
+    # Grouped, a restore is one removal and one install transaction
+    assert [(op, len(ops)) for _, op, ops in OPS.group_package_ops(package_ops)] == [(OPS.OP_UNINSTALL, 1), (OPS.OP_INSTALL, 3)]
+
+
+def test_create_restore_ops_without_removals():
+    npm = PKG_MANAGERS.Npm('npm')
+    diff = SNAP.diff_packages('npm', {'typescript' : '5.4.0'}, {'typescript' : '5.3.3', 'left-pad' : '1.3.0'})
+
+    package_ops = SNAP.create_restore_ops(npm, diff, remove=False)
+
+    assert [(package_op.op, package_op.pkg.name) for package_op in package_ops] == [(OPS.OP_INSTALL, 'typescript@5.4.0')]
+
+
+class FakeManager:
+
+    def __init__(self, name : str, installed=None, lock_name : str=None):
+        self.name = name
+        self.installed = installed
+        self.lock_name = name if lock_name is None else lock_name
+
+    def get_lock_name(self) -> str:
+        return self.lock_name
+
+    def get_installed_versions(self):
+        if self.installed is None:
+            raise EXE.CommandError(f'{self.name} is broken', 1)
+        return self.installed
+
+
+def test_take_snapshot_and_round_trip(tmp_path):
+    managers = [FakeManager('pip', {'six' : '1.16.0', 'attrs' : '23.1.0'}, lock_name='pip:/usr/bin/python3'),
+                FakeManager('pip3', {'other' : '1.0'}, lock_name='pip:/usr/bin/python3'),
+                FakeManager('npm', None)]
+
+    snapshot, errors = SNAP.take_snapshot(managers)
+
+    assert errors == {'npm' : 'npm is broken'}
+    assert snapshot['format'] == SNAP.SNAPSHOT_FORMAT
+    assert snapshot['managers'] == {'pip' : {'attrs' : '23.1.0', 'six' : '1.16.0'}}
+    assert list(snapshot['managers']['pip']) == ['attrs', 'six']
+
+    snapshot_file = str(tmp_path / 'unipkg.lock')
+    SNAP.save_snapshot(snapshot, snapshot_file)
+    assert SNAP.load_snapshot(snapshot_file) == snapshot
+
+
+def test_diff_snapshot_reports_errors_and_missing_managers():
+    snapshot = {'format' : SNAP.SNAPSHOT_FORMAT, 'managers' : {'apt' : {'curl' : '7.88'}, 'pip' : {'six' : '1.16.0'}, 'yum' : {}}}
+    managers = [FakeManager('apt', {'curl' : '7.80'}), FakeManager('pip', None), FakeManager('npm', {'left-pad' : '1.3.0'})]
+
+    diffs, errors, missing = SNAP.diff_snapshot(snapshot, managers)
+
+    assert list(diffs) == ['apt']
+    assert diffs['apt'].to_change == {'curl' : ('7.80', '7.88')}
+    assert errors == {'pip' : 'pip is broken'}
+    assert missing == ['yum']
+
+
+@pytest.mark.parametrize('content', [
+    '[]',
+    '{"format": 1}',
+    '{"format": 99, "managers": {}}',
+    '{"format": 1, "managers": {"apt": ["curl"]}}',
+    '{"format": 1, "managers": {"apt": {"curl": 7}}}',
+])
+def test_load_snapshot_rejects_malformed_files(tmp_path, content):
+    snapshot_file = tmp_path / 'unipkg.lock'
+    snapshot_file.write_text(content)
+
+    with pytest.raises(ValueError):
+        SNAP.load_snapshot(str(snapshot_file))
+
+
+def test_load_snapshot_accepts_saved_layout(tmp_path):
+    snapshot_file = tmp_path / 'unipkg.lock'
+    snapshot_file.write_text(json.dumps({'format' : 1, 'created' : '', 'host' : 'h', 'managers' : {'apt' : {'curl' : '7.88'}}}))
+
+    assert SNAP.load_snapshot(str(snapshot_file))['managers'] == {'apt' : {'curl' : '7.88'}}
+
+
+def test_apt_pinned_name():
+    apt = PKG_MANAGERS.Aptitude()
+    assert apt.get_pinned_name('curl', '7.88.1-10') == 'curl=7.88.1-10'
+    assert apt.get_pinned_name('curl', '') == 'curl'
+
+
+def test_npm_pinned_name():
+    npm = PKG_MANAGERS.Npm('npm')
+    assert npm.get_pinned_name('@vue/cli', '5.0.8') == '@vue/cli@5.0.8'
+    assert npm.get_pinned_name('typescript', '') == 'typescript'
+
+
+def test_pip_pinned_name():
+    pip = PKG_MANAGERS.Pip('pip')
+    assert pip.get_pinned_name('requests', '2.31.0') == 'requests==2.31.0'
+    assert pip.get_pinned_name('requests', '') == 'requests'
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+import unipkg.command_handler as EXE
+import unipkg.package_managers as PKG_MANAGERS
+
+
+def write_script(tmp_path, name, source):
+    script_file = tmp_path / name
+    script_file.write_text(source)
+    return f'{sys.executable} {script_file}'
+
+
+def is_running(pid : int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_stream_yields_decoded_lines(tmp_path):
+    command = write_script(tmp_path, 'lines.py', 'import sys\nsys.stdout.write("a\\r\\nb\\n\\nc")\n')
+    stream = EXE.stream_command(command, False)
+
+    assert list(stream) == ['a', 'b', '', 'c']
+    assert stream.returncode == 0
+
+
+def test_stream_raises_after_output_if_the_command_failed(tmp_path):
+    command = write_script(tmp_path, 'fail.py', 'import sys\nprint("partial")\nsys.stderr.write("boom")\nsys.exit(3)\n')
+    lines = []
+
+    with pytest.raises(EXE.CommandError) as error:
+        for line in EXE.stream_command(command, False):
+            lines.append(line)
+
+    assert lines == ['partial']
+    assert (error.value.out, error.value.err) == ('boom', 3)
+
+
+def test_stream_applies_backpressure_and_kills_on_early_break(tmp_path):
+    pid_file, done_file = tmp_path / 'pid', tmp_path / 'done'
+    command = write_script(tmp_path, 'flood.py',
+                           'import os, sys\n'
+                           f'open({str(pid_file)!r}, "w").write(str(os.getpid()))\n'
+                           'for _ in range(400):\n'
+                           '    sys.stdout.write("x" * 65535 + "\\n")\n'
+                           '    sys.stdout.flush()\n'
+                           f'open({str(done_file)!r}, "w").close()\n')
+
+    for line in EXE.stream_command(command, False):
+        # 25MB of output, far more than the queued chunks and the pipe can hold, so the child waits on the consumer
+        time.sleep(0.5)
+        assert not done_file.exists()
+        break
+
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not is_running(pid)
+    assert not done_file.exists()
+
+
+def test_early_breaks_leave_no_command_behind(tmp_path):
+    command = write_script(tmp_path, 'flood.py', 'import sys\nfor _ in range(400):\n    sys.stdout.write("x" * 65535 + "\\n")\n')
+    quick = write_script(tmp_path, 'quick.py', 'print("done")\n')
+
+    # More abandoned streams than commands can run at once, each stalled on its full pipe when it is abandoned
+    for _ in range(EXE.MAX_CONCURRENT_COMMANDS + 1):
+        for line in EXE.stream_command(command, False):
+            time.sleep(0.2)
+            break
+
+    async def count_tasks():
+        return len(asyncio.all_tasks()) - 1
+
+    engine = EXE.get_engine()
+    deadline = time.monotonic() + 5
+    while asyncio.run_coroutine_threadsafe(count_tasks(), engine.loop).result() > 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert asyncio.run_coroutine_threadsafe(count_tasks(), engine.loop).result() == 0
+    assert EXE.execute_command(quick, False, timeout=10) == ('done\n', 0)
+
+
+def test_stream_idle_timeout(tmp_path):
+    command = write_script(tmp_path, 'stall.py', 'import sys, time\nprint("first", flush=True)\ntime.sleep(30)\n')
+    lines = []
+    start = time.monotonic()
+
+    with pytest.raises(EXE.CommandError) as error:
+        for line in EXE.stream_command(command, False, idle_timeout=0.3):
+            lines.append(line)
+
+    assert lines == ['first']
+    assert error.value.err == EXE.ERR_TIMEOUT
+    assert time.monotonic() - start < 10
+
+
+def test_stream_missing_executable():
+    with pytest.raises(EXE.CommandError) as error:
+        list(EXE.stream_command('unipkg-no-such-executable --version', False))
+
+    assert error.value.err == EXE.ERR_NOT_FOUND
+
+
+def test_iter_batches_by_size():
+    assert list(PKG_MANAGERS.iter_batches(range(5), batch_size=2)) == [[0, 1], [2, 3], [4]]
+    assert list(PKG_MANAGERS.iter_batches([], batch_size=2)) == []
+
+
+def test_iter_batches_surfaces_slow_producers_early():
+    def slow_items():
+        for item in range(3):
+            time.sleep(0.05)
+            yield item
+
+    assert list(PKG_MANAGERS.iter_batches(slow_items(), batch_size=100, max_delay=0.01)) == [[0], [1], [2]]
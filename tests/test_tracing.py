@@ -0,0 +1,148 @@
+import sys
+import json
+import time
+
+import pytest
+
+import unipkg.command_handler as EXE
+import unipkg.tracing as TRACE
+
+
+@pytest.fixture
+def records():
+    records = []
+    TRACE.add_sink(records.append)
+    yield records
+    TRACE.remove_sink(records.append)
+
+
+def python_command(tmp_path, name, source):
+    script_file = tmp_path / name
+    script_file.write_text(source)
+    return f'{sys.executable} {script_file}'
+
+
+class FakeManager:
+
+    def __init__(self, command : str):
+        self.name = 'fake'
+        self.command = command
+
+    @TRACE.trace_method
+    def list_packages(self):
+        out, err = EXE.execute_command(self.command, False)
+        # Parsing
+        time.sleep(0.2)
+        return out.splitlines(), err
+
+    @TRACE.trace_method
+    def get_outdated_packages(self):
+        packages, err = self.list_packages()
+        return {name : '2.0' for name in packages}, err
+
+    @TRACE.trace_method
+    def install_packages(self):
+        return 'E: Unable to locate package', 100
+
+    @TRACE.trace_stream_method
+    def stream_list_packages(self):
+        yield ['a', 'b']
+        time.sleep(0.1)
+        yield ['c']
+
+
+def get_records(records, kind):
+    return [record for record in records if record['kind'] == kind]
+
+
+def test_nothing_is_traced_without_sinks(tmp_path):
+    manager = FakeManager(python_command(tmp_path, 'list.py', 'print("a")\n'))
+
+    assert not TRACE.is_enabled()
+    assert TRACE.start_command_trace('apt-cache search json') is None
+    assert manager.list_packages() == (['a'], 0)
+
+
+def test_method_time_is_split_into_command_and_parse_time(tmp_path, records):
+    manager = FakeManager(python_command(tmp_path, 'list.py', 'import time\ntime.sleep(0.3)\nprint("a\\nb")\n'))
+
+    assert manager.list_packages() == (['a', 'b'], 0)
+
+    command_record, = get_records(records, TRACE.KIND_COMMAND)
+    assert (command_record['manager'], command_record['method']) == ('fake', 'list_packages')
+    assert (command_record['exit_code'], command_record['output_bytes']) == (0, 4)
+    assert command_record['wall_time'] >= 0.3
+    method_record, = get_records(records, TRACE.KIND_METHOD)
+    assert (method_record['name'], method_record['rows'], method_record['failed']) == ('fake.list_packages', 2, False)
+    assert method_record['command_time'] >= 0.3
+    assert 0.2 <= method_record['parse_time'] < 0.3
+    assert method_record['wall_time'] == pytest.approx(method_record['command_time'] + method_record['parse_time'])
+
+
+def test_nested_methods_share_their_command_time(tmp_path, records):
+    manager = FakeManager(python_command(tmp_path, 'list.py', 'import time\ntime.sleep(0.3)\nprint("a")\n'))
+
+    manager.get_outdated_packages()
+
+    inner, outer = get_records(records, TRACE.KIND_METHOD)
+    assert (inner['method'], outer['method']) == ('list_packages', 'get_outdated_packages')
+    assert outer['command_time'] == inner['command_time']
+    assert outer['parse_time'] == pytest.approx(inner['parse_time'], abs=0.05)
+
+
+def test_failed_methods_are_flagged(records):
+    FakeManager('').install_packages()
+
+    assert get_records(records, TRACE.KIND_METHOD)[0]['failed']
+
+
+def test_stream_methods_exclude_the_consumers_time(records):
+    batches = []
+    for batch in FakeManager('').stream_list_packages():
+        batches.append(batch)
+        time.sleep(0.3)
+
+    assert batches == [['a', 'b'], ['c']]
+    method_record, = get_records(records, TRACE.KIND_METHOD)
+    assert (method_record['rows'], method_record['failed']) == (3, False)
+    assert 0.1 <= method_record['wall_time'] < 0.3
+
+
+def test_stats_table_aggregates_by_name():
+    stats_table = TRACE.StatsTable(max_recent=2)
+    for wall_time, exit_code in [(0.1, 0), (0.3, 1), (0.2, 0)]:
+        stats_table({'kind' : TRACE.KIND_COMMAND, 'name' : 'apt-cache search', 'wall_time' : wall_time,
+                     'cpu_time' : 0.05, 'exit_code' : exit_code, 'output_bytes' : 1024})
+    stats_table({'kind' : TRACE.KIND_METHOD, 'name' : 'apt.search_for_packages', 'wall_time' : 0.5,
+                 'command_time' : 0.4, 'parse_time' : 0.1, 'rows' : 20, 'failed' : False})
+
+    stats = stats_table.get_stats(TRACE.KIND_COMMAND)['apt-cache search']
+    assert (stats['calls'], stats['errors'], stats['output_bytes']) == (3, 1, 3072)
+    assert stats['wall_time'] == pytest.approx(0.6)
+    assert stats['max_wall_time'] == 0.3
+    assert len(stats_table.recent) == 2
+    report = stats_table.get_report().splitlines()
+    assert report[1].split()[:3] == ['apt.search_for_packages', '1', '0']
+    assert report[-1].split()[:4] == ['apt-cache', 'search', '3', '1']
+
+    stats_table.clear()
+    assert stats_table.get_stats(TRACE.KIND_COMMAND) == {}
+
+
+def test_jsonl_sink_appends_records(tmp_path):
+    trace_file = tmp_path / 'traces' / 'unipkg.jsonl'
+    sink = TRACE.JsonlSink(str(trace_file))
+    sink({'kind' : TRACE.KIND_COMMAND, 'name' : 'npm search'})
+    sink.close()
+    sink({'kind' : TRACE.KIND_COMMAND, 'name' : 'ignored after close'})
+
+    sink = TRACE.JsonlSink(str(trace_file))
+    sink({'kind' : TRACE.KIND_METHOD, 'name' : 'npm.list_packages'})
+    sink.close()
+
+    assert [json.loads(line)['name'] for line in trace_file.read_text().splitlines()] == ['npm search', 'npm.list_packages']
+
+
+def test_command_names():
+    assert TRACE.get_command_name('apt-cache -q search json') == 'apt-cache search'
+    assert TRACE.get_command_name('dpkg-query') == 'dpkg-query'
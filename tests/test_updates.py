@@ -0,0 +1,233 @@
+import os
+import time
+
+import pytest
+
+import unipkg.command_handler as EXE
+import unipkg.indexes as IDX
+import unipkg.operations as OPS
+import unipkg.package_managers as PKG_MANAGERS
+import unipkg.updates as UPD
+
+
+def write_file(file_path, text):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file_fp:
+        file_fp.write(text)
+
+
+def write_release(lists_dir, suite, fields=''):
+    write_file(os.path.join(lists_dir, f'deb_dists_{suite}_InRelease'),
+               '-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA512\n\n'
+               f'Origin: Debian\nSuite: {suite}\n{fields}SHA256:\n 0123 1024 main/binary-amd64/Packages\n')
+
+
+def create_backports_apt(tmp_path, status_text, backports_fields='NotAutomatic: yes\nButAutomaticUpgrades: yes\n'):
+    status_file = str(tmp_path / 'status')
+    write_file(status_file, status_text)
+    lists_dir = str(tmp_path / 'lists')
+    write_release(lists_dir, 'bookworm')
+    write_release(lists_dir, 'bookworm-backports', backports_fields)
+    write_file(os.path.join(lists_dir, 'deb_dists_bookworm_main_binary-amd64_Packages'),
+               'Package: curl\nVersion: 7.88.1-10\nDescription: command line tool for transferring data\n\n'
+               'Package: cockpit\nVersion: 287-1\nDescription: web console\n\n')
+    write_file(os.path.join(lists_dir, 'deb_dists_bookworm-backports_main_binary-amd64_Packages'),
+               'Package: curl\nVersion: 8.5.0-2~bpo12+1\nDescription: command line tool for transferring data\n\n'
+               'Package: cockpit\nVersion: 310-1~bpo12+1\nDescription: web console\n\n'
+               'Package: bpo-only\nVersion: 2.0-1~bpo12+1\nDescription: only in backports\n\n')
+    apt = PKG_MANAGERS.Aptitude()
+    apt.status_index = IDX.DpkgStatusIndex(status_file)
+    apt.catalog_index = IDX.AptCatalogIndex(lists_dir, architecture='amd64', preferences_file=str(tmp_path / 'preferences'),
+                                            preferences_dir=str(tmp_path / 'preferences.d'))
+    return apt
+
+
+def test_read_release_priority(tmp_path):
+    lists_dir = str(tmp_path)
+    write_release(lists_dir, 'stable')
+    write_release(lists_dir, 'experimental', 'NotAutomatic: yes\n')
+    write_release(lists_dir, 'stable-backports', 'NotAutomatic: yes\nButAutomaticUpgrades: yes\n')
+
+    assert IDX.read_release_priority(os.path.join(lists_dir, 'deb_dists_stable_InRelease')) == IDX.PRIORITY_DEFAULT
+    assert IDX.read_release_priority(os.path.join(lists_dir, 'deb_dists_experimental_InRelease')) == IDX.PRIORITY_NOT_AUTOMATIC
+    assert IDX.read_release_priority(os.path.join(lists_dir, 'deb_dists_stable-backports_InRelease')) == IDX.PRIORITY_AUTOMATIC_UPGRADES
+    assert IDX.read_release_priority(os.path.join(lists_dir, 'missing_InRelease')) == IDX.PRIORITY_DEFAULT
+
+
+def test_backports_only_upgrade_packages_installed_from_backports(tmp_path):
+    apt = create_backports_apt(tmp_path,
+                               'Package: curl\nStatus: install ok installed\nVersion: 7.88.1-10\n\n'
+                               'Package: cockpit\nStatus: install ok installed\nVersion: 300-1~bpo12+1\n\n'
+                               'Package: bpo-only\nStatus: install ok installed\nVersion: 1.0-1~bpo12+1\n\n')
+
+    outdated, _, err = apt.get_outdated_packages()
+
+    assert err == 0
+    # curl comes from the main suite, where it is up to date
+    assert outdated == {
+        'cockpit' : ('300-1~bpo12+1', '310-1~bpo12+1', 'web console'),
+        'bpo-only' : ('1.0-1~bpo12+1', '2.0-1~bpo12+1', 'only in backports'),
+    }
+    # New installs get the main suite version, unless only backports has the package
+    assert apt.catalog_index.get('curl') == ('7.88.1-10', 'command line tool for transferring data')
+    assert apt.catalog_index.get('bpo-only') == ('2.0-1~bpo12+1', 'only in backports')
+
+
+def test_not_automatic_suites_never_upgrade(tmp_path):
+    apt = create_backports_apt(tmp_path,
+                               'Package: cockpit\nStatus: install ok installed\nVersion: 300-1~bpo12+1\n\n',
+                               backports_fields='NotAutomatic: yes\n')
+
+    assert apt.get_outdated_packages() == ({}, '', 0)
+
+
+def test_apt_catalog_index_skips_foreign_architectures(tmp_path):
+    lists_dir = str(tmp_path / 'lists')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable_main_binary-amd64_Packages'), 'Package: curl\nVersion: 7.88\n\n')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable_main_binary-i386_Packages'), 'Package: curl\nVersion: 9.0\n\nPackage: wine32\nVersion: 8.0\n\n')
+    write_file(os.path.join(lists_dir, 'deb_dists_stable_main_binary-all_Packages'), 'Package: tzdata\nVersion: 2024a\n\n')
+
+    index = IDX.AptCatalogIndex(lists_dir, architecture='amd64')
+    index.refresh()
+
+    assert {name : version for name, (version, _) in index.packages.items()} == {'curl' : '7.88', 'tzdata' : '2024a'}
+
+
+def test_pins_fall_back_to_apt(tmp_path, monkeypatch):
+    apt = create_backports_apt(tmp_path, 'Package: curl\nStatus: install ok installed\nVersion: 7.88.1-10\n\n')
+    write_file(str(tmp_path / 'preferences.d' / 'ignored.disabled'), 'Package: curl\nPin: release a=bookworm-backports\nPin-Priority: 990\n')
+    write_file(str(tmp_path / 'preferences.d' / 'comments'), '# nothing pinned\n\n')
+    assert not apt.catalog_index.has_pins()
+
+    write_file(str(tmp_path / 'preferences.d' / 'curl.pref'), 'Package: curl\nPin: release a=bookworm-backports\nPin-Priority: 990\n')
+    commands = []
+    def execute_command(command, as_admin, *args, **kwargs):
+        commands.append(command)
+        return 'Listing...\ncurl/bookworm-backports 8.5.0-2~bpo12+1 amd64 [upgradable from: 7.88.1-10]\n', 0
+    monkeypatch.setattr(EXE, 'execute_command', execute_command)
+
+    assert apt.catalog_index.has_pins()
+    assert apt.get_outdated_packages() == ({'curl' : ('7.88.1-10', '8.5.0-2~bpo12+1', '')}, '', 0)
+    assert commands == ['apt list --upgradable']
+
+
+@pytest.mark.parametrize('first, second', [
+    ('1.0', '1.1'),
+    ('1.9', '1.10'),
+    ('1.0~rc1', '1.0'),
+    ('1.0~~', '1.0~'),
+    ('1.0', '1.0a'),
+    ('1.0a', '1.0+'),
+    ('1.0-1', '1.0-2'),
+    ('1.0-9', '1.0-10'),
+    ('9.9', '1:0.1'),
+    ('1:2.0', '2:1.0'),
+    ('2.30-1ubuntu1', '2.30-1ubuntu2'),
+])
+def test_compare_deb_versions_orders_older_first(first, second):
+    assert IDX.compare_deb_versions(first, second) < 0
+    assert IDX.compare_deb_versions(second, first) > 0
+
+
+@pytest.mark.parametrize('version', ['1.0', '0:1.0', '1.0-1', '1.0~rc1', '2:3.4+dfsg-1'])
+def test_compare_deb_versions_equal(version):
+    assert IDX.compare_deb_versions(version, version) == 0
+
+
+def test_compare_deb_versions_implicit_epoch_and_zero_padding():
+    assert IDX.compare_deb_versions('0:1.0', '1.0') == 0
+    assert IDX.compare_deb_versions('1.01', '1.1') == 0
+
+
+def test_apt_parse_upgradable_output():
+    out = ('Listing... Done\n'
+           'curl/stable-security 7.88.1-10+deb12u5 amd64 [upgradable from: 7.88.1-10+deb12u4]\n'
+           'tzdata/stable-updates 2024a-0+deb12u1 all [upgradable from: 2023c-5]\n'
+           'N: There is 1 additional version. Please use the \'-a\' switch to see it\n')
+    outdated = PKG_MANAGERS.Aptitude().parse_upgradable_output(out)
+
+    assert outdated == {
+        'curl'   : ('7.88.1-10+deb12u4', '7.88.1-10+deb12u5', ''),
+        'tzdata' : ('2023c-5', '2024a-0+deb12u1', ''),
+    }
+
+
+class FakeManager:
+
+    def __init__(self, name : str, outdated=None, lock_name : str=None, error : str=None):
+        self.name = name
+        self.outdated = {} if outdated is None else outdated
+        self.error = error
+        self.lock_name = name if lock_name is None else lock_name
+        self.catalog_version = 1
+        self.installed_version = 1
+        self.num_checks = 0
+
+    def get_catalog_version(self):
+        return self.catalog_version
+
+    def get_installed_version(self):
+        return self.installed_version
+
+    def get_lock_name(self) -> str:
+        return self.lock_name
+
+    def get_outdated_packages(self):
+        self.num_checks += 1
+        if self.error is not None:
+            return None, self.error, 100
+        # Slow enough that running one after another would show
+        time.sleep(0.3)
+        return dict(self.outdated), '', 0
+
+
+def test_update_checker_reuses_results_until_the_state_changes(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(UPD.time, 'monotonic', lambda : now[0])
+    apt = FakeManager('apt', {'curl' : ('7.88.1-10', '7.88.1-11', '')})
+    checker = UPD.UpdateChecker(ttl=60)
+
+    assert checker.check_manager(apt) == apt.outdated
+    assert checker.check_manager(apt) == apt.outdated
+    assert apt.num_checks == 1
+
+    apt.installed_version = 2
+    checker.check_manager(apt)
+    assert apt.num_checks == 2
+
+    now[0] += 60
+    checker.check_manager(apt)
+    assert apt.num_checks == 3
+
+    checker.invalidate(apt)
+    checker.check_manager(apt)
+    checker.invalidate()
+    checker.check_manager(apt)
+    assert apt.num_checks == 5
+
+
+def test_update_checker_checks_managers_concurrently():
+    apt = FakeManager('apt', {'curl' : ('7.88.1-10', '7.88.1-11', '')})
+    npm = FakeManager('npm', {'typescript' : ('5.3.3', '5.4.0', 'TypeScript')})
+    pip, pip3 = FakeManager('pip', lock_name='pip:/usr/bin/python3'), FakeManager('pip3', lock_name='pip:/usr/bin/python3')
+    broken = FakeManager('snap', error='E: Could not open lock file')
+    reported = []
+    start = time.monotonic()
+
+    results, errors = UPD.UpdateChecker().check([apt, npm, pip, pip3, broken],
+                                                on_result=lambda manager, outdated, error : reported.append(manager.name))
+
+    assert time.monotonic() - start < 0.55
+    assert results == {'apt' : apt.outdated, 'npm' : npm.outdated, 'pip' : {}}
+    assert errors == {'snap' : 'E: Could not open lock file'}
+    assert sorted(reported) == ['apt', 'npm', 'pip', 'snap']
+    assert pip3.num_checks == 0
+
+
+def test_create_update_ops_sorted_by_name():
+    npm = FakeManager('npm')
+    update_ops = UPD.create_update_ops(npm, {'typescript' : ('5.3.3', '5.4.0', 'TypeScript'), 'Eslint' : ('8.0.0', '8.57.0', '')})
+
+    assert [(package_op.pkg.name, package_op.pkg.installed_version, package_op.pkg.new_version, package_op.op) for package_op in update_ops] == [
+        ('Eslint', '8.0.0', '8.57.0', OPS.OP_UPDATE), ('typescript', '5.3.3', '5.4.0', OPS.OP_UPDATE)]
+    assert all(package_op.manager is npm and package_op.pkg.source == 'npm' for package_op in update_ops)
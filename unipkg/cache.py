@@ -0,0 +1,316 @@
+"""Module containing the caches used to avoid repeated subprocess calls in unipkg
+"""
+
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+import unipkg.command_handler as EXE
+
+
+def get_cache_dir() -> str:
+    """Function that returns the directory used for persisting unipkg caches
+
+    Returns
+    -------
+    cache_dir : str
+        $XDG_CACHE_HOME/unipkg if set, otherwise ~/.cache/unipkg
+    """
+
+    base_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base_dir, 'unipkg')
+
+
+def get_executable_stamp(executable : str) -> Optional[Tuple[str, float]]:
+    """Function that resolves an executable on PATH to its real location and modification time
+
+    Parameters
+    ----------
+    executable : str
+        Name of the executable, ex. pip3
+
+    Returns
+    -------
+    stamp : tuple of str, float
+        The resolved path and its mtime, or None if the executable is not on PATH
+    """
+
+    exe_path = shutil.which(executable)
+    if exe_path is None:
+        return None
+    exe_path = os.path.realpath(exe_path)
+    try:
+        return exe_path, os.stat(exe_path).st_mtime
+    except OSError:
+        return None
+
+
+def write_json_atomic(file_path : str, data, indent : int=None) -> None:
+    """Function that writes json data to a file by way of a temporary file, so readers never see partial writes
+
+    Parameters
+    ----------
+    file_path : str
+        Target file path
+    data : object
+        json serializable data
+    indent : int
+        Indentation for files meant to be read or diffed by people, compact by default
+    """
+
+    file_path = os.path.abspath(file_path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as tmp_fp:
+        json.dump(data, tmp_fp, indent=indent)
+    os.replace(tmp_path, file_path)
+
+
+class ProbeCache:
+    """Class that persists the result of PackageManager.check_exists across runs
+
+    Entries are keyed on the installer name, and are only valid as long as the installer
+    still resolves to the same path on PATH with the same mtime. Probes that timed out, or could
+    not start the installer, say nothing lasting about it and are not kept.
+
+    Attributes
+    ----------
+    cache_file : str
+        Path to the json file backing the cache
+    entries : dict
+        installer name -> [resolved path, mtime, exists]
+    """
+
+    def __init__(self, cache_file : str=None):
+        if cache_file is None:
+            cache_file = os.path.join(get_cache_dir(), 'probes.json')
+        self.cache_file = cache_file
+        self.entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+
+    def load(self) -> None:
+        try:
+            with open(self.cache_file, 'r') as cache_fp:
+                entries = json.load(cache_fp)
+            if isinstance(entries, dict):
+                self.entries = entries
+        except (OSError, ValueError):
+            self.entries = {}
+
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            write_json_atomic(self.cache_file, self.entries)
+            self._dirty = False
+        except OSError:
+            pass
+
+
+    def check(self, package_manager) -> bool:
+        """Checks if a package manager exists, probing it with a subprocess only on a cache miss
+
+        Parameters
+        ----------
+        package_manager : PackageManager
+            The manager to check
+
+        Returns
+        -------
+        exists : bool
+            True if the package manager is usable on this system
+        """
+
+        stamp = get_executable_stamp(package_manager.installer_name)
+        if stamp is None:
+            return False
+
+        exe_path, mtime = stamp
+        with self._lock:
+            entry = self.entries.get(package_manager.installer_name)
+        if entry is not None and entry[0] == exe_path and entry[1] == mtime:
+            return entry[2]
+
+        err = package_manager.probe()
+        exists = err == 0
+        if err in (EXE.ERR_TIMEOUT, EXE.ERR_NOT_FOUND):
+            return exists
+        with self._lock:
+            self.entries[package_manager.installer_name] = [exe_path, mtime, exists]
+            self._dirty = True
+        return exists
+
+
+class LRUCache:
+    """Class representing a thread-safe, size bounded least-recently-used cache
+
+    Attributes
+    ----------
+    max_entries : int
+        Once exceeded, the least recently used entries are evicted
+    """
+
+    def __init__(self, max_entries : int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def __contains__(self, key : Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+
+    def get(self, key : Hashable, default : Any=None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+
+    def put(self, key : Hashable, value : Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def get_version_hash(version : Any) -> Optional[str]:
+    """Function that reduces a catalog version (ex. a stamp of file mtimes) to a short string that can be persisted
+    """
+
+    if version is None:
+        return None
+    return hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+
+
+def normalize_search_key(search_key : str) -> str:
+    return ' '.join(search_key.lower().split())
+
+
+class SearchCache:
+    """Class representing a cache of search results, persisted to disk between runs
+
+    Entries are keyed on package manager name and normalized search key. They expire after ttl
+    seconds, or as soon as the manager reports a different catalog version. Results are stored as
+    compact (name, version, description, installed) rows, and the least recently used entries are
+    evicted once more than max_rows rows are held.
+
+    Attributes
+    ----------
+    ttl : float
+        Seconds an entry stays valid
+    max_rows : int
+        Maximum total number of result rows held
+    cache_file : str
+        Path to the gzipped json file backing the cache
+    """
+
+    def __init__(self, ttl : float=3600, max_rows : int=100000, cache_file : str=None):
+        if cache_file is None:
+            cache_file = os.path.join(get_cache_dir(), 'searches.json.gz')
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.cache_file = cache_file
+        self._entries = OrderedDict()
+        self._num_rows = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+
+    def load(self) -> None:
+        try:
+            with gzip.open(self.cache_file, 'rt') as cache_fp:
+                entries = json.load(cache_fp)
+        except (OSError, ValueError, EOFError):
+            return
+        with self._lock:
+            now = time.time()
+            for manager_name, search_key, created, version, rows in entries:
+                if now - created < self.ttl:
+                    self._put((manager_name, search_key), (created, version, [tuple(row) for row in rows]))
+
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [[key[0], key[1], created, version, rows] for key, (created, version, rows) in self._entries.items()]
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_path = f'{self.cache_file}.{os.getpid()}.tmp'
+            with gzip.open(tmp_path, 'wt') as tmp_fp:
+                json.dump(entries, tmp_fp, separators=(',', ':'))
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass
+
+
+    def _put(self, key : Tuple[str, str], entry : Tuple) -> None:
+        if key in self._entries:
+            self._num_rows -= len(self._entries.pop(key)[2])
+        self._entries[key] = entry
+        self._num_rows += len(entry[2])
+        while self._num_rows > self.max_rows and len(self._entries) > 0:
+            _, evicted = self._entries.popitem(last=False)
+            self._num_rows -= len(evicted[2])
+
+
+    def get(self, manager_name : str, search_key : str, version : Any) -> Optional[List[Tuple[str, str, str, bool]]]:
+        """Gets cached results for a search, if they are still valid
+
+        Parameters
+        ----------
+        manager_name : str
+            Name of the package manager searched
+        search_key : str
+            The search key
+        version : object
+            Current catalog version of the manager, see PackageManager.get_catalog_version
+
+        Returns
+        -------
+        rows : list of (str, str, str, bool)
+            (name, version, description, installed) rows, or None on a miss
+        """
+
+        key = (manager_name, normalize_search_key(search_key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, entry_version, rows = entry
+            if time.time() - created >= self.ttl or entry_version != get_version_hash(version):
+                self._num_rows -= len(self._entries.pop(key)[2])
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            return rows
+
+
+    def put(self, manager_name : str, search_key : str, version : Any, rows : List[Tuple[str, str, str, bool]]) -> None:
+        key = (manager_name, normalize_search_key(search_key))
+        with self._lock:
+            self._put(key, (time.time(), get_version_hash(version), list(rows)))
+            self._dirty = True
@@ -0,0 +1,313 @@
+"""CLI
+
+File containing the headless command line interface for unipkg, for use in scripts and CI.
+
+Results are written to stdout as they are produced, one per line, either as padded text rows or
+as json objects with --json. This module must never import py_cui.
+"""
+
+import sys
+import json
+import argparse
+from typing import Dict, List, Optional, TextIO
+
+import unipkg
+import unipkg.operations as OPS
+import unipkg.cache as CACHE
+import unipkg.command_handler as EXE
+import unipkg.profiling as PROFILING
+import unipkg.snapshot as SNAP
+
+
+def add_subcommands(subparsers) -> None:
+    """Function that registers the headless subcommands on the unipkg argument parser
+    """
+
+    def add_common_args(subparser : argparse.ArgumentParser) -> None:
+        subparser.add_argument('-m', '--manager', help='Package manager to use, defaults to the first one detected')
+        subparser.add_argument('--json', action='store_true', help='Write one json object per line')
+
+    search_parser = subparsers.add_parser('search', help='Search for packages')
+    search_parser.add_argument('search_key', help='The search key')
+    search_parser.add_argument('-n', '--limit', type=int, help='Maximum number of results')
+    add_common_args(search_parser)
+
+    list_parser = subparsers.add_parser('list', help='List installed packages')
+    add_common_args(list_parser)
+
+    for command, help_text in [(OPS.OP_INSTALL, 'Install packages'), (OPS.OP_UNINSTALL, 'Remove packages')]:
+        op_parser = subparsers.add_parser('install' if command == OPS.OP_INSTALL else 'remove', help=help_text)
+        op_parser.add_argument('packages', nargs='+', help='Package names')
+        op_parser.set_defaults(op=command)
+        add_common_args(op_parser)
+
+    info_parser = subparsers.add_parser('info', help='Show package details')
+    info_parser.add_argument('packages', nargs='+', help='Package names')
+    add_common_args(info_parser)
+
+    def add_snapshot_args(subparser : argparse.ArgumentParser) -> None:
+        subparser.add_argument('snapshot_file', help='The snapshot lockfile')
+        subparser.add_argument('-m', '--manager', help='Package manager to use, defaults to every one detected')
+        subparser.add_argument('--json', action='store_true', help='Write one json object per line')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='Write the installed packages of every manager to a lockfile')
+    add_snapshot_args(snapshot_parser)
+
+    diff_parser = subparsers.add_parser('diff', help='Compare a snapshot with the installed packages, exits with 1 if they differ')
+    add_snapshot_args(diff_parser)
+
+    restore_parser = subparsers.add_parser('restore', help='Install, remove and change versions until the installed packages match a snapshot')
+    restore_parser.add_argument('--dry-run', action='store_true', help='Only show the transactions that would run')
+    restore_parser.add_argument('--no-remove', action='store_true', help='Keep installed packages that are not in the snapshot')
+    add_snapshot_args(restore_parser)
+
+
+def get_package_manager(manager_name : str):
+    """Function that finds the package manager to run a subcommand with
+
+    Parameters
+    ----------
+    manager_name : str
+        Name of the manager, ex. apt. None for the first detected manager
+
+    Returns
+    -------
+    manager : PackageManager
+        The manager, or None if it is not available on this system
+    """
+
+    if manager_name is None:
+        managers = unipkg.find_supported_package_managers()
+        return managers[0] if len(managers) > 0 else None
+    if manager_name not in unipkg.supported_package_managers.get_installed_names():
+        return None
+    manager = unipkg.supported_package_managers[manager_name]
+    probe_cache = CACHE.ProbeCache()
+    probe_cache.load()
+    exists = probe_cache.check(manager)
+    probe_cache.save()
+    PROFILING.mark('probe managers')
+    return manager if exists else None
+
+
+def get_package_managers(manager_name : str) -> Optional[List]:
+    """Function that finds the package managers to run a snapshot subcommand with
+
+    Returns
+    -------
+    managers : list of PackageManager
+        Every detected manager if manager_name is None, or just the named one. None if it is not available on this system
+    """
+
+    if manager_name is None:
+        return unipkg.find_supported_package_managers()
+    manager = get_package_manager(manager_name)
+    return None if manager is None else [manager]
+
+
+def write_package(out_fp : TextIO, manager, pkg, as_json : bool) -> None:
+    if as_json:
+        out_fp.write(json.dumps({'manager' : manager.name, 'name' : pkg.name, 'version' : pkg.version,
+                                 'description' : pkg.description, 'installed' : pkg.installed}))
+    else:
+        out_fp.write(str(pkg))
+    out_fp.write('\n')
+
+
+def write_batches(out_fp : TextIO, manager, batches, as_json : bool, limit : int=None) -> int:
+    num_written = 0
+    for batch in batches:
+        if num_written == 0:
+            PROFILING.mark('first results')
+        for pkg in batch:
+            if limit is not None and num_written >= limit:
+                return num_written
+            write_package(out_fp, manager, pkg, as_json)
+            num_written += 1
+        # Flushed per batch, so consumers of the pipe see results as soon as they are parsed
+        out_fp.flush()
+    return num_written
+
+
+def run_search(args : argparse.Namespace, manager, out_fp : TextIO) -> int:
+    write_batches(out_fp, manager, manager.stream_search_for_packages(args.search_key), args.json, limit=args.limit)
+    return 0
+
+
+def run_list(args : argparse.Namespace, manager, out_fp : TextIO) -> int:
+    write_batches(out_fp, manager, manager.stream_list_packages(), args.json)
+    return 0
+
+
+def run_op(args : argparse.Namespace, manager, out_fp : TextIO) -> int:
+
+    def on_result(package_op, success, output):
+        if args.json:
+            out_fp.write(json.dumps({'manager' : manager.name, 'name' : package_op.pkg.name, 'op' : package_op.op,
+                                     'success' : success, 'output' : output}))
+        else:
+            status = 'Done' if success else 'Error'
+            out_fp.write(f'{status}: {package_op.op} {package_op.pkg.name}')
+        out_fp.write('\n')
+        out_fp.flush()
+
+    package_ops = [OPS.PackageOp(manager.package_class(name, '', '', args.op != OPS.OP_INSTALL), args.op, manager) for name in args.packages]
+    _, failed = OPS.apply_batch(manager, args.op, package_ops, None, on_result=on_result)
+    return 0 if len(failed) == 0 else 1
+
+
+def run_info(args : argparse.Namespace, manager, out_fp : TextIO) -> int:
+    packages = [manager.package_class(name, '', '', False) for name in args.packages]
+    details = manager.get_package_details(packages)
+    for pkg in packages:
+        if args.json:
+            out_fp.write(json.dumps({'manager' : manager.name, 'name' : pkg.name, 'version' : pkg.version,
+                                     'description' : pkg.description, 'info' : details.get(pkg.name)}))
+        else:
+            out_fp.write(details.get(pkg.name, str(pkg)))
+        out_fp.write('\n')
+    out_fp.flush()
+    return 0
+
+
+def write_diff(out_fp : TextIO, diff, as_json : bool) -> None:
+    rows = [('install', name, None, version) for name, version in diff.to_install.items()]
+    rows.extend(('remove', name, version, None) for name, version in diff.to_remove.items())
+    rows.extend(('change', name, installed_version, version) for name, (installed_version, version) in diff.to_change.items())
+    for action, name, installed_version, version in rows:
+        if as_json:
+            out_fp.write(json.dumps({'manager' : diff.manager_name, 'name' : name, 'action' : action,
+                                     'installed' : installed_version, 'version' : version}))
+        elif action == 'install':
+            out_fp.write(f'{diff.manager_name}: + {name} {version}'.rstrip())
+        elif action == 'remove':
+            out_fp.write(f'{diff.manager_name}: - {name} {installed_version}')
+        else:
+            out_fp.write(f'{diff.manager_name}: ~ {name} {installed_version} -> {version}')
+        out_fp.write('\n')
+    out_fp.flush()
+
+
+def write_errors(err_fp : TextIO, errors : Dict[str, str], missing : List[str]=()) -> None:
+    for manager_name, error in errors.items():
+        err_fp.write(f'Error: {manager_name}: {error.strip()}\n')
+    for manager_name in missing:
+        err_fp.write(f'Warning: {manager_name} is in the snapshot but not available on this system, skipped\n')
+
+
+def run_snapshot(args : argparse.Namespace, managers : List, out_fp : TextIO, err_fp : TextIO) -> int:
+    snapshot, errors = SNAP.take_snapshot(managers)
+    SNAP.save_snapshot(snapshot, args.snapshot_file)
+    for manager_name, packages in snapshot['managers'].items():
+        if args.json:
+            out_fp.write(json.dumps({'manager' : manager_name, 'packages' : len(packages)}))
+        else:
+            out_fp.write(f'{manager_name}: {len(packages)} packages')
+        out_fp.write('\n')
+    out_fp.flush()
+    write_errors(err_fp, errors)
+    return 0 if len(errors) == 0 else 1
+
+
+def run_diff(args : argparse.Namespace, managers : List, out_fp : TextIO, err_fp : TextIO) -> int:
+    diffs, errors, missing = SNAP.diff_snapshot(SNAP.load_snapshot(args.snapshot_file), managers)
+    for diff in diffs.values():
+        write_diff(out_fp, diff, args.json)
+    write_errors(err_fp, errors, missing)
+    if len(errors) > 0:
+        return 2
+    return 1 if any(len(diff) > 0 for diff in diffs.values()) else 0
+
+
+def run_restore(args : argparse.Namespace, managers : List, out_fp : TextIO, err_fp : TextIO) -> int:
+    diffs, errors, missing = SNAP.diff_snapshot(SNAP.load_snapshot(args.snapshot_file), managers)
+    write_errors(err_fp, errors, missing)
+    available = {manager.name : manager for manager in managers}
+    package_ops = []
+    for manager_name, diff in diffs.items():
+        package_ops.extend(SNAP.create_restore_ops(available[manager_name], diff, remove=not args.no_remove))
+    groups = OPS.group_package_ops(package_ops)
+
+    def write_group(manager, op, group_ops):
+        if args.json:
+            out_fp.write(json.dumps({'manager' : manager.name, 'op' : op, 'packages' : [package_op.pkg.name for package_op in group_ops]}))
+        else:
+            out_fp.write(f'{manager.name}: {op} {" ".join(package_op.pkg.name for package_op in group_ops)}')
+        out_fp.write('\n')
+        out_fp.flush()
+
+    if args.dry_run:
+        for group in groups:
+            write_group(*group)
+        return 0 if len(errors) == 0 else 1
+
+    def on_result(package_op, success, output):
+        if not success:
+            err_fp.write(f'Error: {package_op.manager.name}: {package_op.op} {package_op.pkg.name}: {output.strip()}\n')
+
+    # One line per transaction as it starts, failures are reported per package
+    _, failed = OPS.apply_scheduled(groups, None, on_result=on_result, on_group_start=write_group)
+    return 0 if len(failed) == 0 and len(errors) == 0 else 1
+
+
+SUBCOMMANDS = {
+    'search'    : run_search,
+    'list'      : run_list,
+    'install'   : run_op,
+    'remove'    : run_op,
+    'info'      : run_info,
+}
+
+
+# Subcommands working on several managers at once, called with (args, managers, out_fp, err_fp)
+SNAPSHOT_SUBCOMMANDS = {
+    'snapshot'  : run_snapshot,
+    'diff'      : run_diff,
+    'restore'   : run_restore,
+}
+
+
+def run(args : argparse.Namespace, out_fp : TextIO=None, err_fp : TextIO=None) -> int:
+    """Function that runs a headless subcommand
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed arguments, see unipkg.parse_args
+    out_fp, err_fp : file
+        Where results and errors are written, stdout and stderr by default
+
+    Returns
+    -------
+    exit_code : int
+        0 on success
+    """
+
+    out_fp = sys.stdout if out_fp is None else out_fp
+    err_fp = sys.stderr if err_fp is None else err_fp
+
+    if args.command in SNAPSHOT_SUBCOMMANDS:
+        managers = get_package_managers(args.manager)
+        run_subcommand = lambda : SNAPSHOT_SUBCOMMANDS[args.command](args, managers, out_fp, err_fp)
+    else:
+        manager = get_package_manager(args.manager)
+        managers = None if manager is None else [manager]
+        run_subcommand = lambda : SUBCOMMANDS[args.command](args, manager, out_fp)
+    if managers is None:
+        err_fp.write(f'Error: package manager {args.manager} is not available on this system\n')
+        return 2
+
+    try:
+        return run_subcommand()
+    except EXE.CommandError as e:
+        err_fp.write(f'Error: {e.out.strip()}\n')
+        return 1
+    except BrokenPipeError:
+        # Output piped into ex. head, which stopped reading
+        return 0
+    except (OSError, ValueError) as e:
+        # Snapshot lockfiles that can't be read or written
+        err_fp.write(f'Error: {e}\n')
+        return 2
+    finally:
+        EXE.get_engine().shutdown()
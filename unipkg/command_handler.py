@@ -2,12 +2,18 @@
 """
 
 
-import ctypes, os
-from typing import List
+import os
+from typing import Callable, Iterator, List, Optional, Tuple
 from sys import platform
-from subprocess import Popen, PIPE
+import asyncio
+import concurrent.futures
+import threading
+import signal
+import time
 import re
 
+import unipkg.tracing as TRACE
+
 WITH_PEXPECT=True
 
 try:
@@ -16,6 +22,18 @@ except ImportError:
     WITH_PEXPECT = False
 
 
+DEFAULT_COMMAND_TIMEOUT     = 300
+DEFAULT_STREAM_IDLE_TIMEOUT = 120
+MAX_CONCURRENT_COMMANDS     = 4
+MAX_CONCURRENT_OPERATIONS   = 8
+MAX_QUEUED_STREAM_CHUNKS    = 16
+
+# Error codes used in place of a return code when a command never finished
+ERR_NOT_FOUND   = -1
+ERR_TIMEOUT     = -2
+ERR_CANCELLED   = -3
+
+
 def parse_string_into_executable_command(command : str, remove_quotes : bool) -> List[str]:
     """Function that takes in a string command, and parses it into a subprocess arg list
     Parameters
@@ -48,7 +66,7 @@ def parse_string_into_executable_command(command : str, remove_quotes : bool) ->
 
 
 
-def handle_basic_command(command : str, remove_quotes : bool=True) -> (List[str], int):
+def handle_basic_command(command : str, remove_quotes : bool=True, timeout : float=None) -> (List[str], int):
     """Function that executes any git command given, and returns program output.
     Parameters
     ----------
@@ -58,6 +76,8 @@ def handle_basic_command(command : str, remove_quotes : bool=True) -> (List[str]
         The name of the command being run
     remove_quotes : bool
         Since subprocess takes an array of strings, we split on spaces, however in some cases we want quotes to remain together (ex. commit message)
+    timeout : float
+        Seconds after which the command is killed. Defaults to DEFAULT_COMMAND_TIMEOUT
     
     Returns
     -------
@@ -67,22 +87,559 @@ def handle_basic_command(command : str, remove_quotes : bool=True) -> (List[str]
         Error code if failure, 0 otherwise.
     """
 
-    out = None
-    err = 0
+    return get_engine().run_command(command, remove_quotes=remove_quotes, timeout=timeout)
+
+
+class CommandError(Exception):
+    """Exception raised when a streamed command fails
+
+    Attributes
+    ----------
+    out : str
+        stderr output of the command, or a description of the failure
+    err : int
+        Return code of the command, -1 if it could not be started
+    """
+
+    def __init__(self, out : str, err : int):
+        super().__init__(out)
+        self.out = out
+        self.err = err
+
+
+class CommandCancelled(CommandError):
+    """Exception raised inside an operation when its commands were cancelled
+    """
+
+    def __init__(self, command : str):
+        super().__init__(f'Cancelled: {command}', ERR_CANCELLED)
+
+
+class StreamedCommand:
+    """Class that runs a command and yields its decoded stdout line by line as it is produced
+
+    Iterating raises CommandError once the output is exhausted if the command failed.
+
+    Attributes
+    ----------
+    command : str
+        The command string to run
+    idle_timeout : float
+        Seconds without any output after which the command is killed
+    returncode : int
+        Return code of the command, None until it has finished
+    """
+
+    def __init__(self, command : str, remove_quotes : bool=True, idle_timeout : float=None):
+        self.command = command
+        self.remove_quotes = remove_quotes
+        self.idle_timeout = idle_timeout
+        self.returncode = None
+
+
+    def __iter__(self) -> Iterator[str]:
+        run_command = parse_string_into_executable_command(self.command, self.remove_quotes)
+        stream = get_engine().open_stream(self.command, run_command, self.idle_timeout)
+
+        remainder = b''
+        finished_reading = False
+        try:
+            for chunk in stream:
+                lines = (remainder + chunk).split(b'\n')
+                remainder = lines.pop()
+                for raw_line in lines:
+                    yield raw_line.decode(errors='replace').rstrip('\r')
+            if len(remainder) > 0:
+                yield remainder.decode(errors='replace').rstrip('\r')
+            finished_reading = True
+        finally:
+            # Also reached when the consumer stops iterating early, in which case the command is killed
+            if not finished_reading:
+                stream.close()
+
+        stderr, self.returncode = stream.result()
+        if self.returncode != 0:
+            raise CommandError(stderr, self.returncode)
+
+
+class Operation:
+    """Class representing a unit of UI work submitted to the CommandEngine, that can be cancelled as a whole
+
+    Attributes
+    ----------
+    group : str
+        Group name used to cancel related operations together, ex. the package manager name
+    cancelled : bool
+        Set once the operation is cancelled. Commands started afterwards raise CommandCancelled
+    future : concurrent.futures.Future
+        Future for the operation function itself
+    output_listener : callable
+        If set, called on the engine thread with (command, line) for every stdout/stderr line of the
+        operation's blocking commands, while they run
+    """
+
+    def __init__(self, group : str, output_listener : Callable[[str, str], None]=None):
+        self.group = group
+        self.output_listener = output_listener
+        self.cancelled = False
+        self.future = None
+        self._command_futures = set()
+        self._lock = threading.Lock()
+
+
+    def add_command(self, command_future : concurrent.futures.Future) -> bool:
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._command_futures.add(command_future)
+            return True
+
+
+    def remove_command(self, command_future : concurrent.futures.Future) -> None:
+        with self._lock:
+            self._command_futures.discard(command_future)
+
+
+    def cancel(self) -> None:
+        """Cancels the operation, killing any of its commands that are in flight
+        """
+
+        with self._lock:
+            self.cancelled = True
+            command_futures = list(self._command_futures)
+        if self.future is not None:
+            self.future.cancel()
+        for command_future in command_futures:
+            command_future.cancel()
+
+
+class CommandStream:
+    """Class representing the consumer side of a command streamed by the CommandEngine
+
+    Iterating yields raw stdout chunks. The producer needs a credit for every chunk it queues, and the
+    consumer hands a credit back for every chunk it takes, so a slow consumer applies backpressure to
+    the child process instead of buffering its whole output.
+    """
+
+    def __init__(self, engine : 'CommandEngine', command : str, chunk_queue : asyncio.Queue, credits : asyncio.Semaphore, operation : Optional[Operation]):
+        self.engine = engine
+        self.command = command
+        self.future = None
+        self._chunk_queue = chunk_queue
+        self._credits = credits
+        self._operation = operation
+        self._traced = TRACE.is_enabled()
+
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            # The producer always finishes by putting None, whether stdout was exhausted, it failed or it was cancelled
+            wait_start = time.perf_counter()
+            chunk = asyncio.run_coroutine_threadsafe(self._chunk_queue.get(), self.engine.loop).result()
+            if self._traced:
+                TRACE.add_command_time(time.perf_counter() - wait_start)
+            if chunk is None or self.future.cancelled():
+                return
+            self.engine.loop.call_soon_threadsafe(self._credits.release)
+            yield chunk
+
+
+    def close(self) -> None:
+        self.future.cancel()
+        if self._operation is not None:
+            self._operation.remove_command(self.future)
+
+
+    def result(self) -> Tuple[str, int]:
+        """Waits for the command to exit
+
+        Returns
+        -------
+        stderr : str
+            stderr output, or a description of the failure
+        returncode : int
+            Return code, or one of the ERR_* codes
+        """
+
+        wait_start = time.perf_counter()
+        try:
+            return self.future.result()
+        except concurrent.futures.CancelledError:
+            raise CommandCancelled(self.command)
+        except FileNotFoundError:
+            return f"Executable not found for: {self.command}", ERR_NOT_FOUND
+        finally:
+            if self._operation is not None:
+                self._operation.remove_command(self.future)
+            if self._traced:
+                TRACE.add_command_time(time.perf_counter() - wait_start)
+
+
+class CommandEngine:
+    """Class that runs every child process of unipkg on a single asyncio event loop thread
+
+    Concurrent child processes are bounded by a global semaphore, every command has a timeout, and
+    commands started from an Operation are killed when that operation is cancelled. Blocking
+    callers (package manager methods) wait on the loop through thread-safe futures.
+
+    Attributes
+    ----------
+    loop : asyncio.AbstractEventLoop
+        The event loop, running on its own daemon thread
+    max_concurrent_commands : int
+        Maximum number of child processes alive at once
+    """
+
+    def __init__(self, max_concurrent_commands : int=MAX_CONCURRENT_COMMANDS, max_concurrent_operations : int=MAX_CONCURRENT_OPERATIONS):
+        self.max_concurrent_commands = max_concurrent_commands
+        self.loop = None
+        self._semaphore = None
+        self._loop_thread = None
+        self._operation_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent_operations)
+        self._operations = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.is_shut_down = False
+
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self.loop is not None:
+                return
+            started = threading.Event()
+            self._loop_thread = threading.Thread(target=self._run_loop, args=(started,), daemon=True)
+            self._loop_thread.start()
+            started.wait()
+
+
+    def _run_loop(self, started : threading.Event) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_commands)
+        started.set()
+        self.loop.run_forever()
+
+
+    def get_current_operation(self) -> Optional[Operation]:
+        return getattr(self._local, 'operation', None)
 
-    run_command = parse_string_into_executable_command(command, remove_quotes)
-    try:
-        proc = Popen(run_command, stdout=PIPE, stderr=PIPE)
-        output, error = proc.communicate()
-        if proc.returncode != 0:
-            out = error.decode()
-            err = proc.returncode
-        else:
-            out = output.decode()
-    except FileNotFoundError:
-        out = f"Executable not found for: {command}"
-        err = -1
-    return out, err
+
+    def set_current_operation(self, operation : Optional[Operation]) -> None:
+        """Attaches the calling thread to an operation, so helper threads it starts can be cancelled with it
+        """
+
+        self._local.operation = operation
+
+
+    async def _kill(self, proc) -> None:
+        if proc.returncode is None:
+            # Children run in their own process group, so tools that fork helpers (npm -> node) die with them
+            if hasattr(os, 'killpg'):
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            else:
+                proc.kill()
+            # wait() also waits for the pipes to close, and a stream whose consumer stopped reading
+            # has stopped reading stdout, so whatever is left in them is drained first
+            await asyncio.gather(self._drain(proc.stdout), self._drain(proc.stderr))
+            await proc.wait()
+
+
+    async def _drain(self, pipe : Optional[asyncio.StreamReader]) -> None:
+        while pipe is not None and len(await pipe.read(65536)) > 0:
+            pass
+
+
+    async def _spawn(self, run_command : List[str]):
+        return await asyncio.create_subprocess_exec(*run_command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                    start_new_session=hasattr(os, 'killpg'))
+
+
+    async def _read_pipe(self, pipe : asyncio.StreamReader, command : str, output_listener : Callable[[str, str], None]) -> bytes:
+        # Reads a pipe to the end, handing each complete line to the listener as soon as it arrives
+        chunks = []
+        remainder = b''
+        while True:
+            chunk = await pipe.read(65536)
+            if len(chunk) == 0:
+                break
+            chunks.append(chunk)
+            lines = (remainder + chunk).split(b'\n')
+            remainder = lines.pop()
+            for raw_line in lines:
+                output_listener(command, raw_line.decode(errors='replace').rstrip('\r'))
+        if len(remainder) > 0:
+            output_listener(command, remainder.decode(errors='replace').rstrip('\r'))
+        return b''.join(chunks)
+
+
+    async def _communicate(self, proc, command : str, output_listener : Callable[[str, str], None]) -> Tuple[bytes, bytes]:
+        if output_listener is None:
+            return await proc.communicate()
+        output, error = await asyncio.gather(self._read_pipe(proc.stdout, command, output_listener),
+                                             self._read_pipe(proc.stderr, command, output_listener))
+        await proc.wait()
+        return output, error
+
+
+    async def _run_command(self, run_command : List[str], timeout : float, output_listener : Callable[[str, str], None]=None,
+                           trace : TRACE.CommandTrace=None) -> Tuple[bytes, bytes, int]:
+        async with self._semaphore:
+            if trace is not None:
+                trace.start()
+            proc = await self._spawn(run_command)
+            try:
+                output, error = await asyncio.wait_for(self._communicate(proc, ' '.join(run_command), output_listener), timeout)
+            except BaseException as e:
+                # Timed out or cancelled, either way the child must not outlive us
+                await self._kill(proc)
+                if trace is not None:
+                    trace.finish(ERR_TIMEOUT if isinstance(e, asyncio.TimeoutError) else ERR_CANCELLED, 0)
+                raise
+            if trace is not None:
+                trace.finish(proc.returncode, len(output) + len(error))
+            return output, error, proc.returncode
+
+
+    async def _stream_command(self, run_command : List[str], chunk_queue : asyncio.Queue, credits : asyncio.Semaphore, idle_timeout : float,
+                              trace : TRACE.CommandTrace=None) -> Tuple[str, int]:
+        output_bytes = 0
+        try:
+            async with self._semaphore:
+                if trace is not None:
+                    trace.start()
+                proc = await self._spawn(run_command)
+                stderr_task = asyncio.ensure_future(proc.stderr.read())
+                try:
+                    while True:
+                        chunk = await asyncio.wait_for(proc.stdout.read(65536), idle_timeout)
+                        if len(chunk) == 0:
+                            break
+                        output_bytes += len(chunk)
+                        await credits.acquire()
+                        chunk_queue.put_nowait(chunk)
+                    await proc.wait()
+                    error = await stderr_task
+                except asyncio.TimeoutError:
+                    stderr_task.cancel()
+                    await asyncio.wait([stderr_task])
+                    await self._kill(proc)
+                    if trace is not None:
+                        trace.finish(ERR_TIMEOUT, output_bytes)
+                    return f'Command produced no output for {idle_timeout}s and was killed', ERR_TIMEOUT
+                except BaseException:
+                    stderr_task.cancel()
+                    await asyncio.wait([stderr_task])
+                    await self._kill(proc)
+                    if trace is not None:
+                        trace.finish(ERR_CANCELLED, output_bytes)
+                    raise
+                if trace is not None:
+                    trace.finish(proc.returncode, output_bytes + len(error))
+                return error.decode(errors='replace'), proc.returncode
+        finally:
+            chunk_queue.put_nowait(None)
+
+
+    def _submit_command(self, command : str, coro) -> Tuple[concurrent.futures.Future, Optional[Operation]]:
+        if threading.current_thread() is self._loop_thread:
+            coro.close()
+            raise RuntimeError('Blocking commands cannot be run from the command engine event loop thread')
+        operation = self.get_current_operation()
+        command_future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if operation is not None and not operation.add_command(command_future):
+            command_future.cancel()
+            raise CommandCancelled(command)
+        return command_future, operation
+
+
+    def run_command(self, command : str, remove_quotes : bool=True, timeout : float=None) -> Tuple[str, int]:
+        """Runs a command to completion, blocking the calling thread
+
+        Parameters
+        ----------
+        command : str
+            The command string to run
+        remove_quotes : bool
+            Passed on to parse_string_into_executable_command
+        timeout : float
+            Seconds after which the command is killed. Defaults to DEFAULT_COMMAND_TIMEOUT
+
+        Returns
+        -------
+        out : str
+            Output string from stdout if success, stderr if failure
+        err : int
+            Return code if failure, one of the ERR_* codes if the command never finished, 0 otherwise
+
+        Raises
+        ------
+        CommandCancelled
+            If the operation the command belongs to was cancelled
+        """
+
+        self._ensure_started()
+        if timeout is None:
+            timeout = DEFAULT_COMMAND_TIMEOUT
+        run_command = parse_string_into_executable_command(command, remove_quotes)
+        operation = self.get_current_operation()
+        output_listener = None if operation is None else operation.output_listener
+        trace = TRACE.start_command_trace(command)
+        wait_start = time.perf_counter()
+        command_future, operation = self._submit_command(command, self._run_command(run_command, timeout, output_listener, trace))
+        try:
+            output, error, returncode = command_future.result()
+        except concurrent.futures.CancelledError:
+            raise CommandCancelled(command)
+        except asyncio.TimeoutError:
+            return f'Command timed out after {timeout}s: {command}', ERR_TIMEOUT
+        except FileNotFoundError:
+            return f"Executable not found for: {command}", ERR_NOT_FOUND
+        finally:
+            if operation is not None:
+                operation.remove_command(command_future)
+            if trace is not None:
+                TRACE.add_command_time(time.perf_counter() - wait_start)
+
+        if returncode != 0:
+            return error.decode(errors='replace'), returncode
+        return output.decode(errors='replace'), 0
+
+
+    def open_stream(self, command : str, run_command : List[str], idle_timeout : float=None) -> CommandStream:
+        """Starts a command whose stdout is consumed incrementally
+
+        Parameters
+        ----------
+        command : str
+            The command string, used for error messages
+        run_command : list of str
+            The parsed command
+        idle_timeout : float
+            Seconds without output after which the command is killed. Defaults to DEFAULT_STREAM_IDLE_TIMEOUT
+
+        Returns
+        -------
+        stream : CommandStream
+            Iterable over raw stdout chunks
+        """
+
+        self._ensure_started()
+        if idle_timeout is None:
+            idle_timeout = DEFAULT_STREAM_IDLE_TIMEOUT
+        chunk_queue, credits = asyncio.run_coroutine_threadsafe(self._make_stream_queue(), self.loop).result()
+        trace = TRACE.start_command_trace(command)
+        command_future, operation = self._submit_command(command, self._stream_command(run_command, chunk_queue, credits, idle_timeout, trace))
+        stream = CommandStream(self, command, chunk_queue, credits, operation)
+        stream.future = command_future
+        return stream
+
+
+    async def _make_stream_queue(self) -> Tuple[asyncio.Queue, asyncio.Semaphore]:
+        # Created on the loop, so they bind to it on older pythons
+        return asyncio.Queue(), asyncio.Semaphore(MAX_QUEUED_STREAM_CHUNKS)
+
+
+    def submit_operation(self, operation_func : Callable[[], None], group : str=None, output_listener : Callable[[str, str], None]=None) -> Operation:
+        """Runs a blocking UI operation on the engine's worker pool
+
+        Parameters
+        ----------
+        operation_func : callable
+            The operation, ex. a UniPkgManager *_op method
+        group : str
+            Group used to cancel related operations with cancel_group
+        output_listener : callable
+            Receives (command, line) for the output of the operation's blocking commands as it is produced
+
+        Returns
+        -------
+        operation : Operation
+            Handle that can be used to cancel the operation
+        """
+
+        self._ensure_started()
+        operation = Operation(group, output_listener=output_listener)
+
+        def run_operation():
+            self.set_current_operation(operation)
+            try:
+                operation_func()
+            finally:
+                self.set_current_operation(None)
+                with self._lock:
+                    if operation in self._operations:
+                        self._operations.remove(operation)
+
+        with self._lock:
+            self._operations.append(operation)
+        operation.future = self._operation_executor.submit(run_operation)
+        return operation
+
+
+    def cancel_group(self, group : str) -> int:
+        """Cancels every running operation in a group
+
+        Parameters
+        ----------
+        group : str
+            The group to cancel
+
+        Returns
+        -------
+        num_cancelled : int
+            Number of operations that were cancelled
+        """
+
+        with self._lock:
+            operations = [operation for operation in self._operations if operation.group == group]
+        for operation in operations:
+            operation.cancel()
+        return len(operations)
+
+
+    def shutdown(self) -> None:
+        """Cancels all operations and stops the event loop
+        """
+
+        with self._lock:
+            self.is_shut_down = True
+            operations = list(self._operations)
+        for operation in operations:
+            operation.cancel()
+        self._operation_executor.shutdown(wait=False)
+        if self.loop is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._cancel_all_tasks(), self.loop).result(timeout=5)
+            except concurrent.futures.TimeoutError:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+    async def _cancel_all_tasks(self) -> None:
+        # Gives cancelled commands the chance to kill their child processes before the loop stops
+        current_task = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current_task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> CommandEngine:
+    """Function that returns the process-wide CommandEngine, creating it on first use, or after the last one was shut down
+    """
+
+    global _engine
+    with _engine_lock:
+        if _engine is None or _engine.is_shut_down:
+            _engine = CommandEngine()
+        return _engine
 
 
 def handle_admin_command(command_str: str, passwd : str, expect : str) -> (List[str], int):
@@ -93,9 +650,35 @@ def handle_admin_command(command_str: str, passwd : str, expect : str) -> (List[
         return None, None
 
 
-def execute_command(command_str : str, is_admin_required : bool, passwd : str=None, expect : str='Password'):
+def execute_command(command_str : str, is_admin_required : bool, passwd : str=None, expect : str='Password', timeout : float=None):
     if is_admin_required == 'required':
         pass
         #return handle_admin_command(command_str, passwd, expect)
     else:
-        return handle_basic_command(command_str)
\ No newline at end of file
+        return handle_basic_command(command_str, timeout=timeout)
+
+
+def stream_command(command_str : str, is_admin_required : bool, idle_timeout : float=None) -> StreamedCommand:
+    """Function that starts a command in streaming mode
+
+    Streaming is meant for the read-only queries of the package managers, listings and searches,
+    which never run as admin. Admin commands need their password prompt answered over a pty,
+    which a stream of stdout chunks can't do, so they are always run as a whole through
+    execute_command, and callers that need admin fall back to it.
+
+    Parameters
+    ----------
+    command_str : str
+        The command string to run
+    is_admin_required : bool
+        Kept for symmetry with execute_command. The command always runs as the current user
+    idle_timeout : float
+        Seconds without output after which the command is killed
+
+    Returns
+    -------
+    stream : StreamedCommand
+        Iterable over decoded stdout lines
+    """
+
+    return StreamedCommand(command_str, idle_timeout=idle_timeout)
@@ -0,0 +1,749 @@
+"""Module containing in-process indexes over package manager databases
+
+These let unipkg answer searches and installed-state queries without spawning a
+subprocess each time. Every index tracks the mtimes of the files it was built from,
+and is only rebuilt when they change.
+"""
+
+import os
+import re
+import json
+import mmap
+import glob
+import platform
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+APT_LISTS_DIR       = '/var/lib/apt/lists'
+APT_PREFERENCES     = '/etc/apt/preferences'
+APT_PREFERENCES_DIR = '/etc/apt/preferences.d'
+DPKG_STATUS         = '/var/lib/dpkg/status'
+
+# Default priorities apt gives to versions, see apt_preferences(5). Suites marked NotAutomatic,
+# ex. experimental, are never picked over an installed version, and ButAutomaticUpgrades ones,
+# ex. backports, only upgrade packages already installed from them
+PRIORITY_DEFAULT            = 500
+PRIORITY_INSTALLED          = 100
+PRIORITY_AUTOMATIC_UPGRADES = 100
+PRIORITY_NOT_AUTOMATIC      = 1
+
+# Debian architecture names of the machines platform.machine() reports
+DEB_ARCHITECTURES = {
+    'x86_64'    : 'amd64',
+    'amd64'     : 'amd64',
+    'i386'      : 'i386',
+    'i686'      : 'i386',
+    'aarch64'   : 'arm64',
+    'arm64'     : 'arm64',
+    'armv7l'    : 'armhf',
+    'armv6l'    : 'armel',
+    'ppc64le'   : 'ppc64el',
+    's390x'     : 's390x',
+    'riscv64'   : 'riscv64',
+}
+
+# Only the fields we need are pulled out of the deb822 stanzas. A Package: line starts a new record.
+_APT_FIELD_REGEX    = re.compile(rb'^(Package|Version|Description|Description-en): ?(.*)$', re.MULTILINE)
+_DPKG_FIELD_REGEX   = re.compile(rb'^(Package|Status|Version): ?(.*)$', re.MULTILINE)
+
+# List files are named after the repository URI, suite, component and architecture
+_LIST_ARCH_REGEX    = re.compile(r'_binary-([^_]+)_Packages$')
+
+_DIGITS = frozenset('0123456789')
+
+
+def get_files_stamp(file_paths : List[str]) -> Tuple:
+    """Function that builds a hashable stamp from the paths, mtimes and sizes of a set of files
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Files to stamp. Missing files are skipped
+
+    Returns
+    -------
+    stamp : tuple
+        Tuple of (path, mtime, size) entries
+    """
+
+    stamp = []
+    for file_path in file_paths:
+        try:
+            file_stat = os.stat(file_path)
+            stamp.append((file_path, file_stat.st_mtime, file_stat.st_size))
+        except OSError:
+            pass
+    return tuple(stamp)
+
+
+def _get_deb_order(char : str) -> int:
+    # dpkg sorts ~ before everything, even the end of the string, and letters before other symbols
+    if char == '~':
+        return -1
+    elif char == '' or char in _DIGITS:
+        return 0
+    elif char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+def _compare_deb_fragments(first : str, second : str) -> int:
+    first_pos, second_pos = 0, 0
+    while first_pos < len(first) or second_pos < len(second):
+        # Non-digit runs are compared character by character
+        while (first_pos < len(first) and first[first_pos] not in _DIGITS) or (second_pos < len(second) and second[second_pos] not in _DIGITS):
+            first_order = _get_deb_order(first[first_pos:first_pos + 1])
+            second_order = _get_deb_order(second[second_pos:second_pos + 1])
+            if first_order != second_order:
+                return first_order - second_order
+            first_pos += 1
+            second_pos += 1
+
+        # Digit runs are compared as numbers
+        first_end, second_end = first_pos, second_pos
+        while first_end < len(first) and first[first_end] in _DIGITS:
+            first_end += 1
+        while second_end < len(second) and second[second_end] in _DIGITS:
+            second_end += 1
+        first_number = int(first[first_pos:first_end] or '0')
+        second_number = int(second[second_pos:second_end] or '0')
+        if first_number != second_number:
+            return -1 if first_number < second_number else 1
+        first_pos, second_pos = first_end, second_end
+    return 0
+
+
+def compare_deb_versions(first : str, second : str) -> int:
+    """Function that compares two Debian package versions the way dpkg does
+
+    Parameters
+    ----------
+    first, second : str
+        Versions in [epoch:]upstream[-revision] form
+
+    Returns
+    -------
+    order : int
+        Negative if first is older than second, 0 if they are equal, positive if it is newer
+    """
+
+    def split_version(version : str) -> Tuple[int, str, str]:
+        epoch, _, rest = version.rpartition(':') if ':' in version else ('0', '', version)
+        upstream, _, revision = rest.rpartition('-') if '-' in rest else (rest, '', '')
+        return int(epoch) if epoch.isdigit() else 0, upstream, revision
+
+    first_epoch, first_upstream, first_revision = split_version(first)
+    second_epoch, second_upstream, second_revision = split_version(second)
+    if first_epoch != second_epoch:
+        return -1 if first_epoch < second_epoch else 1
+    return _compare_deb_fragments(first_upstream, second_upstream) or _compare_deb_fragments(first_revision, second_revision)
+
+
+def iter_deb822_records(file_path : str, field_regex=_APT_FIELD_REGEX):
+    """Generator that memory-maps a deb822 file (Packages, Translation, status) and yields its records
+
+    Only the fields matched by field_regex are extracted, and only their first line.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file
+    field_regex : re.Pattern
+        Multiline bytes regex with field name and value groups. Defaults to Package, Version and Description
+
+    Yields
+    ------
+    record : dict of str -> str
+        The extracted fields of one stanza
+    """
+
+    try:
+        with open(file_path, 'rb') as file_fp:
+            if os.fstat(file_fp.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file_fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                record = None
+                for match in field_regex.finditer(buffer):
+                    field = match.group(1).decode()
+                    value = match.group(2).decode('utf-8', errors='replace').strip()
+                    if field == 'Package':
+                        if record is not None:
+                            yield record
+                        record = {'Package' : value}
+                    elif record is not None:
+                        if field == 'Description-en':
+                            field = 'Description'
+                        record[field] = value
+                if record is not None:
+                    yield record
+    except OSError:
+        return
+
+
+def get_native_architecture() -> Optional[str]:
+    """Function that gets the Debian name of the machine architecture, None if it is not known
+    """
+
+    return DEB_ARCHITECTURES.get(platform.machine().lower())
+
+
+def read_release_priority(release_file : str) -> int:
+    """Function that gets the default priority apt gives to the versions of a suite from its Release or InRelease file
+
+    Parameters
+    ----------
+    release_file : str
+        Path to the Release file
+
+    Returns
+    -------
+    priority : int
+        One of the PRIORITY_* values
+    """
+
+    fields = {}
+    try:
+        with open(release_file, 'rb') as file_fp:
+            for line in file_fp:
+                # The checksum lists after the header fields are indented, and can be long
+                if line.startswith(b' '):
+                    break
+                name, sep, value = line.partition(b':')
+                if sep:
+                    fields[name.strip()] = value.strip().lower()
+    except OSError:
+        return PRIORITY_DEFAULT
+
+    if fields.get(b'NotAutomatic') != b'yes':
+        return PRIORITY_DEFAULT
+    if fields.get(b'ButAutomaticUpgrades') == b'yes':
+        return PRIORITY_AUTOMATIC_UPGRADES
+    return PRIORITY_NOT_AUTOMATIC
+
+
+class FileIndex:
+    """Base class for indexes built from a set of files, rebuilt only when those files change
+
+    Subclasses implement get_source_files and _build.
+    """
+
+    def __init__(self):
+        self._stamp = None
+        self._lock = threading.Lock()
+
+
+    def get_source_files(self) -> List[str]:
+        raise NotImplementedError
+
+
+    def _build(self) -> None:
+        raise NotImplementedError
+
+
+    def get_stamp(self) -> Tuple:
+        return get_files_stamp(self.get_source_files())
+
+
+    def refresh(self) -> bool:
+        """Rebuilds the index if any of its source files changed since it was last built
+
+        Returns
+        -------
+        rebuilt : bool
+            True if the index was rebuilt
+        """
+
+        stamp = self.get_stamp()
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+            self._build()
+            self._stamp = stamp
+        return True
+
+
+class AptCatalogIndex(FileIndex):
+    """Class representing a name/description index over the apt package lists
+
+    Candidate versions follow apt's default priorities: lists of foreign architectures are
+    skipped, and versions from NotAutomatic suites only win where apt would pick them. Pins
+    from apt_preferences are not read, see has_pins.
+
+    Attributes
+    ----------
+    lists_dir : str
+        Directory containing the apt lists, normally /var/lib/apt/lists
+    architecture : str
+        Native Debian architecture, lists of other architectures are skipped. None keeps every list
+    packages : dict of str -> (str, str)
+        Package name -> (candidate version, short description)
+    """
+
+    def __init__(self, lists_dir : str=APT_LISTS_DIR, architecture : Optional[str]=None,
+                 preferences_file : str=APT_PREFERENCES, preferences_dir : str=APT_PREFERENCES_DIR):
+        super().__init__()
+        self.lists_dir = lists_dir
+        self.architecture = get_native_architecture() if architecture is None else architecture
+        self.preferences_file = preferences_file
+        self.preferences_dir = preferences_dir
+        self.packages = {}
+        # Package name -> {priority : newest version}, only for packages listed by NotAutomatic suites
+        self._versions = {}
+        self._haystacks = []
+
+
+    def get_list_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.lists_dir, '*_Packages')))
+
+
+    def get_release_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.lists_dir, '*_InRelease')) + glob.glob(os.path.join(self.lists_dir, '*_Release')))
+
+
+    def get_translation_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.lists_dir, '*_Translation-en')))
+
+
+    def is_available(self) -> bool:
+        return len(self.get_list_files()) > 0
+
+
+    def get_source_files(self) -> List[str]:
+        return self.get_list_files() + self.get_release_files() + self.get_translation_files()
+
+
+    def get_preferences_files(self) -> List[str]:
+        # apt skips files in preferences.d with an extension other than .pref
+        pref_files = [os.path.join(self.preferences_dir, file_name) for file_name in sorted(os.listdir(self.preferences_dir))
+                      if '.' not in file_name or file_name.endswith('.pref')] if os.path.isdir(self.preferences_dir) else []
+        return [pref_file for pref_file in [self.preferences_file] + pref_files if os.path.isfile(pref_file)]
+
+
+    def has_pins(self) -> bool:
+        """Checks if apt_preferences define any pin, in which case the candidate versions of the index may not be apt's
+        """
+
+        for pref_file in self.get_preferences_files():
+            try:
+                with open(pref_file, 'r', errors='replace') as file_fp:
+                    if any(line.strip() != '' and not line.lstrip().startswith('#') for line in file_fp):
+                        return True
+            except OSError:
+                pass
+        return False
+
+
+    def get_list_priority(self, list_file : str, release_priorities : Dict[str, int]) -> Optional[int]:
+        """Gets the priority of the versions in a list file, None if the list should be skipped
+
+        Parameters
+        ----------
+        list_file : str
+            Path to the Packages list
+        release_priorities : dict of str -> int
+            Release file name, without the _Release or _InRelease suffix -> priority of its suite
+        """
+
+        list_name = os.path.basename(list_file)
+        match = _LIST_ARCH_REGEX.search(list_name)
+        if match is not None and self.architecture is not None and match.group(1) not in (self.architecture, 'all'):
+            return None
+        # The release file of a suite is named like its lists, up to the component
+        release_names = [release_name for release_name in release_priorities if list_name.startswith(release_name + '_')]
+        if len(release_names) == 0:
+            return PRIORITY_DEFAULT
+        return release_priorities[max(release_names, key=len)]
+
+
+    def _build(self) -> None:
+        release_priorities = {os.path.basename(release_file).rsplit('_', 1)[0] : read_release_priority(release_file)
+                              for release_file in self.get_release_files()}
+
+        packages, versions, descriptions = {}, {}, {}
+        for list_file in self.get_list_files():
+            priority = self.get_list_priority(list_file, release_priorities)
+            if priority is None:
+                continue
+            for record in iter_deb822_records(list_file):
+                name, version = record['Package'], record.get('Version', '')
+                if priority != PRIORITY_DEFAULT:
+                    # Versions of NotAutomatic suites are kept aside, they are only candidates where apt would pick them
+                    package_versions = versions.setdefault(name, {})
+                    if compare_deb_versions(version, package_versions.get(priority, '')) > 0:
+                        package_versions[priority] = version
+                    if 'Description' in record:
+                        descriptions.setdefault(name, record['Description'])
+                    continue
+                if name not in packages:
+                    packages[name] = (version, record.get('Description', ''))
+                    continue
+                # A package can be listed by several suites, ex. stable and stable-updates, apt picks the newest
+                current_version, description = packages[name]
+                if compare_deb_versions(version, current_version) > 0:
+                    current_version = version
+                if description == '' and 'Description' in record:
+                    description = record['Description']
+                packages[name] = (current_version, description)
+
+        for name, package_versions in versions.items():
+            if name in packages:
+                version, description = packages[name]
+                package_versions[PRIORITY_DEFAULT] = version
+            else:
+                # Only listed by NotAutomatic suites, apt installs the version with the highest priority
+                version, description = package_versions[max(package_versions)], ''
+            packages[name] = (version, description or descriptions.get(name, ''))
+
+        # Lists fetched with translations carry Description-md5 only, so pull short descriptions from Translation-en
+        for translation_file in self.get_translation_files():
+            for record in iter_deb822_records(translation_file):
+                name = record['Package']
+                if name in packages and packages[name][1] == '' and 'Description' in record:
+                    packages[name] = (packages[name][0], record['Description'])
+
+        self.packages = packages
+        self._versions = versions
+        self._haystacks = [(f'{name} {desc}'.lower(), name) for name, (_, desc) in packages.items()]
+
+
+    def get_upgrades(self, installed_packages : Dict[str, str]) -> Dict[str, Tuple[str, str, str]]:
+        """Gets the installed packages whose apt candidate version is newer than the installed one
+
+        The candidate is the newer version with the highest priority, the installed version counting
+        as PRIORITY_INSTALLED, or as the priority of the suite listing it if higher. So backports only
+        upgrade packages installed from backports, and experimental never upgrades anything.
+
+        Parameters
+        ----------
+        installed_packages : dict of str -> str
+            Package name -> installed version
+
+        Returns
+        -------
+        upgrades : dict of str -> (str, str, str)
+            Package name -> (installed version, candidate version, description)
+        """
+
+        self.refresh()
+        with self._lock:
+            packages, versions = self.packages, self._versions
+
+        upgrades = {}
+        for name, installed_version in installed_packages.items():
+            entry = packages.get(name)
+            if entry is None:
+                continue
+            package_versions = versions.get(name)
+            if package_versions is None:
+                if compare_deb_versions(entry[0], installed_version) > 0:
+                    upgrades[name] = (installed_version, entry[0], entry[1])
+                continue
+
+            candidate = installed_version
+            candidate_priority = max([PRIORITY_INSTALLED] + [priority for priority, version in package_versions.items() if version == installed_version])
+            for priority, version in package_versions.items():
+                if compare_deb_versions(version, installed_version) <= 0:
+                    continue
+                if priority > candidate_priority or (priority == candidate_priority and compare_deb_versions(version, candidate) > 0):
+                    candidate, candidate_priority = version, priority
+            if candidate != installed_version:
+                upgrades[name] = (installed_version, candidate, entry[1])
+        return upgrades
+
+
+    def get(self, name : str) -> Optional[Tuple[str, str]]:
+        self.refresh()
+        return self.packages.get(name)
+
+
+    def search(self, search_key : str) -> List[Tuple[str, str, str]]:
+        """Searches package names and descriptions, matching apt-cache search semantics (all terms must match)
+
+        Parameters
+        ----------
+        search_key : str
+            Space separated search terms
+
+        Returns
+        -------
+        results : list of (str, str, str)
+            (name, version, description) for every matching package
+        """
+
+        self.refresh()
+        terms = search_key.lower().split()
+        with self._lock:
+            haystacks, packages = self._haystacks, self.packages
+        results = []
+        for haystack, name in haystacks:
+            if all(term in haystack for term in terms):
+                version, desc = packages[name]
+                results.append((name, version, desc))
+        return results
+
+
+class DpkgStatusIndex(FileIndex):
+    """Class representing the set of installed packages, read from the dpkg status database
+
+    Attributes
+    ----------
+    status_file : str
+        Path to the dpkg status file, normally /var/lib/dpkg/status
+    installed : dict of str -> str
+        Installed package name -> installed version
+    """
+
+    def __init__(self, status_file : str=DPKG_STATUS):
+        super().__init__()
+        self.status_file = status_file
+        self.installed = {}
+
+
+    def get_source_files(self) -> List[str]:
+        return [self.status_file]
+
+
+    def is_available(self) -> bool:
+        return os.path.isfile(self.status_file)
+
+
+    def _build(self) -> None:
+        installed = {}
+        for record in iter_deb822_records(self.status_file, field_regex=_DPKG_FIELD_REGEX):
+            # Status is 'want flag state', ex. 'install ok installed', or 'deinstall ok config-files' for removed packages
+            status = record.get('Status', '').split()
+            if len(status) == 3 and status[2] == 'installed':
+                installed[record['Package']] = record.get('Version', '')
+        self.installed = installed
+
+
+    def get_installed(self) -> Dict[str, str]:
+        """Gets the installed packages, rebuilding the index first if dpkg state changed
+
+        Returns
+        -------
+        installed : dict of str -> str
+            Installed package name -> installed version
+        """
+
+        self.refresh()
+        return self.installed
+
+
+    def is_installed(self, name : str) -> bool:
+        return name in self.get_installed()
+
+
+    def get_version(self, name : str) -> Optional[str]:
+        return self.get_installed().get(name)
+
+
+class NpmGlobalIndex(FileIndex):
+    """Class representing the globally installed npm packages, read from the package.json files in the global node_modules
+
+    The directory stamp covers node_modules and its @scope directories, whose mtimes change whenever
+    a package is added, removed or replaced. On a rescan only package.json files whose mtime changed
+    are read again.
+
+    Attributes
+    ----------
+    root_dir : str
+        The global node_modules directory, ex. /usr/lib/node_modules
+    installed : dict of str -> (str, str)
+        Package name -> (installed version, description)
+    """
+
+    def __init__(self, root_dir : str):
+        super().__init__()
+        self.root_dir = root_dir
+        self.installed = {}
+        self._manifests = {}
+
+
+    def is_available(self) -> bool:
+        return self.root_dir is not None and os.path.isdir(self.root_dir)
+
+
+    def get_source_files(self) -> List[str]:
+        if not self.is_available():
+            return []
+        scope_dirs = [entry.path for entry in os.scandir(self.root_dir) if entry.name.startswith('@') and entry.is_dir()]
+        return [self.root_dir] + sorted(scope_dirs)
+
+
+    def get_package_dirs(self) -> List[str]:
+        package_dirs = []
+        for entry in os.scandir(self.root_dir):
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            if entry.name.startswith('@'):
+                package_dirs.extend(scoped.path for scoped in os.scandir(entry.path) if not scoped.name.startswith('.') and scoped.is_dir())
+            else:
+                package_dirs.append(entry.path)
+        return package_dirs
+
+
+    def _build(self) -> None:
+        manifests = {}
+        for package_dir in self.get_package_dirs():
+            manifest_file = os.path.join(package_dir, 'package.json')
+            try:
+                mtime = os.stat(manifest_file).st_mtime
+            except OSError:
+                continue
+            cached = self._manifests.get(manifest_file)
+            if cached is not None and cached[0] == mtime:
+                manifests[manifest_file] = cached
+                continue
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as manifest_fp:
+                    manifest = json.load(manifest_fp)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(manifest, dict):
+                continue
+            description = manifest.get('description', '')
+            manifests[manifest_file] = (mtime, manifest.get('name', os.path.basename(package_dir)), manifest.get('version', ''),
+                                        description if isinstance(description, str) else '')
+
+        self._manifests = manifests
+        self.installed = {name : (version, description) for _, name, version, description in manifests.values()}
+
+
+    def get_installed(self) -> Dict[str, Tuple[str, str]]:
+        """Gets the installed packages, rescanning first if node_modules changed
+
+        Returns
+        -------
+        installed : dict of str -> (str, str)
+            Package name -> (installed version, description)
+        """
+
+        self.refresh()
+        return self.installed
+
+
+def read_dist_metadata(metadata_file : str) -> Optional[Tuple[str, str, str, Tuple[str, ...]]]:
+    """Function that reads the header fields we need from a METADATA or PKG-INFO file
+
+    Only the header block is read, the long description that follows it is skipped.
+
+    Returns
+    -------
+    metadata : tuple of (str, str, str, tuple of str)
+        Name, version, summary and Requires-Dist entries, or None if the file can't be read
+    """
+
+    name, version, summary, requires = None, '', '', []
+    try:
+        with open(metadata_file, 'r', encoding='utf-8', errors='replace') as metadata_fp:
+            for line in metadata_fp:
+                if line in ('\n', '\r\n'):
+                    break
+                field, _, value = line.partition(':')
+                if field == 'Name':
+                    name = value.strip()
+                elif field == 'Version':
+                    version = value.strip()
+                elif field == 'Summary':
+                    summary = value.strip()
+                elif field == 'Requires-Dist':
+                    requires.append(value.strip())
+    except OSError:
+        return None
+    if name is None:
+        return None
+    return name, version, summary, tuple(requires)
+
+
+def get_canonical_name(name : str) -> str:
+    """Function that normalizes a python distribution name, so ex. Foo_Bar and foo-bar compare equal
+    """
+
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+class PythonDistIndex(FileIndex):
+    """Class representing the python distributions installed in a set of site-packages directories
+
+    Reads *.dist-info/METADATA and *.egg-info, as well as the egg-info of legacy editable installs
+    found through *.egg-link files. Installing or removing a distribution bumps the mtime of its
+    site-packages directory, and only metadata directories not seen before are read on a rescan.
+
+    Attributes
+    ----------
+    site_dirs : list of str
+        The directories to scan, in sys.path order. The first distribution found for a name wins
+    installed : dict of str -> (str, str, str, tuple of str)
+        Canonical name -> (name, version, summary, requirements)
+    """
+
+    def __init__(self, site_dirs : List[str]):
+        super().__init__()
+        self.site_dirs = site_dirs
+        self.installed = {}
+        self._metadata = {}
+
+
+    def is_available(self) -> bool:
+        return len(self.site_dirs) > 0
+
+
+    def get_source_files(self) -> List[str]:
+        return self.site_dirs
+
+
+    def get_metadata_file(self, site_dir : str, entry_name : str) -> Optional[str]:
+        entry_path = os.path.join(site_dir, entry_name)
+        if entry_name.endswith('.dist-info'):
+            return os.path.join(entry_path, 'METADATA')
+        elif entry_name.endswith('.egg-info'):
+            return os.path.join(entry_path, 'PKG-INFO') if os.path.isdir(entry_path) else entry_path
+        elif entry_name.endswith('.egg-link'):
+            # Legacy editable installs point at the project, whose egg-info holds the metadata
+            try:
+                with open(entry_path, 'r') as link_fp:
+                    project_dir = os.path.join(site_dir, link_fp.readline().strip())
+                egg_infos = glob.glob(os.path.join(project_dir, '*.egg-info'))
+            except OSError:
+                return None
+            return os.path.join(egg_infos[0], 'PKG-INFO') if len(egg_infos) > 0 else None
+        return None
+
+
+    def _build(self) -> None:
+        installed = {}
+        metadata_cache = {}
+        for site_dir in self.site_dirs:
+            try:
+                entry_names = sorted(os.listdir(site_dir))
+            except OSError:
+                continue
+            for entry_name in entry_names:
+                metadata_file = self.get_metadata_file(site_dir, entry_name)
+                if metadata_file is None:
+                    continue
+                # dist-info directories are named after name and version, so an unchanged path means unchanged metadata
+                if entry_name.endswith('.dist-info') and metadata_file in self._metadata:
+                    metadata = self._metadata[metadata_file]
+                else:
+                    metadata = read_dist_metadata(metadata_file)
+                metadata_cache[metadata_file] = metadata
+                if metadata is not None:
+                    installed.setdefault(get_canonical_name(metadata[0]), metadata)
+        self._metadata = metadata_cache
+        self.installed = installed
+
+
+    def get_installed(self) -> Dict[str, Tuple[str, str, str, Tuple[str, ...]]]:
+        """Gets the installed distributions, rescanning first if any site-packages directory changed
+
+        Returns
+        -------
+        installed : dict of str -> (str, str, str, tuple of str)
+            Canonical name -> (name, version, summary, requirements)
+        """
+
+        self.refresh()
+        return self.installed
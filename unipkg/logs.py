@@ -0,0 +1,90 @@
+"""Module containing the bounded log backing the unipkg Log/Status panel
+"""
+
+import os
+import logging
+import logging.handlers
+import threading
+from collections import deque
+from typing import List
+
+
+class LogPanel:
+    """Class that keeps recent log messages in a fixed capacity ring buffer, and renders them into a text block
+
+    Messages are shown newest first. Appending costs O(1) plus rendering the visible lines, no
+    matter how long the log has grown. Messages that fall out of the buffer are lost, unless a
+    spill file is given, in which case every message is also written to a rotating log file.
+
+    Attributes
+    ----------
+    widget : py_cui.widgets.ScrollTextBlock
+        The text block messages are rendered into
+    capacity : int
+        Maximum number of messages kept in memory
+    spill_file : str
+        Path of the rotating log file, or None
+    """
+
+    def __init__(self, widget, capacity : int=1000, spill_file : str=None, max_spill_bytes : int=1024 * 1024, spill_backups : int=3):
+        self.widget = widget
+        self.capacity = capacity
+        self.spill_file = spill_file
+        self._messages = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._paused = False
+        self._spill_logger = None
+        if spill_file is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(spill_file)), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(spill_file, maxBytes=max_spill_bytes, backupCount=spill_backups)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._spill_logger = logging.getLogger(f'unipkg.log.{id(self)}')
+            self._spill_logger.propagate = False
+            self._spill_logger.setLevel(logging.INFO)
+            self._spill_logger.addHandler(handler)
+
+
+    def write(self, text : str) -> None:
+        """Adds a message to the log, and re-renders the visible part of the panel
+        """
+
+        with self._lock:
+            self._messages.append(str(text))
+            if self._spill_logger is not None:
+                self._spill_logger.info(text)
+            if not self._paused:
+                self._render()
+
+
+    def set_paused(self, paused : bool) -> None:
+        """Stops or resumes rendering, so the widget can temporarily show something else. Messages are still kept while paused
+        """
+
+        with self._lock:
+            self._paused = paused
+            if not paused:
+                self._render()
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._messages.clear()
+            self.widget.clear()
+
+
+    def get_latest_lines(self, num_lines : int) -> List[str]:
+        """Gets up to num_lines lines, from the newest messages first. Lines within a message keep their order
+        """
+
+        lines = []
+        for message in reversed(self._messages):
+            message_lines = message.splitlines()
+            lines.extend(message_lines[:num_lines - len(lines)])
+            if len(lines) >= num_lines:
+                break
+        return lines
+
+
+    def _render(self) -> None:
+        num_lines = max(self.widget.get_viewport_height(), 1)
+        self.widget.set_text('\n'.join(self.get_latest_lines(num_lines)))
@@ -1,11 +1,243 @@
+"""Module containing package operations, and the logic for applying them in batches
+"""
+
+import unipkg.command_handler as EXE
+
+from typing import Callable, Iterator, List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+
+OP_INSTALL      = 'Install'
+OP_UNINSTALL    = 'Uninstall'
+OP_UPDATE       = 'Update'
+
+# Removals run first so that installs in the same apply can't be undone by them
+OP_ORDER = [OP_UNINSTALL, OP_INSTALL, OP_UPDATE]
 
 
 class PackageOp:
 
-    def __init__(self, pkg, op):
+    def __init__(self, pkg, op, manager=None):
         self.pkg = pkg
         self.op = op
+        self.manager = manager
 
 
     def __str__(self):
-        return f'{self.pkg.name} - {self.op}'
\ No newline at end of file
+        if self.manager is None:
+            return f'{self.pkg.name} - {self.op}'
+        return f'{self.manager.name}: {self.pkg.name} - {self.op}'
+
+
+class MarkedOps:
+    """Class representing the set of marked operations, indexed by manager and package name for O(1) lookups
+    """
+
+    def __init__(self):
+        self._ops = {}
+
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+
+    def __iter__(self):
+        return iter(list(self._ops.values()))
+
+
+    def get_key(self, manager, package_name : str) -> Tuple:
+        return (None if manager is None else manager.name), package_name
+
+
+    def get(self, manager, package_name : str):
+        return self._ops.get(self.get_key(manager, package_name))
+
+
+    def add(self, package_op : PackageOp) -> None:
+        self._ops[self.get_key(package_op.manager, package_op.pkg.name)] = package_op
+
+
+    def remove(self, package_op : PackageOp) -> None:
+        self._ops.pop(self.get_key(package_op.manager, package_op.pkg.name), None)
+
+
+    def clear(self) -> None:
+        self._ops.clear()
+
+
+def group_package_ops(package_ops : List[PackageOp], default_manager=None) -> List[Tuple[object, str, List[PackageOp]]]:
+    """Function that groups marked operations by package manager and operation type
+
+    Parameters
+    ----------
+    package_ops : list of PackageOp
+        The marked operations
+    default_manager : PackageManager
+        Manager used for operations that do not record one
+
+    Returns
+    -------
+    groups : list of (PackageManager, str, list of PackageOp)
+        One entry per manager and op type, ordered per manager by OP_ORDER
+    """
+
+    groups = {}
+    manager_order = {}
+    for package_op in package_ops:
+        manager = package_op.manager if package_op.manager is not None else default_manager
+        manager_order.setdefault(id(manager), len(manager_order))
+        groups.setdefault((id(manager), package_op.op), (manager, package_op.op, []))[2].append(package_op)
+
+    def get_group_order(group):
+        op_index = OP_ORDER.index(group[1]) if group[1] in OP_ORDER else len(OP_ORDER)
+        return manager_order[id(group[0])], op_index
+
+    return sorted(groups.values(), key=get_group_order)
+
+
+def get_distinct_managers(managers : List) -> List:
+    """Function that drops managers sharing a lock with an earlier one
+
+    Managers sharing a lock manage the same packages, ex. pip and pip3 installing into the same
+    environment, so asking both of them for packages would only duplicate the work and the results.
+    """
+
+    distinct_managers = {}
+    for manager in managers:
+        distinct_managers.setdefault(manager.get_lock_name(), manager)
+    return list(distinct_managers.values())
+
+
+def iter_concurrently(func : Callable, items : List) -> Iterator[Tuple[object, Future]]:
+    """Generator that runs a function on every item on a thread of its own, and yields (item, future) as each one finishes
+
+    The threads join the caller's operation, so cancelling it kills the commands of all of them.
+    """
+
+    if len(items) == 0:
+        return
+    engine = EXE.get_engine()
+    operation = engine.get_current_operation()
+
+    def run_item(item):
+        engine.set_current_operation(operation)
+        try:
+            return func(item)
+        finally:
+            engine.set_current_operation(None)
+
+    with ThreadPoolExecutor(max_workers=len(items)) as executor:
+        futures = {executor.submit(run_item, item) : item for item in items}
+        for future in as_completed(futures):
+            yield futures[future], future
+
+
+def apply_batch(manager, op : str, package_ops : List[PackageOp], password : str,
+                on_result : Callable[[PackageOp, bool, str], None]=None) -> Tuple[List[PackageOp], List[Tuple[PackageOp, str]]]:
+    """Function that applies a group of operations as a single transaction, bisecting on failure
+
+    When a transaction fails it is split in half and each half is retried, so that the packages
+    responsible for the failure are still identified, at a cost of O(log n) extra transactions each.
+
+    Parameters
+    ----------
+    manager : PackageManager
+        The manager to run the transaction with
+    op : str
+        The operation type shared by all package_ops
+    package_ops : list of PackageOp
+        The operations to apply
+    password : str
+        Admin password, if any
+    on_result : callable
+        Called with (package_op, success, output) as soon as an operation's outcome is known
+
+    Returns
+    -------
+    succeeded : list of PackageOp
+        Operations that were applied
+    failed : list of (PackageOp, str)
+        Operations that failed, with the output of the failing transaction
+    """
+
+    if len(package_ops) == 0:
+        return [], []
+
+    out, err = manager.apply_packages(op, [package_op.pkg for package_op in package_ops], password)
+    if err == 0:
+        if on_result is not None:
+            for package_op in package_ops:
+                on_result(package_op, True, out)
+        return list(package_ops), []
+    elif len(package_ops) == 1:
+        if on_result is not None:
+            on_result(package_ops[0], False, out)
+        return [], [(package_ops[0], out)]
+
+    middle = len(package_ops) // 2
+    succeeded_first, failed_first = apply_batch(manager, op, package_ops[:middle], password, on_result=on_result)
+    succeeded_second, failed_second = apply_batch(manager, op, package_ops[middle:], password, on_result=on_result)
+    return succeeded_first + succeeded_second, failed_first + failed_second
+
+
+def apply_scheduled(groups : List[Tuple[object, str, List[PackageOp]]], password : str,
+                    on_result : Callable[[PackageOp, bool, str], None]=None,
+                    on_group_start : Callable[[object, str, List[PackageOp]], None]=None) -> Tuple[List[PackageOp], List[Tuple[PackageOp, str]]]:
+    """Function that applies grouped operations for several managers, running independent managers concurrently
+
+    Groups whose managers share a lock (see PackageManager.get_lock_name, ex. everything backed by dpkg)
+    run one after another on the same worker. Groups with different locks run in parallel, so the
+    total time is that of the slowest manager rather than the sum.
+
+    Parameters
+    ----------
+    groups : list of (PackageManager, str, list of PackageOp)
+        Output of group_package_ops
+    password : str
+        Admin password, if any
+    on_result : callable
+        Passed on to apply_batch. Called from worker threads
+    on_group_start : callable
+        Called with (manager, op, package_ops) from a worker thread before each transaction
+
+    Returns
+    -------
+    succeeded : list of PackageOp
+        Operations that were applied
+    failed : list of (PackageOp, str)
+        Operations that failed, with the output of the failing transaction
+    """
+
+    lock_chains = {}
+    for group in groups:
+        lock_chains.setdefault(group[0].get_lock_name(), []).append(group)
+    if len(lock_chains) == 0:
+        return [], []
+
+    # Workers join the caller's operation, so cancelling an apply kills every transaction in it
+    engine = EXE.get_engine()
+    operation = engine.get_current_operation()
+
+    def run_chain(chain):
+        engine.set_current_operation(operation)
+        try:
+            chain_succeeded, chain_failed = [], []
+            for manager, op, package_ops in chain:
+                if on_group_start is not None:
+                    on_group_start(manager, op, package_ops)
+                group_succeeded, group_failed = apply_batch(manager, op, package_ops, password, on_result=on_result)
+                chain_succeeded.extend(group_succeeded)
+                chain_failed.extend(group_failed)
+            return chain_succeeded, chain_failed
+        finally:
+            engine.set_current_operation(None)
+
+    with ThreadPoolExecutor(max_workers=len(lock_chains)) as executor:
+        futures = [executor.submit(run_chain, chain) for chain in lock_chains.values()]
+
+    succeeded, failed = [], []
+    for future in futures:
+        chain_succeeded, chain_failed = future.result()
+        succeeded.extend(chain_succeeded)
+        failed.extend(chain_failed)
+    return succeeded, failed
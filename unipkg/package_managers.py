@@ -6,13 +6,72 @@ unipkg
 
 import unipkg.command_handler as EXE
 import unipkg.packages as PKG
-from typing import List
-from difflib import SequenceMatcher
-import operator
+import unipkg.indexes as IDX
+import unipkg.ranking as RANK
+import unipkg.simple_index as SIMPLE
+import unipkg.tracing as TRACE
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import glob
+import json
+import shutil
+import time
+
+
+# Seconds a '<tool> --version' probe may take before the tool is considered unusable
+PROBE_TIMEOUT = 15
+
+# Seconds an install/remove/update transaction may take
+TRANSACTION_TIMEOUT = 1800
+
+# Methods wrapped with unipkg.tracing hooks in every PackageManager subclass that defines them
+TRACED_METHODS          = ['search_for_packages', 'list_packages', 'get_package_details', 'get_installed_packages', 'get_installed_versions', 'get_outdated_packages', 'apply_packages']
+TRACED_STREAM_METHODS   = ['stream_search_for_packages', 'stream_list_packages']
+
+
+def get_package_names_str(packages) -> str:
+    return ' '.join(package.name for package in packages)
+
+
+def iter_batches(items : Iterable, batch_size : int=256, max_delay : float=0.05) -> Iterator[List]:
+    """Generator that groups items from a stream into lists
+
+    A batch is yielded once it is full, or once max_delay seconds have passed since the last one,
+    so slow producers still surface their first results quickly.
+    """
+
+    batch = []
+    last_yield = time.monotonic()
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size or time.monotonic() - last_yield >= max_delay:
+            yield batch
+            batch = []
+            last_yield = time.monotonic()
+    if len(batch) > 0:
+        yield batch
+
+
+def trace_methods(cls) -> None:
+    for method_name in TRACED_METHODS:
+        if method_name in cls.__dict__:
+            setattr(cls, method_name, TRACE.trace_method(cls.__dict__[method_name]))
+    for method_name in TRACED_STREAM_METHODS:
+        if method_name in cls.__dict__:
+            setattr(cls, method_name, TRACE.trace_stream_method(cls.__dict__[method_name]))
 
 
 class PackageManager:
 
+    package_class = PKG.Package
+
+    # True if a search returns every package matching the search key, so refining the key can be answered from its results
+    search_is_exhaustive = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        trace_methods(cls)
+
     def __init__(self, name: str):
         self.name = name
         self.installer_name = name
@@ -24,23 +83,161 @@ class PackageManager:
     def list_packages(self) -> (List[PKG.Package], int):
         pass
 
-    def update_package(self, package, password, as_admin=False) -> None:
+    def stream_search_for_packages(self, search_key: str) -> Iterator[List[PKG.Package]]:
+        """Generator yielding batches of search results as they are produced. Raises EXE.CommandError on failure
+
+        Managers that can parse their output incrementally override this, the default yields everything at once.
+        """
+
+        ret = self.search_for_packages(search_key)
+        if ret is None:
+            raise EXE.CommandError(f'Searching is not supported for {self.name}', -1)
+        packages, out, err = ret
+        if packages is None or err != 0:
+            raise EXE.CommandError(out, err)
+        yield packages
+
+    def stream_list_packages(self) -> Iterator[List[PKG.Package]]:
+        """Generator yielding batches of installed packages as they are produced. Raises EXE.CommandError on failure
+        """
+
+        ret = self.list_packages()
+        if ret is None:
+            raise EXE.CommandError(f'Listing packages is not supported for {self.name}', -1)
+        if ret[0] is None:
+            raise EXE.CommandError(ret[1], ret[-1])
+        yield ret[0]
+
+    def get_installed_versions(self) -> Dict[str, str]:
+        """Gets installed package name -> installed version. Raises EXE.CommandError on failure, rather than returning nothing
+        """
+
+        return {package.name : package.version for batch in self.stream_list_packages() for package in batch}
+
+    def prepare_search(self) -> None:
+        """Builds whatever makes later searches faster, for long running processes to call in the background
+
+        It must not reach the network, searches do that themselves when they need to. Searches work
+        without it, the default does nothing.
+        """
+
         pass
 
+    def get_pinned_name(self, name : str, version : str) -> str:
+        """Gets the argument that makes an install transaction install a package at exactly one version
+
+        Managers that can't pin versions install the named package as is.
+        """
+
+        return name
+
+    def get_outdated_packages(self) -> (Optional[Dict[str, Tuple[str, str, str]]], str, int):
+        """Finds the installed packages that have a newer version available
+
+        Returns
+        -------
+        outdated : dict of str -> (str, str, str)
+            Package name -> (installed version, newest version, description), None on failure
+        out : str
+            Error output on failure
+        err : int
+            Nonzero on failure
+        """
+
+        return None, f'Checking for updates is not supported for {self.name}', -1
+
+    def update_package(self, package, password, as_admin=False) -> None:
+        return self.update_packages([package], password, as_admin=as_admin)
+
     def install_package(self, package, password, as_admin=False) -> None:
-        command_str = f'{self.installer_name} install {package.name}'
-        return EXE.execute_command(command_str, as_admin, passwd=password, expect='Password:')
+        return self.install_packages([package], password, as_admin=as_admin)
 
     def remove_package(self, package, password, as_admin=False) -> None:
-        command_str = f'{self.installer_name} uninstall -y {package.name}'
-        return EXE.execute_command(command_str, as_admin, passwd=password, expect='Password:')
+        return self.remove_packages([package], password, as_admin=as_admin)
+
+    def update_packages(self, packages, password, as_admin=False) -> (str, int):
+        return f'Updating packages is not supported for {self.name}', -1
+
+    def install_packages(self, packages, password, as_admin=False) -> (str, int):
+        command_str = f'{self.installer_name} install {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, as_admin, passwd=password, expect='Password:', timeout=TRANSACTION_TIMEOUT)
+
+    def remove_packages(self, packages, password, as_admin=False) -> (str, int):
+        command_str = f'{self.installer_name} uninstall -y {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, as_admin, passwd=password, expect='Password:', timeout=TRANSACTION_TIMEOUT)
+
+    def apply_packages(self, op : str, packages, password, as_admin=False) -> (str, int):
+        """Runs one operation on a group of packages as a single package manager transaction
+
+        Parameters
+        ----------
+        op : str
+            One of 'Install', 'Uninstall' or 'Update'
+        packages : list of Package
+            The packages to operate on
+
+        Returns
+        -------
+        out : str
+            Output of the transaction
+        err : int
+            Nonzero if the transaction failed
+        """
+
+        if op == 'Install':
+            return self.install_packages(packages, password, as_admin=as_admin)
+        elif op == 'Update':
+            return self.update_packages(packages, password, as_admin=as_admin)
+        else:
+            return self.remove_packages(packages, password, as_admin=as_admin)
+
+    def get_package_details(self, packages : List[PKG.Package]) -> Dict[str, str]:
+        """Gets the info text shown for each of a list of packages, in as few subprocess calls as possible
+
+        Returns
+        -------
+        details : dict of str -> str
+            Package name -> info text
+        """
+
+        return {package.name : package.get_info() for package in packages}
+
+    def get_catalog_version(self) -> Optional[Tuple]:
+        """Gets a value that changes whenever the available package catalog changes, used to invalidate caches
+        """
+
+        return None
+
+    def get_installed_version(self) -> Optional[Tuple]:
+        """Gets a value that changes whenever packages are installed or removed, used to invalidate caches
+        """
+
+        return None
+
+    def get_lock_name(self) -> str:
+        """Gets the name of the lock this manager's transactions hold. Managers sharing a lock are never run concurrently
+        """
+
+        return self.name
+
+    def probe(self) -> int:
+        """Runs the manager's version command
+
+        Returns
+        -------
+        err : int
+            Its exit code, or EXE.ERR_TIMEOUT or EXE.ERR_NOT_FOUND if it could not be run to completion
+        """
 
-    def check_exists(self) -> bool:
         command = f'{self.installer_name} --version'
-        _, err = EXE.execute_command(command, False)
-        if err == 0:
-            return True
-        return False
+        try:
+            _, err = EXE.execute_command(command, False, timeout=PROBE_TIMEOUT)
+        except OSError:
+            return EXE.ERR_NOT_FOUND
+        return err
+
+    def check_exists(self) -> bool:
+        return self.probe() == 0
 
     def __str__(self):
         if self.is_selected:
@@ -49,117 +246,641 @@ class PackageManager:
             return f'   {self.name}'
 
 
-    def get_best_match_packages(self, pkg_names: List[str], search_key : str) -> List[str]:
+    def get_best_match_packages(self, pkg_names: List[str], search_key : str, limit : int=None) -> List[str]:
+        return RANK.rank_names(pkg_names, search_key, k=limit)
+
 
-        sim_dict = {}
-        for pkg_name in pkg_names:
-            sim_dict[pkg_name] = SequenceMatcher(None, pkg_name, search_key).quick_ratio()
-        sim_dict_sorted = sorted(sim_dict.items(), key=operator.itemgetter(1))
-        sim_dict_sorted.reverse()
-        return [x[0] for x in sim_dict_sorted]
+# Subclasses are traced by __init_subclass__, the base class has to be done by hand
+trace_methods(PackageManager)
 
 
 class Aptitude(PackageManager):
 
+    package_class = PKG.AptitudePackage
+
     def __init__(self):
         super().__init__('apt')
 
         self.installer_name = 'apt-get'
         self.cache_name = 'apt-cache'
+        self.catalog_index = IDX.AptCatalogIndex()
+        self.status_index = IDX.DpkgStatusIndex()
 
 
-    def search_for_packages(self, search_key: str):
-        command_str = f'{self.cache_name} search {search_key}'
-        out, err = EXE.execute_command(command_str, False)
+    def install_packages(self, packages, password, as_admin=False) -> (str, int):
+        # Pinned versions, see get_pinned_name, may be older than the installed ones, which apt-get refuses unless told
+        downgrade_flag = ' --allow-downgrades' if any('=' in package.name for package in packages) else ''
+        command_str = f'{self.installer_name} install -y{downgrade_flag} {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, as_admin, passwd=password, expect='Password:', timeout=TRANSACTION_TIMEOUT)
+
+    def remove_packages(self, packages, password, as_admin=False) -> (str, int):
+        command_str = f'{self.installer_name} remove -y {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, as_admin, passwd=password, expect='Password:', timeout=TRANSACTION_TIMEOUT)
+
+    def update_packages(self, packages, password, as_admin=False) -> (str, int):
+        command_str = f'{self.installer_name} install --only-upgrade -y {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, as_admin, passwd=password, expect='Password:', timeout=TRANSACTION_TIMEOUT)
+
+
+    def get_lock_name(self) -> str:
+        return 'dpkg'
+
 
-        installed_packages = []
-        installed, _ = EXE.execute_command('dpkg --get-selections', False)
-        for line in installed:
-            installed_packages.append(line.split(':', 1)[0])
+    def get_catalog_version(self) -> Optional[Tuple]:
+        return self.catalog_index.get_stamp()
 
+
+    def get_installed_version(self) -> Optional[Tuple]:
+        return self.status_index.get_stamp()
+
+
+    def get_package_details(self, packages : List[PKG.AptitudePackage]) -> Dict[str, str]:
+        if len(packages) == 0:
+            return {}
+        out, err = EXE.execute_command(f'{self.cache_name} show {get_package_names_str(packages)}', False)
+        if err != 0:
+            # apt-cache show fails if any name is unknown, so fall back to one call per package
+            if len(packages) == 1:
+                return {packages[0].name : packages[0].get_info_str()}
+            return {package.name : package.get_info() for package in packages}
+
+        stanzas = {}
+        for stanza in out.split('\n\n'):
+            if stanza.startswith('Package:'):
+                name = stanza.split('\n', 1)[0].split(':', 1)[1].strip()
+                # Every available version gets a stanza, the first one is kept
+                stanzas.setdefault(name, stanza)
+
+        details = {}
+        for package in packages:
+            if package.name in stanzas:
+                package.update_from_show_output(stanzas[package.name])
+            details[package.name] = package.get_info_str()
+        return details
+
+
+    def get_installed_packages(self) -> Dict[str, str]:
+        """Gets installed package name -> installed version, from the dpkg database if possible, empty on failure
+        """
+
+        try:
+            return self.get_installed_versions()
+        except EXE.CommandError:
+            return {}
+
+
+    def get_installed_versions(self) -> Dict[str, str]:
+        if self.status_index.is_available():
+            return self.status_index.get_installed()
+
+        installed_packages = {}
+        out, err = EXE.execute_command('dpkg-query -W -f=${Package}\t${Version}\t${db:Status-Status}\n', False)
+        if err != 0:
+            raise EXE.CommandError(out, err)
+        for line in out.splitlines():
+            fields = line.split('\t')
+            if len(fields) == 3 and fields[2] == 'installed':
+                installed_packages[fields[0]] = fields[1]
+        return installed_packages
+
+
+    def get_pinned_name(self, name : str, version : str) -> str:
+        return f'{name}={version}' if len(version) > 0 else name
+
+
+    def list_packages(self) -> (List[PKG.AptitudePackage], int):
+        try:
+            installed_packages = self.get_installed_versions()
+        except EXE.CommandError as e:
+            return None, e.out, e.err
+
+        # dpkg's status only carries long descriptions, the short ones come from the catalog
+        catalog = {}
+        if self.catalog_index.is_available():
+            self.catalog_index.refresh()
+            catalog = self.catalog_index.packages
+        packages = [PKG.AptitudePackage(name, version, catalog.get(name, ('', ''))[1], True) for name, version in installed_packages.items()]
+        packages.sort(key=lambda package : package.name)
+        return packages, 0
+
+
+    def get_outdated_packages(self) -> (Optional[Dict[str, Tuple[str, str, str]]], str, int):
+        # Pins can change any candidate, so with them only apt itself knows what is upgradable
+        if self.catalog_index.is_available() and self.status_index.is_available() and not self.catalog_index.has_pins():
+            return self.catalog_index.get_upgrades(self.status_index.get_installed()), '', 0
+
+        out, err = EXE.execute_command('apt list --upgradable', False)
         if err != 0:
             return None, out, err
+        return self.parse_upgradable_output(out), '', 0
+
+
+    def parse_upgradable_output(self, out : str) -> Dict[str, Tuple[str, str, str]]:
+        # Lines look like 'name/suite 2.0-1 amd64 [upgradable from: 1.0-1]'
+        outdated = {}
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) >= 6 and '/' in fields[0] and line.endswith(']'):
+                outdated[fields[0].split('/', 1)[0]] = (fields[-1][:-1], fields[1], '')
+        return outdated
+
+
+    def search_for_packages(self, search_key: str):
+        if self.catalog_index.is_available():
+            results = self.catalog_index.search(search_key)
         else:
-            lines = out.splitlines()
-            pkg_names = []
-            pkg_descs = {}
-            for line in lines:
-                if len(line.strip()) == 0:
-                    pass
-                else:
-                    pkg = line.strip().split(' - ', 1)
-                    pkg_name = pkg[0]
-                    pkg_desc = pkg[1]
-                    pkg_names.append(pkg_name)
-                    pkg_descs[pkg_name] = pkg_desc
-            actual_pkgs = self.get_best_match_packages(pkg_names, search_key)
-            packages = []
-            for pkg_name in actual_pkgs:
-
-                pkg_desc = pkg_descs[pkg_name]
-                #_, ret_installed = EXE.execute_command(
-                #    f'dpkg -l {pkg[0]}', False)
-                is_installed = False
-                if pkg_name in installed_packages:
-                    is_installed = True
-
-
-                if is_installed:
-                    packages.insert(0, PKG.AptitudePackage(pkg_name, '', pkg_desc, is_installed))
-                else:
-                    packages.append(PKG.AptitudePackage(
-                        pkg_name, '', pkg_desc, is_installed))
-
-            return packages, '', 0
+            command_str = f'{self.cache_name} search {search_key}'
+            out, err = EXE.execute_command(command_str, False)
+            if err != 0:
+                return None, out, err
+            results = self.parse_search_output(out)
+
+        installed_packages = self.get_installed_packages()
+
+        matches = {pkg_name : (pkg_version, pkg_desc) for pkg_name, pkg_version, pkg_desc in results}
+        actual_pkgs = self.get_best_match_packages(list(matches), search_key)
+        installed_matches = []
+        other_matches = []
+        for pkg_name in actual_pkgs:
+            pkg_version, pkg_desc = matches[pkg_name]
+            if pkg_name in installed_packages:
+                installed_matches.append(PKG.AptitudePackage(pkg_name, installed_packages[pkg_name], pkg_desc, True))
+            else:
+                other_matches.append(PKG.AptitudePackage(pkg_name, pkg_version, pkg_desc, False))
+
+        return installed_matches + other_matches, '', 0
+
+
+    def parse_search_output(self, out : str) -> List[Tuple[str, str, str]]:
+        results = []
+        for line in out.splitlines():
+            if len(line.strip()) == 0:
+                pass
+            else:
+                pkg = line.strip().split(' - ', 1)
+                results.append((pkg[0], '', pkg[1] if len(pkg) > 1 else ''))
+        return results
 
 
 class Pip(PackageManager):
 
-    def __init__(self, name: str):
-        super().__init__(name)
+    package_class = PKG.PipPackage
 
-    def update_package(self, package, password, as_admin=False) -> (str, str):
-        command_str = f'{self.name} install --upgrade {package.name}'
-        return EXE.execute_command(command_str, False)
+    # Name index searches include fuzzy matches, which narrowing by substring would not reproduce
+    search_is_exhaustive = False
 
-    def list_packages(self) -> (List[PKG.PipPackage], int):
-        command_str = f'{self.name} list --format=freeze'
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._site_dirs = None
+        self._dist_index = None
+
+
+    def get_interpreter(self) -> Optional[str]:
+        """Gets the python interpreter this pip installs into, read from the shebang of the pip script
+        """
+
+        pip_path = shutil.which(self.name)
+        if pip_path is None:
+            return None
+        try:
+            with open(pip_path, 'rb') as pip_fp:
+                first_line = pip_fp.readline(4096)
+        except OSError:
+            return None
+        if not first_line.startswith(b'#!'):
+            return None
+        tokens = first_line[2:].decode(errors='replace').split()
+        if len(tokens) > 0 and os.path.basename(tokens[0]) == 'env':
+            # #!/usr/bin/env python3, the interpreter is looked up on PATH, after any env options and assignments
+            arguments = [token for token in tokens[1:] if not token.startswith('-') and '=' not in token]
+            interpreter = shutil.which(arguments[0]) if len(arguments) > 0 else None
+        else:
+            interpreter = tokens[0] if len(tokens) > 0 else None
+        if interpreter is None:
+            return None
+        interpreter = os.path.realpath(interpreter)
+        # Wrappers like pyenv shims are shell scripts, their shebang says nothing about the environment
+        if not os.path.basename(interpreter).lower().startswith(('python', 'pypy')):
+            return None
+        try:
+            with open(interpreter, 'rb') as interpreter_fp:
+                if interpreter_fp.read(2) == b'#!':
+                    return None
+        except OSError:
+            return None
+        return interpreter
+
+
+    def get_lock_name(self) -> str:
+        # pip and pip3 often install into the same environment, and must not run over each other there
+        interpreter = self.get_interpreter()
+        if interpreter is None:
+            return self.name
+        return f'pip:{interpreter}'
+
+
+    def get_site_packages_dirs(self) -> List[str]:
+        """Gets the directories the target interpreter loads distributions from, resolved once per manager
+        """
+
+        if self._site_dirs is None:
+            self._site_dirs = self.find_site_packages_dirs()
+        return self._site_dirs
+
+
+    def find_site_packages_dirs(self) -> List[str]:
+        interpreter = self.get_interpreter()
+        if interpreter is None:
+            return []
+
+        # The interpreter knows its own sys.path, including user site and .pth additions
+        out, err = EXE.execute_command(f'{interpreter} -c "import sys;print(chr(10).join(sys.path))"', False, timeout=PROBE_TIMEOUT)
+        if err == 0:
+            return [path for path in out.splitlines() if len(path) > 0 and os.path.isdir(path)]
+
+        prefix = os.path.dirname(os.path.dirname(interpreter))
+        site_dirs = []
+        for lib_dir in [os.path.join(prefix, 'lib'), os.path.join(os.path.expanduser('~'), '.local', 'lib')]:
+            site_dirs.extend(glob.glob(os.path.join(lib_dir, 'python*', 'site-packages')))
+            site_dirs.extend(glob.glob(os.path.join(lib_dir, 'python*', 'dist-packages')))
+        return sorted(site_dirs)
+
+
+    def get_dist_index(self) -> IDX.PythonDistIndex:
+        if self._dist_index is None:
+            self._dist_index = IDX.PythonDistIndex(self.get_site_packages_dirs())
+        return self._dist_index
+
+
+    def get_installed_version(self) -> Optional[Tuple]:
+        # Installing or removing a distribution adds or removes a *.dist-info entry, which bumps the directory mtime
+        return self.get_dist_index().get_stamp()
+
+
+    def get_package_details(self, packages : List[PKG.PipPackage]) -> Dict[str, str]:
+        dist_index = self.get_dist_index()
+        installed = dist_index.get_installed() if dist_index.is_available() else {}
+        details = {}
+        for package in packages:
+            metadata = installed.get(IDX.get_canonical_name(package.name))
+            if metadata is None:
+                details[package.name] = package.get_info()
+            else:
+                _, version, summary, requires = metadata
+                details[package.name] = f'{package.name:<32} | {version:<8} | {summary or package.description}'
+                # Requirements of optional extras are left out
+                requires = [requirement.split(';')[0].strip() for requirement in requires if 'extra ==' not in requirement]
+                if len(requires) > 0:
+                    details[package.name] += f'\n    Requires: {", ".join(requires)}'
+        return details
+
+
+    def update_packages(self, packages, password, as_admin=False) -> (str, int):
+        command_str = f'{self.name} install --upgrade {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, False, timeout=TRANSACTION_TIMEOUT)
+
+    def get_pinned_name(self, name : str, version : str) -> str:
+        return f'{name}=={version}' if len(version) > 0 else name
+
+    def get_outdated_packages(self) -> (Optional[Dict[str, Tuple[str, str, str]]], str, int):
+        # pip compares versions by PEP 440 and knows which index it installs from, so it is left to pip itself
+        command_str = f'{self.name} list --outdated --format=json --disable-pip-version-check'
         out, err = EXE.execute_command(command_str, False)
         if err != 0:
             return None, out, err
-        else:
-            lines = out.splitlines()
-            packages = []
-            for line in lines:
-                if len(line) > 0:
-                    name_ver = line.strip().split('==')
-                    packages.append(PKG.PipPackage(
-                        name_ver[0], name_ver[1], '', True))
-            return packages, err
+        try:
+            items = json.loads(out[out.index('['):])
+        except ValueError:
+            return None, f'Unexpected output from {command_str}: {out}', -1
+
+        dist_index = self.get_dist_index()
+        installed = dist_index.get_installed() if dist_index.is_available() else {}
+        outdated = {}
+        for item in items:
+            metadata = installed.get(IDX.get_canonical_name(item['name']))
+            outdated[item['name']] = (item['version'], item['latest_version'], '' if metadata is None else metadata[2])
+        return outdated, '', 0
+
+    def list_packages(self) -> (List[PKG.PipPackage], int):
+        try:
+            packages = [pkg for batch in self.stream_list_packages() for pkg in batch]
+        except EXE.CommandError as e:
+            return None, e.out, e.err
+        return packages, 0
+
+
+    def stream_list_packages(self) -> Iterator[List[PKG.PipPackage]]:
+        dist_index = self.get_dist_index()
+        if dist_index.is_available():
+            packages = [PKG.PipPackage(name, version, summary, True) for name, version, summary, _ in dist_index.get_installed().values()]
+            packages.sort(key=lambda package : package.name.lower())
+            return iter([packages])
+
+        # No interpreter to introspect, ex. pip is a shell wrapper, so ask pip itself
+        command_str = f'{self.name} list --format=freeze'
+        return iter_batches(self.parse_list_output(EXE.stream_command(command_str, False)))
+
+
+    def parse_list_output(self, lines : Iterable[str]) -> Iterator[PKG.PipPackage]:
+        for line in lines:
+            line = line.strip()
+            if len(line) == 0:
+                pass
+            elif '==' in line:
+                name_ver = line.split('==', 1)
+                yield PKG.PipPackage(name_ver[0], name_ver[1], '', True)
+            else:
+                # Direct references, ex. 'name @ file:///path', carry no pinned version
+                yield PKG.PipPackage(line.split(' @ ', 1)[0], '', '', True)
+
+
     def search_for_packages(self, search_key: str) -> (List[PKG.PipPackage], int):
-        command_str = f'{self.name} search {search_key}'
-        out, err = EXE.execute_command(command_str, False)
+        try:
+            packages = [pkg for batch in self.stream_search_for_packages(search_key) for pkg in batch]
+        except EXE.CommandError as e:
+            return None, e.out, e.err
+        return packages, '', 0
 
-        if err != 0:
-            return None, err
-        else:
-            lines = out.splitlines()
-            packages = []
-            for line in lines:
-                if len(line.strip()) == 0:
-                    pass
-                elif 'INSTALLED' in line:
-                    packages[len(packages) - 1].installed = True
-                elif ' - ' in line:
-                    name = line.split(' ')[0].strip()
-                    version = line.split(' ')[1].strip()[1:-1]
-                    description = line.split(' - ', 1)[-1].strip()
-                    packages.append(PKG.PipPackage(
-                        name, version, description, False))
-            return packages, '', 0
+
+    def get_catalog_version(self) -> Optional[Tuple]:
+        return SIMPLE.get_name_index().get_version()
+
+    def prepare_search(self) -> None:
+        # Only the local copy, the index is checked by the first search that needs it
+        name_index = SIMPLE.get_name_index()
+        if name_index.ensure_loaded():
+            name_index.build_ranking_index()
+
+
+    def stream_search_for_packages(self, search_key: str) -> Iterator[List[PKG.PipPackage]]:
+        name_index = SIMPLE.get_name_index()
+        if name_index.ensure_synced():
+            return iter([self.get_index_search_results(name_index, search_key)])
+
+        # Never synced and the index can't be reached, so try pip search, which only works against self-hosted indexes
+        command_str = f'{self.name} search {search_key}'
+        return iter_batches(self.parse_search_output(EXE.stream_command(command_str, False)))
+
+
+    def get_index_search_results(self, name_index : SIMPLE.SimpleNameIndex, search_key : str) -> List[PKG.PipPackage]:
+        """Searches the local copy of the index project names, marking the ones installed in this environment
+        """
+
+        dist_index = self.get_dist_index()
+        installed = dist_index.get_installed() if dist_index.is_available() else {}
+        packages = []
+        for name, summary in name_index.search(search_key):
+            metadata = installed.get(IDX.get_canonical_name(name))
+            if metadata is None:
+                packages.append(PKG.PipPackage(name, '', summary, False))
+            else:
+                packages.append(PKG.PipPackage(name, metadata[1], summary or metadata[2], True))
+        return packages
+
+
+    def parse_search_output(self, lines : Iterable[str]) -> Iterator[PKG.PipPackage]:
+        # An 'INSTALLED:' line refers to the package above it, so each package is held back until the next one starts
+        pending = None
+        for line in lines:
+            if len(line.strip()) == 0:
+                pass
+            elif 'INSTALLED' in line:
+                if pending is not None:
+                    pending.installed = True
+            elif ' - ' in line:
+                if pending is not None:
+                    yield pending
+                name = line.split(' ')[0].strip()
+                version = line.split(' ')[1].strip()[1:-1]
+                description = line.split(' - ', 1)[-1].strip()
+                pending = PKG.PipPackage(name, version, description, False)
+        if pending is not None:
+            yield pending
+
+
+def iter_json_array(lines : Iterable[str]) -> Iterator:
+    """Generator that decodes the items of a json array as its text streams in, without waiting for the closing bracket
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The json text, ex. a StreamedCommand
+
+    Yields
+    ------
+    item : object
+        The decoded array items, in order
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for line in lines:
+        buffer = f'{buffer}{line}\n'
+        position = 0
+        while True:
+            # Skip separators between items, and the brackets around the array
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+                position += 1
+            if position >= len(buffer):
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The item is not complete yet
+                break
+            yield item
+        buffer = buffer[position:]
+
+
+def read_npmrc_value(npmrc_path : str, key : str) -> Optional[str]:
+    """Function that reads one setting from an npmrc file, the way npm does
+
+    Parameters
+    ----------
+    npmrc_path : str
+        Path to the npmrc, missing files are treated as empty
+    key : str
+        The setting, ex. prefix
+
+    Returns
+    -------
+    value : str
+        The last value set for key, with ${VAR} references and a leading ~ expanded, or None if unset
+    """
+
+    try:
+        with open(npmrc_path, 'r', encoding='utf-8', errors='replace') as npmrc_fp:
+            lines = npmrc_fp.read().splitlines()
+    except OSError:
+        return None
+
+    value = None
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line[0] in ';#' or '=' not in line:
+            continue
+        name, line_value = line.split('=', 1)
+        if name.strip() == key:
+            value = line_value.strip().strip('"\'')
+    if value is None or len(value) == 0:
+        return None
+    return os.path.expanduser(os.path.expandvars(value))
 
 
 class Npm(PackageManager):
 
+    package_class = PKG.NpmPackage
+
+    # npm search only returns the best few results from the registry
+    search_is_exhaustive = False
+
     def __init__(self, name):
         super().__init__(name)
+        self._global_index = None
+
+
+    def get_global_root(self) -> Optional[str]:
+        """Gets the global node_modules directory, avoiding starting npm where possible
+
+        npm itself normally lives in the global node_modules of its builtin prefix, ex.
+        /usr/lib/node_modules/npm/bin/npm-cli.js. The prefix can be moved by the environment, the
+        user npmrc, the global npmrc under the builtin prefix, or the npmrc shipped with npm, which
+        are checked in the order npm checks them. npm root -g is the last resort.
+        """
+
+        builtin_root, npm_dir = None, None
+        npm_path = shutil.which(self.installer_name)
+        if npm_path is not None:
+            path = os.path.realpath(npm_path)
+            while os.path.dirname(path) != path:
+                npm_dir, path = path, os.path.dirname(path)
+                if os.path.basename(path) == 'node_modules':
+                    builtin_root = path
+                    break
+
+        prefix = os.environ.get('NPM_CONFIG_PREFIX', os.environ.get('npm_config_prefix'))
+        if prefix is None:
+            npmrc_paths = [os.environ.get('NPM_CONFIG_USERCONFIG', os.path.join(os.path.expanduser('~'), '.npmrc'))]
+            if builtin_root is not None:
+                builtin_prefix = os.path.dirname(builtin_root) if os.name == 'nt' else os.path.dirname(os.path.dirname(builtin_root))
+                npmrc_paths.append(os.environ.get('NPM_CONFIG_GLOBALCONFIG', os.path.join(builtin_prefix, 'etc', 'npmrc')))
+                npmrc_paths.append(os.path.join(npm_dir, 'npmrc'))
+            for npmrc_path in npmrc_paths:
+                prefix = read_npmrc_value(npmrc_path, 'prefix')
+                if prefix is not None:
+                    break
+        if prefix is not None:
+            return os.path.join(prefix, 'node_modules') if os.name == 'nt' else os.path.join(prefix, 'lib', 'node_modules')
+        if builtin_root is not None:
+            return builtin_root
+
+        out, err = EXE.execute_command(f'{self.installer_name} root -g', False, timeout=PROBE_TIMEOUT)
+        if err != 0 or len(out.strip()) == 0:
+            return None
+        return out.strip()
+
+
+    def get_global_index(self) -> IDX.NpmGlobalIndex:
+        if self._global_index is None:
+            self._global_index = IDX.NpmGlobalIndex(self.get_global_root())
+        return self._global_index
+
+
+    def get_lock_name(self) -> str:
+        return f'npm:{self.get_global_index().root_dir}'
+
+
+    def get_installed_version(self) -> Optional[Tuple]:
+        return self.get_global_index().get_stamp()
+
+
+    def install_packages(self, packages, password, as_admin=False) -> (str, int):
+        command_str = f'{self.installer_name} install -g {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, False, timeout=TRANSACTION_TIMEOUT)
+
+
+    def remove_packages(self, packages, password, as_admin=False) -> (str, int):
+        command_str = f'{self.installer_name} uninstall -g {get_package_names_str(packages)}'
+        return EXE.execute_command(command_str, False, timeout=TRANSACTION_TIMEOUT)
+
+
+    def update_packages(self, packages, password, as_admin=False) -> (str, int):
+        # npm update -g skips packages whose new release is outside the installed major version, installing @latest does not
+        command_str = f'{self.installer_name} install -g {" ".join(f"{package.name}@latest" for package in packages)}'
+        return EXE.execute_command(command_str, False, timeout=TRANSACTION_TIMEOUT)
+
+
+    def get_pinned_name(self, name : str, version : str) -> str:
+        return f'{name}@{version}' if len(version) > 0 else name
+
+
+    def get_installed_packages(self) -> Dict[str, Tuple[str, str]]:
+        """Gets installed package name -> (installed version, description), read from the global node_modules
+        """
+
+        global_index = self.get_global_index()
+        if not global_index.is_available():
+            return {}
+        return global_index.get_installed()
+
+
+    def get_outdated_packages(self) -> (Optional[Dict[str, Tuple[str, str, str]]], str, int):
+        command_str = f'{self.installer_name} outdated -g --json'
+        # npm outdated exits with 1 whenever something is outdated, and stdout is only kept for successful
+        # blocking commands, so it is streamed, and the output tells a real failure apart
+        lines = []
+        try:
+            lines.extend(EXE.stream_command(command_str, False))
+        except EXE.CommandCancelled:
+            raise
+        except EXE.CommandError as e:
+            if e.err != 1:
+                return None, e.out, e.err
+        out = '\n'.join(lines)
+        try:
+            items = json.loads(out[out.index('{'):]) if len(out.strip()) > 0 else {}
+        except ValueError:
+            return None, f'Unexpected output from {command_str}: {out}', -1
+
+        installed_packages = self.get_installed_packages()
+        outdated = {}
+        for name, item in items.items():
+            if not isinstance(item, dict) or 'latest' not in item or item.get('current') == item['latest']:
+                continue
+            installed_version, description = installed_packages.get(name, (item.get('current', ''), ''))
+            outdated[name] = (item.get('current', installed_version), item['latest'], description)
+        return outdated, '', 0
+
+
+    def list_packages(self) -> (List[PKG.NpmPackage], int):
+        global_index = self.get_global_index()
+        if not global_index.is_available():
+            return None, f'Could not locate the global node_modules directory for {self.name}', EXE.ERR_NOT_FOUND
+        installed_packages = self.get_installed_packages()
+        packages = [PKG.NpmPackage(name, version, description, True) for name, (version, description) in sorted(installed_packages.items())]
+        return packages, 0
+
+
+    def search_for_packages(self, search_key: str) -> (List[PKG.NpmPackage], int):
+        try:
+            packages = [pkg for batch in self.stream_search_for_packages(search_key) for pkg in batch]
+        except EXE.CommandError as e:
+            return None, e.out, e.err
+        return packages, '', 0
+
+
+    def stream_search_for_packages(self, search_key: str) -> Iterator[List[PKG.NpmPackage]]:
+        command_str = f'{self.installer_name} search --json {search_key}'
+        return iter_batches(self.parse_search_output(EXE.stream_command(command_str, False), self.get_installed_packages()))
+
+
+    def parse_search_output(self, lines : Iterable[str], installed_packages : Dict[str, Tuple[str, str]]) -> Iterator[PKG.NpmPackage]:
+        for item in iter_json_array(lines):
+            if not isinstance(item, dict) or 'name' not in item:
+                continue
+            name = item['name']
+            description = item.get('description') or ''
+            if name in installed_packages:
+                yield PKG.NpmPackage(name, installed_packages[name][0], description, True)
+            else:
+                yield PKG.NpmPackage(name, item.get('version', ''), description, False)
@@ -1,47 +1,116 @@
 """Module containing python class representations for different package types
+
+Searches and listings can hold hundreds of thousands of packages at once, so packages use
+__slots__ instead of a per-instance __dict__, and the padded row shown in the package list is
+formatted once and cached until the version changes.
+
+Packages shown alongside packages of other managers, ex. in a search of every manager, carry the
+name of the manager they belong to as their source, and their row is prefixed with it.
 """
 
 import unipkg.command_handler as EXE
+import unipkg.indexes as IDX
 
 class Package:
 
+    __slots__ = ('name', '_version', 'description', 'installed', 'marked_op', 'source', '_row')
+
     def __init__(self, name : str, version : str, description : str, installed : bool):
         self.name = name
-        self.version = version
+        self._version = version
         self.description = description
         self.installed = installed
         self.marked_op = None
+        self.source = None
+        self._row = None
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    @version.setter
+    def version(self, version : str) -> None:
+        self._version = version
+        self._row = None
+
+    def set_source(self, source : str) -> None:
+        self.source = source
+        self._row = None
 
     def get_info(self) -> str:
         return str(self)
 
-    def __str__(self) -> str:
+    def get_row(self) -> str:
         return f'{self.name:<32} | {self.version:<8} | {self.description}'
 
+    def __str__(self) -> str:
+        # The package list renders every visible row on every frame
+        if self._row is None:
+            self._row = self.get_row() if self.source is None else f'{self.source:<6} | {self.get_row()}'
+        return self._row
+
 
 class PipPackage(Package):
 
-    def __init__(self, name : str, version : str, description : str, installed : bool):
-        super().__init__(name, version, description, installed)
+    __slots__ = ()
+
+
+class NpmPackage(Package):
+
+    __slots__ = ()
+
+
+class UpdatePackage(Package):
+    """Class representing an installed package with a newer version available, from any manager
+
+    The version shows the version diff, and the source is the name of the manager it belongs to.
+    """
+
+    __slots__ = ('installed_version', 'new_version')
+
+    def __init__(self, name : str, installed_version : str, new_version : str, description : str, source : str):
+        super().__init__(name, f'{installed_version} -> {new_version}', description, True)
+        self.installed_version = installed_version
+        self.new_version = new_version
+        self.source = source
+
+    def get_row(self) -> str:
+        return f'{self.name:<32} | {self.version:<24} | {self.description}'
 
 
 class AptitudePackage(Package):
+
+    __slots__ = ('candidate_version',)
+
     def __init__(self, name : str, version : str, description : str, installed : bool):
         super().__init__(name, version, description, installed)
-
+        self.candidate_version = None
 
     def get_info(self) -> str:
         pkg_info, _ = EXE.execute_command(
             f'apt-cache show {self.name}', False)
+        self.update_from_show_output(pkg_info)
+        return self.get_info_str()
+
+
+    def update_from_show_output(self, pkg_info : str) -> None:
         pkg_info_lines = pkg_info.splitlines()
         for pkg_info_line in pkg_info_lines:
             if pkg_info_line.startswith('Version:'):
-                self.version = pkg_info_line.split(
+                self.candidate_version = pkg_info_line.split(
                     'Version:', 1)[1].strip()
+                # apt-cache shows available versions, an installed package keeps the version it has
+                if not self.installed:
+                    self.version = self.candidate_version
                 break
-        
-        return f'{self.name:<32} | {self.version:<8} | {self.description}'
 
 
-    def __str__(self) -> str:
-        return f'{self.name:<28} | {self.description}'
\ No newline at end of file
+    def get_info_str(self) -> str:
+        version = self.version
+        if self.installed and self.candidate_version is not None and IDX.compare_deb_versions(self.candidate_version, version) > 0:
+            version = f'{version} -> {self.candidate_version}'
+        return f'{self.name:<32} | {version:<8} | {self.description}'
+
+
+    def get_row(self) -> str:
+        return f'{self.name:<28} | {self.description}'
@@ -0,0 +1,86 @@
+"""Module containing the startup profiler enabled with unipkg --profile-startup
+
+Phases are marked with mark(), which is a no-op unless a profile was started, so the calls can
+stay in place on the startup path at no cost.
+"""
+
+import sys
+import time
+from typing import List, TextIO, Tuple
+
+# Time-to-interactive budget, in seconds. Startups slower than this are flagged in the report
+STARTUP_BUDGET = 0.5
+
+
+class StartupProfile:
+    """Class that records named startup phases, relative to a start time
+
+    Attributes
+    ----------
+    start_time : float
+        time.perf_counter() value the phases are measured from
+    marks : list of (str, float)
+        Phase name and the perf_counter value at which it ended
+    budget : float
+        Time-to-interactive budget in seconds
+    """
+
+    def __init__(self, start_time : float=None, budget : float=STARTUP_BUDGET):
+        self.start_time = time.perf_counter() if start_time is None else start_time
+        self.marks = []
+        self.budget = budget
+
+
+    def mark(self, phase : str, mark_time : float=None) -> None:
+        self.marks.append((phase, time.perf_counter() if mark_time is None else mark_time))
+
+
+    def get_phases(self) -> List[Tuple[str, float]]:
+        """Gets (phase, duration in seconds) for every marked phase, in order
+        """
+
+        phases = []
+        last_time = self.start_time
+        for phase, mark_time in self.marks:
+            phases.append((phase, mark_time - last_time))
+            last_time = mark_time
+        return phases
+
+
+    def get_total(self) -> float:
+        return self.marks[-1][1] - self.start_time if len(self.marks) > 0 else 0
+
+
+    def get_report(self) -> str:
+        lines = ['Startup profile:']
+        for phase, duration in self.get_phases():
+            lines.append(f'  {phase:<24} {duration * 1000:8.1f} ms')
+        total = self.get_total()
+        lines.append(f'  {"total":<24} {total * 1000:8.1f} ms')
+        if total > self.budget:
+            lines.append(f'  Over the {self.budget * 1000:.0f} ms startup budget')
+        return '\n'.join(lines)
+
+
+    def report(self, out_fp : TextIO=None) -> None:
+        out_fp = sys.stderr if out_fp is None else out_fp
+        out_fp.write(self.get_report() + '\n')
+        out_fp.flush()
+
+
+_active_profile = None
+
+
+def start_profile(start_time : float=None) -> StartupProfile:
+    global _active_profile
+    _active_profile = StartupProfile(start_time=start_time)
+    return _active_profile
+
+
+def get_profile() -> StartupProfile:
+    return _active_profile
+
+
+def mark(phase : str, mark_time : float=None) -> None:
+    if _active_profile is not None:
+        _active_profile.mark(phase, mark_time=mark_time)
@@ -0,0 +1,255 @@
+"""Module containing the ranking engine used to order package search results
+
+Names are ranked in tiers: exact matches first, then prefix matches, then substring
+matches, and finally fuzzy matches scored by trigram similarity. Within a tier shorter
+names rank higher. Only the requested top k results are selected, with a heap.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+
+TIER_EXACT      = 0
+TIER_PREFIX     = 1
+TIER_SUBSTRING  = 2
+TIER_FUZZY      = 3
+TIER_UNRELATED  = 4
+
+
+def get_trigrams(text : str) -> List[str]:
+    """Function that splits lowercase text into padded trigrams, so that short strings still produce trigrams
+
+    Parameters
+    ----------
+    text : str
+        Lowercase text
+
+    Returns
+    -------
+    trigrams : list of str
+        Distinct trigrams of the padded text
+    """
+
+    padded = f'  {text} '
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+def get_similarity(shared : int, query_trigram_count : int, name : str) -> float:
+    """Function that computes the trigram jaccard similarity of a name with a query
+
+    A padded name of length n has n + 1 trigrams, which is used in place of building its trigram set.
+    """
+
+    return shared / (query_trigram_count + len(name) + 1 - shared)
+
+
+def get_match_key(lower_name : str, query : str, query_trigrams : List[str]) -> Tuple[int, float]:
+    """Function that computes the tier and in-tier score of a single name. Lower sorts first
+
+    Parameters
+    ----------
+    lower_name : str
+        Lowercase candidate name
+    query : str
+        Lowercase search key
+    query_trigrams : list of str
+        Trigrams of the search key
+
+    Returns
+    -------
+    key : tuple of int, float
+        The match tier and score
+    """
+
+    if lower_name == query:
+        return TIER_EXACT, 0
+    elif lower_name.startswith(query):
+        return TIER_PREFIX, len(lower_name)
+    elif query in lower_name:
+        return TIER_SUBSTRING, len(lower_name)
+
+    padded = f'  {lower_name} '
+    shared = 0
+    for trigram in query_trigrams:
+        if trigram in padded:
+            shared += 1
+    if shared == 0:
+        return TIER_UNRELATED, 0
+    return TIER_FUZZY, -get_similarity(shared, len(query_trigrams), lower_name)
+
+
+def select_top(scored : List[Tuple], k : Optional[int]) -> List[Tuple]:
+    if k is None or k >= len(scored):
+        return sorted(scored)
+    return heapq.nsmallest(k, scored)
+
+
+def rank_names(names : List[str], search_key : str, k : int=None) -> List[str]:
+    """Function that orders an arbitrary list of names by how well they match a search key
+
+    Names that do not match at all are kept at the end, in their original order, unless k is given.
+
+    Parameters
+    ----------
+    names : list of str
+        Candidate names
+    search_key : str
+        The search key
+    k : int
+        If given, only the k best matching names are returned
+
+    Returns
+    -------
+    ranked : list of str
+        The names, best match first
+    """
+
+    query = search_key.strip().lower()
+    query_trigrams = get_trigrams(query)
+    scored = []
+    unrelated = []
+    for position, name in enumerate(names):
+        tier, score = get_match_key(name.lower(), query, query_trigrams)
+        if tier == TIER_UNRELATED:
+            unrelated.append(name)
+        else:
+            scored.append((tier, score, position, name))
+
+    ranked = [entry[3] for entry in select_top(scored, k)]
+    if k is None:
+        ranked.extend(unrelated)
+    elif len(ranked) < k:
+        ranked.extend(unrelated[:k - len(ranked)])
+    return ranked
+
+
+class RankingIndex:
+    """Class representing a precomputed prefix and trigram index over a fixed catalog of names
+
+    Build one per catalog and reuse it across searches. Building the index costs several linear
+    scans, so until build is called, ex. in the background by a long running process, searches
+    scan the names linearly, with the same results.
+
+    Attributes
+    ----------
+    names : list of str
+        The distinct names in the catalog
+    """
+
+    def __init__(self, names : List[str]):
+        self.names = list(dict.fromkeys(names))
+        self._lower = [name.lower() for name in self.names]
+        self._sorted_ids = None
+        self._sorted_lower = None
+        self._postings = None
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def is_built(self) -> bool:
+        return self._postings is not None
+
+
+    def build(self) -> None:
+        """Builds the sorted names and trigram postings searches use once they exist
+        """
+
+        with self._lock:
+            if self._postings is not None:
+                return
+            sorted_ids = sorted(range(len(self.names)), key=self._lower.__getitem__)
+            postings = defaultdict(list)
+            for name_id, lower_name in enumerate(self._lower):
+                for trigram in get_trigrams(lower_name):
+                    postings[trigram].append(name_id)
+            self._sorted_ids = sorted_ids
+            self._sorted_lower = [self._lower[name_id] for name_id in sorted_ids]
+            # Set last, searches check it to know the rest is ready
+            self._postings = dict(postings)
+
+
+    def _search_linear(self, query : str, k : Optional[int], min_similarity : float) -> List[str]:
+        query_trigrams = get_trigrams(query)
+        scored = []
+        for name_id, lower_name in enumerate(self._lower):
+            tier, score = get_match_key(lower_name, query, query_trigrams)
+            if tier == TIER_UNRELATED or (tier == TIER_FUZZY and -score < min_similarity):
+                continue
+            scored.append((tier, score, name_id))
+        return [self.names[entry[2]] for entry in select_top(scored, k)]
+
+
+    def search(self, search_key : str, k : int=None, min_similarity : float=0.2) -> List[str]:
+        """Searches the catalog for the best k names matching a search key
+
+        Parameters
+        ----------
+        search_key : str
+            The search key
+        k : int
+            Maximum number of results. All matches if None
+        min_similarity : float
+            Fuzzy matches with a lower trigram similarity are dropped
+
+        Returns
+        -------
+        results : list of str
+            Matching names, best first
+        """
+
+        query = search_key.strip().lower()
+        if len(query) == 0:
+            return []
+        postings = self._postings
+        if postings is None:
+            return self._search_linear(query, k, min_similarity)
+
+        scored = []
+        seen = set()
+
+        # Exact and prefix tiers come straight from the sorted names
+        position = bisect_left(self._sorted_lower, query)
+        while position < len(self._sorted_lower) and self._sorted_lower[position].startswith(query):
+            name_id = self._sorted_ids[position]
+            lower_name = self._sorted_lower[position]
+            if lower_name == query:
+                scored.append((TIER_EXACT, 0, name_id))
+            else:
+                scored.append((TIER_PREFIX, len(lower_name), name_id))
+            seen.add(name_id)
+            position += 1
+
+        if k is not None and len(scored) >= k:
+            return [self.names[entry[2]] for entry in select_top(scored, k)]
+
+        query_trigrams = get_trigrams(query)
+        shared_counts = defaultdict(int)
+        for trigram in query_trigrams:
+            for name_id in postings.get(trigram, ()):
+                shared_counts[name_id] += 1
+
+        # Queries shorter than a trigram only share boundary trigrams, so scan for substrings directly
+        if len(query) < 3:
+            for name_id, lower_name in enumerate(self._lower):
+                if name_id not in seen and query in lower_name:
+                    scored.append((TIER_SUBSTRING, len(lower_name), name_id))
+                    seen.add(name_id)
+
+        for name_id, shared in shared_counts.items():
+            if name_id in seen:
+                continue
+            lower_name = self._lower[name_id]
+            if query in lower_name:
+                scored.append((TIER_SUBSTRING, len(lower_name), name_id))
+            else:
+                similarity = get_similarity(shared, len(query_trigrams), lower_name)
+                if similarity >= min_similarity:
+                    scored.append((TIER_FUZZY, -similarity, name_id))
+
+        return [self.names[entry[2]] for entry in select_top(scored, k)]
@@ -0,0 +1,144 @@
+"""Module containing the registry of package manager backends
+
+Backends are registered by name with an import path, and are only imported and instantiated
+the first time they are looked up. Third party backends can be added through the
+unipkg.package_managers entry point group, where each entry point resolves to a callable
+returning a PackageManager instance.
+"""
+
+import shutil
+import importlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterator, List, Union
+
+ENTRY_POINT_GROUP = 'unipkg.package_managers'
+
+
+def iter_entry_points(group : str) -> Iterator:
+    """Function that iterates over the installed entry points in a group, if entry point metadata is available
+    """
+
+    try:
+        import importlib.metadata as metadata
+    except ImportError:
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            return iter([])
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return iter(entry_points.select(group=group))
+    return iter(entry_points.get(group, []))
+
+
+class ManagerRegistry:
+    """Class representing a dict-like, lazily populated mapping of name -> PackageManager
+
+    Attributes
+    ----------
+    entry_point_group : str
+        Entry point group searched for plugin backends the first time all names are needed
+    """
+
+    def __init__(self, entry_point_group : str=ENTRY_POINT_GROUP):
+        self.entry_point_group = entry_point_group
+        self._factories = OrderedDict()
+        self._installer_names = {}
+        self._managers = {}
+        self._plugins_loaded = entry_point_group is None
+        self._lock = threading.RLock()
+
+
+    def register(self, name : str, factory : Union[str, Callable], installer_name : str=None, *args) -> None:
+        """Registers a backend without importing or instantiating it
+
+        Parameters
+        ----------
+        name : str
+            Name the manager is looked up with, ex. pip3
+        factory : str or callable
+            'module:attribute' import path of the factory, or the factory itself
+        installer_name : str
+            Executable the manager needs on PATH. Managers whose executable is missing are never instantiated
+        args
+            Passed on to the factory
+        """
+
+        with self._lock:
+            self._factories[name] = (factory, args)
+            self._installer_names[name] = installer_name
+            self._managers.pop(name, None)
+
+
+    def _load_plugins(self) -> None:
+        with self._lock:
+            if self._plugins_loaded:
+                return
+            self._plugins_loaded = True
+            for entry_point in iter_entry_points(self.entry_point_group):
+                # Built in backends win over plugins of the same name
+                if entry_point.name not in self._factories:
+                    self._factories[entry_point.name] = (lambda entry_point=entry_point : entry_point.load()(), ())
+                    self._installer_names[entry_point.name] = None
+
+
+    def _create(self, name : str):
+        factory, args = self._factories[name]
+        if isinstance(factory, str):
+            module_name, attribute = factory.split(':')
+            factory = getattr(importlib.import_module(module_name), attribute)
+        return factory(*args)
+
+
+    def __contains__(self, name : str) -> bool:
+        if name not in self._factories:
+            self._load_plugins()
+        return name in self._factories
+
+
+    def __getitem__(self, name : str):
+        with self._lock:
+            if name not in self._managers:
+                if name not in self:
+                    raise KeyError(name)
+                self._managers[name] = self._create(name)
+            return self._managers[name]
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+
+    def get(self, name : str, default=None):
+        return self[name] if name in self else default
+
+
+    def keys(self) -> List[str]:
+        self._load_plugins()
+        return list(self._factories.keys())
+
+
+    def values(self) -> List:
+        return [self[name] for name in self.keys()]
+
+
+    def items(self) -> List:
+        return [(name, self[name]) for name in self.keys()]
+
+
+    def get_installed_names(self) -> List[str]:
+        """Gets the names of managers whose executable is on PATH, without instantiating any of them
+
+        Returns
+        -------
+        names : list of str
+            Registered names, plugins without a known executable are always included
+        """
+
+        return [name for name in self.keys() if self._installer_names.get(name) is None or shutil.which(self._installer_names[name]) is not None]
@@ -0,0 +1,278 @@
+"""Module containing the search of every package manager at once, and search-as-you-type
+
+The search key is sent to every manager concurrently, so the total time is that of the slowest
+one. Results are tagged with the manager they came from, and merged into one list ranked with
+the same tiers as unipkg.ranking, as each manager finishes.
+
+Search-as-you-type debounces keystrokes, cancels queries that were superseded while running, and
+answers refinements of the last query by filtering its results in memory.
+"""
+
+import heapq
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import unipkg.command_handler as EXE
+import unipkg.operations as OPS
+import unipkg.packages as PKG
+import unipkg.ranking as RANK
+
+
+# Seconds without a keystroke before a query is sent to the package manager
+SEARCH_DEBOUNCE = 0.2
+
+# Shorter queries match most of a large catalog, so they are not sent
+MIN_QUERY_LENGTH = 2
+
+
+class MergedResults:
+    """Class that merges the ranked results of several managers into one list
+
+    Each manager's results are scored once when they arrive, and merged with the results so
+    far in linear time. Packages with the same score keep the order of the managers, and the
+    order their manager returned them in.
+
+    Attributes
+    ----------
+    search_key : str
+        The search key results are ranked against
+    """
+
+    def __init__(self, search_key : str):
+        self.search_key = search_key
+        self._query = search_key.strip().lower()
+        self._query_trigrams = RANK.get_trigrams(self._query)
+        self._entries = []
+        self._lock = threading.Lock()
+
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+    def add(self, source_order : int, packages : List[PKG.Package]) -> List[PKG.Package]:
+        """Merges the results of one manager
+
+        Parameters
+        ----------
+        source_order : int
+            Position of the manager, used to break ties between managers
+        packages : list of Package
+            The manager's results, best first
+
+        Returns
+        -------
+        merged : list of Package
+            Every result so far, best first
+        """
+
+        entries = []
+        for position, pkg in enumerate(packages):
+            tier, score = RANK.get_match_key(pkg.name.lower(), self._query, self._query_trigrams)
+            entries.append((tier, score, source_order, position, pkg))
+        entries.sort(key=lambda entry : entry[:4])
+        with self._lock:
+            self._entries = list(heapq.merge(self._entries, entries, key=lambda entry : entry[:4]))
+            return [entry[4] for entry in self._entries]
+
+
+def search_all(managers : List, search_key : str, search_func : Callable[[object, str], List[PKG.Package]]=None,
+               on_results : Callable[[object, Optional[List[PKG.Package]], Optional[str]], None]=None) -> Tuple[List[PKG.Package], Dict[str, str]]:
+    """Function that searches several managers concurrently, and merges their results
+
+    Managers sharing a lock, ex. pip and pip3 installing into the same environment, would return
+    the same results, so only the first of them is searched.
+
+    Parameters
+    ----------
+    managers : list of PackageManager
+        The managers to search
+    search_key : str
+        The search key
+    search_func : callable
+        Called with (manager, search_key) to get a manager's results. Defaults to all batches of stream_search_for_packages
+    on_results : callable
+        Called with (manager, merged results so far, error) as soon as each manager is done
+
+    Returns
+    -------
+    merged : list of Package
+        The results of every manager, best first, with their source set to the manager name
+    errors : dict of str -> str
+        Manager name -> error output, for every manager that failed
+    """
+
+    if search_func is None:
+        search_func = lambda manager, key : [pkg for batch in manager.stream_search_for_packages(key) for pkg in batch]
+
+    distinct_managers = OPS.get_distinct_managers(managers)
+    merged_results = MergedResults(search_key)
+    source_orders = {manager.name : source_order for source_order, manager in enumerate(distinct_managers)}
+
+    def run_search(manager):
+        packages = search_func(manager, search_key)
+        for pkg in packages:
+            pkg.set_source(manager.name)
+        return packages
+
+    merged, errors = [], {}
+    for manager, future in OPS.iter_concurrently(run_search, distinct_managers):
+        try:
+            merged = merged_results.add(source_orders[manager.name], future.result())
+        except EXE.CommandCancelled:
+            raise
+        except EXE.CommandError as e:
+            errors[manager.name] = e.out
+        except Exception as e:
+            # A manager that breaks, ex. on output it can't parse, must not lose the results of the others
+            errors[manager.name] = f'{type(e).__name__}: {e}'
+        if on_results is not None:
+            on_results(manager, merged, errors.get(manager.name))
+    return merged, errors
+
+
+def is_refinement(query : str, base_query : str) -> bool:
+    """Function that checks if every package matching query also matches base_query
+
+    Matching means every space separated term is a substring of the name or description, so
+    typing more characters, or adding terms, only narrows the matches.
+    """
+
+    base_query = base_query.strip().lower()
+    return len(base_query) > 0 and query.strip().lower().startswith(base_query)
+
+
+def narrow_results(packages : List[PKG.Package], query : str) -> List[PKG.Package]:
+    """Function that filters earlier search results down to a refined query, and ranks them for it
+
+    Parameters
+    ----------
+    packages : list of Package
+        Results of a query that query refines
+    query : str
+        The refined query
+
+    Returns
+    -------
+    narrowed : list of Package
+        Packages whose name or description contains every term of query, best match first
+    """
+
+    terms = query.lower().split()
+    matches = {}
+    for pkg in packages:
+        haystack = f'{pkg.name} {pkg.description}'.lower()
+        if all(term in haystack for term in terms):
+            matches.setdefault(pkg.name, pkg)
+    return [matches[name] for name in RANK.rank_names(list(matches), query)]
+
+
+class IncrementalSearch:
+    """Class implementing search-as-you-type over one package manager at a time
+
+    Call update with the query text after every change. Queries are sent once typing pauses for
+    the debounce delay, queries still running when a newer one is sent are cancelled, and
+    refinements of the last answered query are filtered from its results without a query, if
+    the manager returns every match (see PackageManager.search_is_exhaustive).
+
+    Attributes
+    ----------
+    search_func : callable
+        Called with (manager, query) on an engine operation, returns the list of results
+    on_results : callable
+        Called with (query, results) for every answered query, from a worker thread
+    on_error : callable
+        Called with (query, exception) when a query fails
+    delay : float
+        The debounce delay in seconds
+    """
+
+    def __init__(self, search_func : Callable[[object, str], List[PKG.Package]], on_results : Callable[[str, List[PKG.Package]], None],
+                 on_error : Callable[[str, Exception], None]=None, delay : float=SEARCH_DEBOUNCE, group : str='live-search'):
+        self.search_func = search_func
+        self.on_results = on_results
+        self.on_error = on_error
+        self.delay = delay
+        self.group = group
+        self._query = ''
+        self._generation = 0
+        self._timer = None
+        self._base = None
+        self._lock = threading.Lock()
+
+
+    def reset(self) -> None:
+        """Forgets the last results and cancels everything pending, ex. when switching managers
+        """
+
+        with self._lock:
+            self._generation += 1
+            self._query = ''
+            self._base = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        EXE.get_engine().cancel_group(self.group)
+
+
+    def update(self, manager, query : str) -> None:
+        """Handles a change of the query text
+
+        Parameters
+        ----------
+        manager : PackageManager
+            The manager to search
+        query : str
+            The full query text
+        """
+
+        too_short = len(query.strip()) < MIN_QUERY_LENGTH
+        with self._lock:
+            if query == self._query:
+                return
+            self._query = query
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            base = None if too_short else self._base
+            if base is not None and (base[0] is not manager or not manager.search_is_exhaustive or not is_refinement(query, base[1])):
+                base = None
+            if not too_short and base is None:
+                self._timer = threading.Timer(self.delay, self.send, args=(manager, query, self._generation))
+                self._timer.daemon = True
+                self._timer.start()
+
+        if too_short or base is not None:
+            # Answered right away, so whatever is still running is stale
+            EXE.get_engine().cancel_group(self.group)
+            self.on_results(query, [] if too_short else narrow_results(base[2], query))
+
+
+    def send(self, manager, query : str, generation : int) -> None:
+        engine = EXE.get_engine()
+        # Whatever is still running answers a query the user has typed past
+        engine.cancel_group(self.group)
+        with self._lock:
+            if generation != self._generation:
+                return
+        engine.submit_operation(lambda : self.search_op(manager, query, generation), group=self.group)
+
+
+    def search_op(self, manager, query : str, generation : int) -> None:
+        try:
+            results = self.search_func(manager, query)
+        except EXE.CommandCancelled:
+            return
+        except Exception as e:
+            if self.on_error is not None and generation == self._generation:
+                self.on_error(query, e)
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                # Superseded while running, ex. an index search that could not be interrupted
+                return
+            self._base = (manager, query, results)
+        self.on_results(query, results)
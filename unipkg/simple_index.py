@@ -0,0 +1,365 @@
+"""Module containing a local index of the project names on a PyPI simple-compatible package index
+
+PyPI no longer answers pip search, so the pip backends search a local copy of the project name
+list instead. The list is fetched from the simple index (PEP 691 json, or PEP 503 html), or
+from a local directory or file standing in for one, and kept gzipped in the unipkg cache
+directory. Refreshes are conditional on the ETag and last serial of the index, so an unchanged
+index is never downloaded twice, and searching works offline from the last copy.
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import threading
+import urllib.parse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import unipkg.cache as CACHE
+import unipkg.ranking as RANK
+
+
+DEFAULT_INDEX_URL = 'https://pypi.org/simple/'
+
+# Seconds before the local copy is checked against the index again
+SYNC_INTERVAL   = 24 * 3600
+
+# Seconds a sync request may take
+SYNC_TIMEOUT    = 60
+
+_SIMPLE_JSON_TYPE   = 'application/vnd.pypi.simple.v1+json'
+_HTML_ANCHOR_REGEX  = re.compile(r'<a[^>]*>([^<]+)</a>', re.IGNORECASE)
+
+
+def get_index_url() -> str:
+    """Function that gets the index pip is configured with, through PIP_INDEX_URL, or PyPI
+    """
+
+    return os.environ.get('PIP_INDEX_URL', DEFAULT_INDEX_URL)
+
+
+def parse_simple_index(content : bytes, content_type : str) -> List[Tuple[str, str]]:
+    """Function that extracts the projects from a simple index root page
+
+    Parameters
+    ----------
+    content : bytes
+        The page
+    content_type : str
+        Content-Type of the page, json pages are recognized by it or by their first character
+
+    Returns
+    -------
+    projects : list of (str, str)
+        Project name and summary. Summaries are only known if the index adds them to its json
+    """
+
+    text = content.decode('utf-8', errors='replace')
+    if 'json' in content_type or text.lstrip().startswith('{'):
+        projects = json.loads(text).get('projects', [])
+        return [(project['name'], project.get('summary') or '') for project in projects if isinstance(project, dict) and 'name' in project]
+    return [(match.strip(), '') for match in _HTML_ANCHOR_REGEX.findall(text)]
+
+
+def get_summaries(projects : Iterable) -> Dict[str, str]:
+    """Function that builds the name -> summary map of a project list
+
+    Parameters
+    ----------
+    projects : iterable of sequence of str
+        Project name, optionally followed by its summary
+
+    Returns
+    -------
+    summaries : dict of str -> str
+        Project name -> summary, flattened to one line
+    """
+
+    summaries = {}
+    for project in projects:
+        # Names and summaries can't hold tabs or newlines in the local copy
+        name = project[0].strip()
+        summary = ' '.join(project[1].split()) if len(project) > 1 else ''
+        if len(name) > 0:
+            summaries[name] = summary
+    return summaries
+
+
+class SimpleNameIndex:
+    """Class representing the local copy of the project list of one package index
+
+    Attributes
+    ----------
+    index_url : str
+        URL of the simple index root, or a local directory with one sub-directory per project, or a local index file
+    cache_file : str
+        Path to the gzipped local copy
+    etag : str
+        ETag of the index root when it was last downloaded
+    serial : str
+        Last serial of the index when it was last downloaded, or the directory stamp for local directories
+    synced : float
+        Time of the last successful check against the index
+    sync_failed : float
+        Time of the last failed check, retried only once it is as old as a stale copy
+    """
+
+    def __init__(self, index_url : str, cache_file : str=None, sync_interval : float=SYNC_INTERVAL):
+        if cache_file is None:
+            url_hash = hashlib.sha1(index_url.encode()).hexdigest()[:16]
+            cache_file = os.path.join(CACHE.get_cache_dir(), f'simple-{url_hash}.txt.gz')
+        self.index_url = index_url
+        self.cache_file = cache_file
+        self.sync_interval = sync_interval
+        self.etag = None
+        self.serial = None
+        self.synced = 0
+        self.sync_failed = 0
+        self.summaries = {}
+        self._ranking_index = None
+        self._loaded = False
+        # The lock guards the state, the sync lock serializes loads and syncs, which read files or the
+        # network without holding the lock, so searches keep using the current list meanwhile
+        self._lock = threading.RLock()
+        self._sync_lock = threading.RLock()
+
+
+    def __len__(self) -> int:
+        return len(self.summaries)
+
+
+    def load(self) -> bool:
+        """Loads the local copy. The first line holds the sync state as json, every other line is name<TAB>summary
+
+        Returns
+        -------
+        loaded : bool
+            False if there is no usable local copy
+        """
+
+        with self._sync_lock:
+            with self._lock:
+                self._loaded = True
+            try:
+                with gzip.open(self.cache_file, 'rt', encoding='utf-8') as cache_fp:
+                    header = json.loads(cache_fp.readline())
+                    lines = cache_fp.read().split('\n')
+            except (OSError, ValueError, EOFError):
+                return False
+            if header.get('url') != self.index_url:
+                return False
+            summaries = get_summaries(line.split('\t', 1) for line in lines if len(line) > 0)
+            with self._lock:
+                self.etag, self.serial, self.synced = header.get('etag'), header.get('serial'), header.get('synced', 0)
+                self._set_summaries(summaries)
+            return True
+
+
+    def ensure_loaded(self) -> bool:
+        """Loads the local copy if it was not loaded yet, without checking the index
+
+        Returns
+        -------
+        available : bool
+            True if there is a project list to search
+        """
+
+        with self._sync_lock:
+            if not self._loaded:
+                self.load()
+        with self._lock:
+            return len(self.summaries) > 0
+
+
+    def load_header(self) -> None:
+        """Loads only the sync state of the local copy, for get_version, without reading the project list
+        """
+
+        with self._lock:
+            if self._loaded or self.etag is not None or self.serial is not None:
+                return
+            try:
+                with gzip.open(self.cache_file, 'rt', encoding='utf-8') as cache_fp:
+                    header = json.loads(cache_fp.readline())
+            except (OSError, ValueError, EOFError):
+                return
+            if header.get('url') == self.index_url:
+                self.etag, self.serial, self.synced = header.get('etag'), header.get('serial'), header.get('synced', 0)
+
+
+    def save(self) -> None:
+        with self._lock:
+            header = {'url' : self.index_url, 'etag' : self.etag, 'serial' : self.serial, 'synced' : self.synced}
+            summaries = self.summaries
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_path = f'{self.cache_file}.{os.getpid()}.tmp'
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as tmp_fp:
+                tmp_fp.write(json.dumps(header) + '\n')
+                tmp_fp.write('\n'.join(f'{name}\t{summary}' for name, summary in summaries.items()))
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass
+
+
+    def _set_summaries(self, summaries : Dict[str, str]) -> None:
+        with self._lock:
+            self.summaries = summaries
+            self._ranking_index = None
+
+
+    def is_stale(self) -> bool:
+        # A failed check counts as one, so an unreachable index is not retried, with its timeout, on every search
+        return time.time() - max(self.synced, self.sync_failed) >= self.sync_interval
+
+
+    def _fetch_local(self, index_path : str, etag : Optional[str], serial : Optional[str], has_projects : bool) -> Tuple[Optional[List[Tuple[str, str]]], Optional[str], Optional[str]]:
+        new_serial = str(os.stat(index_path).st_mtime)
+        if new_serial == serial and has_projects:
+            return None, etag, serial
+        if os.path.isdir(index_path):
+            return [(entry.name, '') for entry in os.scandir(index_path) if entry.is_dir() and not entry.name.startswith('.')], etag, new_serial
+
+        with open(index_path, 'rb') as index_fp:
+            content = index_fp.read()
+        return parse_simple_index(content, ''), etag, new_serial
+
+
+    def _fetch_remote(self, timeout : float, etag : Optional[str], serial : Optional[str], has_projects : bool) -> Tuple[Optional[List[Tuple[str, str]]], Optional[str], Optional[str]]:
+        # Imported here, urllib.request pulls in http.client and ssl, which would slow down startup
+        import urllib.error
+        import urllib.request
+
+        request = urllib.request.Request(self.index_url, headers={'Accept' : f'{_SIMPLE_JSON_TYPE}, text/html;q=0.1'})
+        if etag is not None and has_projects:
+            request.add_header('If-None-Match', etag)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                new_serial = response.headers.get('X-PyPI-Last-Serial')
+                # The serial is known from the headers, so an unchanged index is not downloaded at all
+                if new_serial is not None and new_serial == serial and has_projects:
+                    return None, etag, serial
+                content = response.read()
+                content_type = response.headers.get('Content-Type', '')
+                new_etag = response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, etag, serial
+            raise
+        if 'json' in content_type and new_serial is None:
+            new_serial = json.loads(content.decode('utf-8', errors='replace')).get('meta', {}).get('_last-serial')
+        return parse_simple_index(content, content_type), new_etag, None if new_serial is None else str(new_serial)
+
+
+    def sync(self, timeout : float=SYNC_TIMEOUT) -> bool:
+        """Checks the index for changes, and downloads the whole project list again if it changed
+
+        The index is fetched without holding the lock, and the new list swapped in once it is parsed.
+        Raises OSError or ValueError if the index can't be reached or read.
+
+        Returns
+        -------
+        changed : bool
+            True if the project list was replaced
+        """
+
+        with self._sync_lock:
+            with self._lock:
+                state = (self.etag, self.serial, len(self.summaries) > 0)
+            if self.index_url.startswith('file://'):
+                projects, etag, serial = self._fetch_local(urllib.parse.unquote(urllib.parse.urlparse(self.index_url).path), *state)
+            elif '://' not in self.index_url:
+                projects, etag, serial = self._fetch_local(self.index_url, *state)
+            else:
+                projects, etag, serial = self._fetch_remote(timeout, *state)
+            summaries = None if projects is None else get_summaries(projects)
+
+            with self._lock:
+                self.etag, self.serial, self.synced = etag, serial, time.time()
+                if summaries is not None:
+                    self._set_summaries(summaries)
+            self.save()
+            return summaries is not None
+
+
+    def ensure_synced(self) -> bool:
+        """Loads the local copy, and syncs it if it is stale. A failed sync keeps the local copy
+
+        Returns
+        -------
+        available : bool
+            True if there is a project list to search
+        """
+
+        with self._sync_lock:
+            if not self._loaded:
+                self.load()
+            if self.is_stale():
+                try:
+                    self.sync()
+                except (OSError, ValueError):
+                    with self._lock:
+                        self.sync_failed = time.time()
+        with self._lock:
+            return len(self.summaries) > 0
+
+
+    def get_version(self) -> Tuple:
+        # Read from the local copy, so the version is the same before and after the first search of a process
+        self.load_header()
+        return self.etag, self.serial
+
+
+    def _get_ranking_index(self) -> RANK.RankingIndex:
+        with self._lock:
+            if self._ranking_index is None:
+                self._ranking_index = RANK.RankingIndex(list(self.summaries.keys()))
+            return self._ranking_index
+
+
+    def build_ranking_index(self) -> None:
+        """Builds the trigram index over the project names. Until it exists, searches scan the names linearly
+
+        Building takes several times as long as one linear search of a PyPI sized list, so it only
+        pays off in long running processes, which call it in the background.
+        """
+
+        self._get_ranking_index().build()
+
+
+    def search(self, search_key : str, k : int=None) -> List[Tuple[str, str]]:
+        """Searches the project names, through the same ranking as every other manager
+
+        Parameters
+        ----------
+        search_key : str
+            The search key
+        k : int
+            Maximum number of results
+
+        Returns
+        -------
+        results : list of (str, str)
+            Project name and summary, best match first
+        """
+
+        with self._lock:
+            ranking_index, summaries = self._get_ranking_index(), self.summaries
+        return [(name, summaries[name]) for name in ranking_index.search(search_key, k=k)]
+
+
+_name_indexes = {}
+_name_indexes_lock = threading.Lock()
+
+
+def get_name_index(index_url : str=None) -> SimpleNameIndex:
+    """Function that returns the shared SimpleNameIndex for an index URL, so pip and pip3 share one copy
+    """
+
+    index_url = get_index_url() if index_url is None else index_url
+    with _name_indexes_lock:
+        if index_url not in _name_indexes:
+            _name_indexes[index_url] = SimpleNameIndex(index_url)
+        return _name_indexes[index_url]
@@ -0,0 +1,223 @@
+"""Module containing installed-state snapshots, their diff against the live system, and restores
+
+A snapshot records the installed name and version of every package of every manager in one json
+lockfile. Diffing it against the live installed indexes is a single pass over each side, and a
+restore turns the differences into at most one removal and one install transaction per manager,
+with versions pinned, applied through the same scheduler as the marked operations.
+"""
+
+import json
+import time
+import platform
+from typing import Callable, Dict, List, Optional, Tuple
+
+import unipkg.cache as CACHE
+import unipkg.command_handler as EXE
+import unipkg.operations as OPS
+
+
+# Bumped whenever the lockfile layout changes incompatibly
+SNAPSHOT_FORMAT = 1
+
+
+def take_snapshot(managers : List, on_result : Callable[[object, Optional[Dict[str, str]], Optional[str]], None]=None) -> Tuple[Dict, Dict[str, str]]:
+    """Function that records the installed packages of several managers concurrently
+
+    Managers sharing a lock, ex. pip and pip3 installing into the same environment, manage the
+    same packages, so only the first of them is recorded.
+
+    Parameters
+    ----------
+    managers : list of PackageManager
+        The managers to record
+    on_result : callable
+        Called with (manager, installed versions, error) as soon as each manager is done
+
+    Returns
+    -------
+    snapshot : dict
+        The snapshot, see save_snapshot
+    errors : dict of str -> str
+        Manager name -> error output, for every manager that could not be recorded
+    """
+
+    distinct_managers = OPS.get_distinct_managers(managers)
+    recorded, errors = {}, {}
+    for manager, future in OPS.iter_concurrently(lambda manager : manager.get_installed_versions(), distinct_managers):
+        try:
+            recorded[manager.name] = future.result()
+        except EXE.CommandCancelled:
+            raise
+        except EXE.CommandError as e:
+            errors[manager.name] = e.out
+        if on_result is not None:
+            on_result(manager, recorded.get(manager.name), errors.get(manager.name))
+
+    # Sorted, so snapshots of similar hosts diff cleanly as text
+    snapshot_managers = {}
+    for manager in distinct_managers:
+        if manager.name in recorded:
+            installed = recorded[manager.name]
+            snapshot_managers[manager.name] = {name : installed[name] for name in sorted(installed)}
+    snapshot = {
+        'format'    : SNAPSHOT_FORMAT,
+        'created'   : time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'host'      : platform.node(),
+        'managers'  : snapshot_managers,
+    }
+    return snapshot, errors
+
+
+def save_snapshot(snapshot : Dict, file_path : str) -> None:
+    """Function that writes a snapshot as a lockfile
+
+    The lockfile is json holding the format, creation time and host, and a managers object
+    mapping each manager name to an object of package name -> installed version.
+    """
+
+    CACHE.write_json_atomic(file_path, snapshot, indent=2)
+
+
+def load_snapshot(file_path : str) -> Dict:
+    """Function that reads a lockfile written by save_snapshot
+
+    Raises OSError if the file can't be read, and ValueError if it is not a snapshot.
+    """
+
+    with open(file_path, 'r') as snapshot_fp:
+        snapshot = json.load(snapshot_fp)
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get('managers'), dict):
+        raise ValueError(f'{file_path} is not a unipkg snapshot')
+    if snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f'{file_path} has snapshot format {snapshot.get("format")}, expected {SNAPSHOT_FORMAT}')
+    for manager_name, packages in snapshot['managers'].items():
+        if not isinstance(packages, dict) or not all(isinstance(version, str) for version in packages.values()):
+            raise ValueError(f'{file_path} has malformed packages for {manager_name}')
+    return snapshot
+
+
+class SnapshotDiff:
+    """Class representing what separates the installed packages of one manager from a snapshot
+
+    Attributes
+    ----------
+    manager_name : str
+        The manager the packages belong to
+    to_install : dict of str -> str
+        Package name -> snapshot version, for packages in the snapshot that are not installed
+    to_remove : dict of str -> str
+        Package name -> installed version, for installed packages that are not in the snapshot
+    to_change : dict of str -> (str, str)
+        Package name -> (installed version, snapshot version), for packages installed at another version
+    """
+
+    def __init__(self, manager_name : str):
+        self.manager_name = manager_name
+        self.to_install = {}
+        self.to_remove = {}
+        self.to_change = {}
+
+
+    def __len__(self) -> int:
+        return len(self.to_install) + len(self.to_remove) + len(self.to_change)
+
+
+def diff_packages(manager_name : str, wanted : Dict[str, str], installed : Dict[str, str]) -> SnapshotDiff:
+    """Function that compares the packages of a snapshot with the installed ones, in time linear in their number
+
+    Parameters
+    ----------
+    manager_name : str
+        The manager the packages belong to
+    wanted : dict of str -> str
+        Package name -> version, from the snapshot
+    installed : dict of str -> str
+        Package name -> version, from the live system
+
+    Returns
+    -------
+    diff : SnapshotDiff
+        The differences, in the order of wanted and installed. Snapshots are saved sorted by name
+    """
+
+    diff = SnapshotDiff(manager_name)
+    for name in wanted:
+        installed_version = installed.get(name)
+        if installed_version is None:
+            diff.to_install[name] = wanted[name]
+        elif installed_version != wanted[name] and len(wanted[name]) > 0:
+            diff.to_change[name] = (installed_version, wanted[name])
+    for name in installed:
+        if name not in wanted:
+            diff.to_remove[name] = installed[name]
+    return diff
+
+
+def diff_snapshot(snapshot : Dict, managers : List) -> Tuple[Dict[str, SnapshotDiff], Dict[str, str], List[str]]:
+    """Function that compares a snapshot with the installed packages of the managers it records, concurrently
+
+    Parameters
+    ----------
+    snapshot : dict
+        Output of load_snapshot or take_snapshot
+    managers : list of PackageManager
+        The managers available on this system. Managers missing from the snapshot are left alone
+
+    Returns
+    -------
+    diffs : dict of str -> SnapshotDiff
+        Manager name -> differences, in snapshot order, for every manager that could be compared
+    errors : dict of str -> str
+        Manager name -> error output, for every manager whose installed packages could not be read
+    missing : list of str
+        Names of the managers in the snapshot that are not available on this system
+    """
+
+    snapshot_managers = snapshot['managers']
+    available = {manager.name : manager for manager in managers}
+    compared = [available[manager_name] for manager_name in snapshot_managers if manager_name in available]
+    missing = [manager_name for manager_name in snapshot_managers if manager_name not in available]
+
+    diffs, errors = {}, {}
+    for manager, future in OPS.iter_concurrently(lambda manager : manager.get_installed_versions(), compared):
+        try:
+            diffs[manager.name] = diff_packages(manager.name, snapshot_managers[manager.name], future.result())
+        except EXE.CommandCancelled:
+            raise
+        except EXE.CommandError as e:
+            errors[manager.name] = e.out
+    return {manager.name : diffs[manager.name] for manager in compared if manager.name in diffs}, errors, missing
+
+
+def create_restore_ops(manager, diff : SnapshotDiff, remove : bool=True) -> List[OPS.PackageOp]:
+    """Function that turns the differences of a manager into the operations that undo them
+
+    Missing packages and packages at another version are both installed at the snapshot version
+    (see PackageManager.get_pinned_name), so grouped with group_package_ops every manager needs at
+    most one removal and one install transaction.
+
+    Parameters
+    ----------
+    manager : PackageManager
+        The manager the differences belong to
+    diff : SnapshotDiff
+        Output of diff_packages
+    remove : bool
+        False to keep installed packages that are not in the snapshot
+
+    Returns
+    -------
+    package_ops : list of PackageOp
+        OP_UNINSTALL and OP_INSTALL operations, the packages of installs are named with their pinned version
+    """
+
+    package_ops = []
+    if remove:
+        for name, installed_version in diff.to_remove.items():
+            package_ops.append(OPS.PackageOp(manager.package_class(name, installed_version, '', True), OPS.OP_UNINSTALL, manager))
+    wanted = dict(diff.to_install)
+    wanted.update((name, versions[1]) for name, versions in diff.to_change.items())
+    for name in sorted(wanted):
+        pkg = manager.package_class(manager.get_pinned_name(name, wanted[name]), wanted[name], '', name in diff.to_change)
+        package_ops.append(OPS.PackageOp(pkg, OPS.OP_INSTALL, manager))
+    return package_ops
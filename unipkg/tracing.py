@@ -0,0 +1,384 @@
+"""Module containing the tracing hooks for commands and PackageManager methods
+
+Every command run through the CommandEngine, and every traced PackageManager method, produces a
+trace record that is handed to the registered sinks. With no sinks registered, tracing is skipped
+entirely.
+
+Command records hold wall time, child CPU time, exit code and output bytes. Method records hold
+wall time, the part of it spent waiting on commands, and the rest, which is parse time.
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+KIND_COMMAND    = 'command'
+KIND_METHOD     = 'method'
+
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_local = threading.local()
+
+
+def add_sink(sink) -> None:
+    """Function that registers a sink. Sinks are callables taking a trace record dict, and must be thread-safe
+    """
+
+    global _sinks
+    with _sinks_lock:
+        _sinks = _sinks + [sink]
+
+
+def remove_sink(sink) -> None:
+    global _sinks
+    with _sinks_lock:
+        _sinks = [registered for registered in _sinks if registered != sink]
+
+
+def is_enabled() -> bool:
+    return len(_sinks) > 0
+
+
+def emit(record : Dict) -> None:
+    for sink in _sinks:
+        sink(record)
+
+
+def get_children_cpu_time() -> float:
+    """Function that gets the user + system CPU time of all reaped child processes so far
+
+    Per command CPU time is the difference of this around the command, so it also counts other
+    children that exit while the command runs.
+    """
+
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def get_command_name(command : str) -> str:
+    """Function that gets the executable and subcommand of a command string, ex. 'apt-cache search'
+    """
+
+    parts = [part for part in command.split(' ') if len(part) > 0 and not part.startswith('-')]
+    return ' '.join(parts[:2])
+
+
+class MethodFrame:
+    """Class representing a traced method call in progress on the current thread
+    """
+
+    def __init__(self, manager_name : str, method : str):
+        self.manager_name = manager_name
+        self.method = method
+        self.wall_time = 0.0
+        self.command_time = 0.0
+        self.rows = None
+
+
+def get_current_frame() -> Optional[MethodFrame]:
+    frames = getattr(_local, 'frames', None)
+    if frames is None or len(frames) == 0:
+        return None
+    return frames[-1]
+
+
+def add_command_time(seconds : float) -> None:
+    """Function that attributes time spent blocked on a command to the traced method running on this thread
+    """
+
+    frame = get_current_frame()
+    if frame is not None:
+        frame.command_time += seconds
+
+
+class CommandTrace:
+    """Class that measures one command. Created on the thread running the command, so it knows the traced method it belongs to
+    """
+
+    def __init__(self, command : str):
+        self.command = command
+        self.frame = get_current_frame()
+        self.start_time = None
+        self.start_cpu_time = None
+
+
+    def start(self) -> None:
+        self.start_time = time.perf_counter()
+        self.start_cpu_time = get_children_cpu_time()
+
+
+    def finish(self, exit_code : int, output_bytes : int) -> None:
+        if self.start_time is None:
+            # Never got to run
+            return
+        emit({
+            'kind'          : KIND_COMMAND,
+            'time'          : time.time(),
+            'name'          : get_command_name(self.command),
+            'command'       : self.command,
+            'manager'       : None if self.frame is None else self.frame.manager_name,
+            'method'        : None if self.frame is None else self.frame.method,
+            'wall_time'     : time.perf_counter() - self.start_time,
+            'cpu_time'      : get_children_cpu_time() - self.start_cpu_time,
+            'exit_code'     : exit_code,
+            'output_bytes'  : output_bytes,
+        })
+
+
+def start_command_trace(command : str) -> Optional[CommandTrace]:
+    return CommandTrace(command) if is_enabled() else None
+
+
+class _FrameScope:
+    """Context manager that runs a section of a traced method with its frame pushed on the thread's stack
+    """
+
+    def __init__(self, frame : MethodFrame):
+        self.frame = frame
+
+
+    def __enter__(self):
+        if getattr(_local, 'frames', None) is None:
+            _local.frames = []
+        _local.frames.append(self.frame)
+        self.start_time = time.perf_counter()
+        self.start_command_time = self.frame.command_time
+        return self.frame
+
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.frame.wall_time += time.perf_counter() - self.start_time
+        _local.frames.pop()
+        # Commands waited on by a nested method were waited on by its callers too
+        parent = get_current_frame()
+        if parent is not None:
+            parent.command_time += self.frame.command_time - self.start_command_time
+        return False
+
+
+def emit_method(frame : MethodFrame, failed : bool) -> None:
+    emit({
+        'kind'          : KIND_METHOD,
+        'time'          : time.time(),
+        'name'          : f'{frame.manager_name}.{frame.method}',
+        'manager'       : frame.manager_name,
+        'method'        : frame.method,
+        'wall_time'     : frame.wall_time,
+        'command_time'  : frame.command_time,
+        'parse_time'    : max(frame.wall_time - frame.command_time, 0.0),
+        'rows'          : frame.rows,
+        'failed'        : failed,
+    })
+
+
+def count_rows(ret) -> Optional[int]:
+    # Package manager methods return (packages, ..., err) or (out, err) tuples, or dicts
+    if isinstance(ret, tuple) and len(ret) > 0 and isinstance(ret[0], (list, dict)):
+        return len(ret[0])
+    if isinstance(ret, (list, dict)):
+        return len(ret)
+    return None
+
+
+def trace_method(method : Callable) -> Callable:
+    """Decorator that traces a PackageManager method returning a value
+    """
+
+    @functools.wraps(method)
+    def traced(self, *args, **kwargs):
+        if not is_enabled():
+            return method(self, *args, **kwargs)
+        frame = MethodFrame(self.name, method.__name__)
+        failed = True
+        try:
+            with _FrameScope(frame):
+                ret = method(self, *args, **kwargs)
+            frame.rows = count_rows(ret)
+            failed = isinstance(ret, tuple) and len(ret) > 0 and (ret[0] is None or (isinstance(ret[-1], int) and ret[-1] != 0))
+            return ret
+        finally:
+            emit_method(frame, failed)
+
+    return traced
+
+
+class trace_block:
+    """Context manager that traces a block of code like a method, ex. rendering in the TUI
+
+    Parameters
+    ----------
+    owner_name : str
+        Shown in place of the package manager name
+    block_name : str
+        Shown in place of the method name
+    rows : int
+        Number of rows the block handles, if any
+    """
+
+    def __init__(self, owner_name : str, block_name : str, rows : int=None):
+        self.frame = MethodFrame(owner_name, block_name)
+        self.frame.rows = rows
+        self._scope = None
+
+
+    def __enter__(self):
+        if is_enabled():
+            self._scope = _FrameScope(self.frame)
+            self._scope.__enter__()
+        return self.frame
+
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self._scope is not None:
+            self._scope.__exit__(exc_type, exc_value, exc_traceback)
+            emit_method(self.frame, exc_type is not None)
+        return False
+
+
+def trace_stream_method(method : Callable) -> Callable:
+    """Decorator that traces a PackageManager method returning an iterator of package batches
+
+    Only the time spent producing batches is counted, not the time the consumer spends on them between batches.
+    """
+
+    @functools.wraps(method)
+    def traced(self, *args, **kwargs):
+        if not is_enabled():
+            return method(self, *args, **kwargs)
+        frame = MethodFrame(self.name, method.__name__)
+        frame.rows = 0
+        with _FrameScope(frame):
+            batches = method(self, *args, **kwargs)
+        return _iter_traced_batches(frame, iter(batches))
+
+    return traced
+
+
+def _iter_traced_batches(frame : MethodFrame, batches : Iterator) -> Iterator:
+    failed = True
+    try:
+        while True:
+            with _FrameScope(frame):
+                try:
+                    batch = next(batches)
+                except StopIteration:
+                    break
+            frame.rows += len(batch)
+            yield batch
+        failed = False
+    finally:
+        emit_method(frame, failed)
+
+
+class StatsTable:
+    """Class representing a sink that aggregates trace records in memory, and renders them as a text table
+
+    Attributes
+    ----------
+    recent : collections.deque
+        The latest trace records, up to max_recent of them
+    """
+
+    def __init__(self, max_recent : int=200):
+        self.recent = deque(maxlen=max_recent)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+
+    def __call__(self, record : Dict) -> None:
+        with self._lock:
+            self.recent.append(record)
+            stats = self._stats.get((record['kind'], record['name']))
+            if stats is None:
+                stats = {'calls' : 0, 'errors' : 0, 'wall_time' : 0.0, 'max_wall_time' : 0.0, 'cpu_time' : 0.0,
+                         'output_bytes' : 0, 'command_time' : 0.0, 'parse_time' : 0.0, 'rows' : 0}
+                self._stats[(record['kind'], record['name'])] = stats
+            stats['calls'] += 1
+            stats['wall_time'] += record['wall_time']
+            stats['max_wall_time'] = max(stats['max_wall_time'], record['wall_time'])
+            if record['kind'] == KIND_COMMAND:
+                stats['errors'] += int(record['exit_code'] != 0)
+                stats['cpu_time'] += record['cpu_time']
+                stats['output_bytes'] += record['output_bytes']
+            else:
+                stats['errors'] += int(record['failed'])
+                stats['command_time'] += record['command_time']
+                stats['parse_time'] += record['parse_time']
+                stats['rows'] += record['rows'] or 0
+            self.version += 1
+
+
+    def get_stats(self, kind : str) -> Dict[str, Dict]:
+        with self._lock:
+            return {name : dict(stats) for (stats_kind, name), stats in self._stats.items() if stats_kind == kind}
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self.recent.clear()
+            self._stats.clear()
+            self.version += 1
+
+
+    def get_report(self) -> str:
+        """Renders the aggregated stats, slowest in total first. Times are in milliseconds
+        """
+
+        lines = [f'{"Method":<40} {"calls":>6} {"errors":>6} {"total":>10} {"max":>9} {"commands":>10} {"parse":>9} {"rows":>8}']
+        method_stats = sorted(self.get_stats(KIND_METHOD).items(), key=lambda item : -item[1]['wall_time'])
+        for name, stats in method_stats:
+            lines.append(f'{name:<40} {stats["calls"]:>6} {stats["errors"]:>6} {stats["wall_time"] * 1000:>10.1f} {stats["max_wall_time"] * 1000:>9.1f} '
+                         f'{stats["command_time"] * 1000:>10.1f} {stats["parse_time"] * 1000:>9.1f} {stats["rows"]:>8}')
+        lines.append('')
+        lines.append(f'{"Command":<40} {"calls":>6} {"errors":>6} {"total":>10} {"max":>9} {"cpu":>10} {"KiB out":>9}')
+        command_stats = sorted(self.get_stats(KIND_COMMAND).items(), key=lambda item : -item[1]['wall_time'])
+        for name, stats in command_stats:
+            lines.append(f'{name:<40} {stats["calls"]:>6} {stats["errors"]:>6} {stats["wall_time"] * 1000:>10.1f} {stats["max_wall_time"] * 1000:>9.1f} '
+                         f'{stats["cpu_time"] * 1000:>10.1f} {stats["output_bytes"] / 1024:>9.1f}')
+        return '\n'.join(lines)
+
+
+class JsonlSink:
+    """Class representing a sink that appends every trace record to a file as one json object per line
+
+    Attributes
+    ----------
+    file_path : str
+        The file records are appended to
+    """
+
+    def __init__(self, file_path : str):
+        self.file_path = file_path
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        self._fp = open(file_path, 'a')
+        self._lock = threading.Lock()
+
+
+    def __call__(self, record : Dict) -> None:
+        line = json.dumps(record)
+        with self._lock:
+            if self._fp is not None:
+                self._fp.write(line + '\n')
+                self._fp.flush()
+
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
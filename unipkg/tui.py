@@ -0,0 +1,579 @@
+"""TUI
+
+File containing the py_cui based interface for unipkg. Kept separate from the package root so
+that the headless command line interface never has to import py_cui.
+"""
+
+import py_cui
+
+import unipkg
+import unipkg.operations as OPS
+import unipkg.cache as CACHE
+import unipkg.views as VIEWS
+import unipkg.logs as LOGS
+import unipkg.command_handler as EXE
+import unipkg.profiling as PROFILING
+import unipkg.tracing as TRACE
+import unipkg.updates as UPD
+import unipkg.search as SEARCH
+
+import time
+import threading
+
+# Maximum number of package info entries kept in memory
+DETAILS_CACHE_SIZE = 4096
+
+# Maximum number of messages kept by the Log/Status panel
+LOG_CAPACITY = 2000
+
+# Seconds cached search results stay valid, and the total number of result rows kept
+SEARCH_CACHE_TTL        = 3600
+SEARCH_CACHE_MAX_ROWS   = 100000
+
+# Minimum seconds between refreshes of the stats panel while traces come in
+STATS_REFRESH_INTERVAL  = 0.25
+
+# Seconds between screen redraws while no key is pressed, so results of search-as-you-type show up without one
+SCREEN_REFRESH_INTERVAL = 0.1
+
+
+class UniPkgManager:
+
+    def __init__(self, root : py_cui.PyCUI, log_file : str=None):
+        self.root = root
+
+        self.engine         = EXE.get_engine()
+        self.apply_lock     = threading.Lock()
+        self.details_cache  = CACHE.LRUCache(DETAILS_CACHE_SIZE)
+        self.search_cache   = CACHE.SearchCache(ttl=SEARCH_CACHE_TTL, max_rows=SEARCH_CACHE_MAX_ROWS)
+        self.search_cache.load()
+        self.update_checker = UPD.UpdateChecker()
+        # Packages shown by the last update check, mapped to their update operation, so they can be marked again
+        self.available_updates = {}
+        self.passwd         = None
+        self.stdout_ret     = None
+        self.err_ret        = 0
+
+        self.package_manager_selecter = self.root.add_scroll_menu('Managers', 0, 0, row_span=2, column_span=1)
+        self.package_manager_selecter.add_item_list(unipkg.find_supported_package_managers())
+
+        self.active_package_manager = self.package_manager_selecter.get()
+        self.active_package_manager.is_selected = True
+
+        self.package_manager_selecter.add_key_command(py_cui.keys.KEY_ENTER, self.select_package_manager)
+
+
+
+        # Typing here searches the active manager as you type, see unipkg.search.IncrementalSearch
+        self.search_box = self.root.add_text_box('Search', 0, 1, column_span=6)
+        self.search_box.add_key_command(py_cui.keys.KEY_ENTER, lambda : self.root.move_focus(self.package_selection))
+        self.live_search = SEARCH.IncrementalSearch(self.search_manager, self.on_live_search_results, on_error=self.on_live_search_error)
+        self.first_draw_done = False
+
+        self.package_selection = self.root.add_checkbox_menu(f'{self.active_package_manager.name} Packages', 1, 1, row_span=3, column_span=6)
+        self.package_selection.add_key_command(py_cui.keys.KEY_S_LOWER,     self.ask_search_key)
+        self.package_selection.add_key_command(py_cui.keys.KEY_S_UPPER,     self.ask_search_everywhere_key)
+        self.package_selection.add_key_command(py_cui.keys.KEY_F_LOWER,     self.focus_search_box)
+        self.package_selection.add_key_command(py_cui.keys.KEY_L_LOWER,     self.list_packages)
+        self.package_selection.add_key_command(py_cui.keys.KEY_ENTER,       self.mark_package)
+        self.package_selection.add_key_command(py_cui.keys.KEY_A_LOWER,     self.apply)
+        self.package_selection.add_key_command(py_cui.keys.KEY_SPACE,       self.show_package_info)
+        self.package_selection.add_key_command(py_cui.keys.KEY_T_LOWER,     self.toggle_stats)
+        self.package_view = VIEWS.PackageListView(self.package_selection)
+
+
+        self.log = self.root.add_text_block('Log/Status', 4, 1, row_span=3, column_span=6)
+        self.log.add_text_color_rule('Done', py_cui.GREEN_ON_BLACK, 'startswith')
+        self.log.add_text_color_rule('Error', py_cui.RED_ON_BLACK, 'startswith')
+        self.log_panel = LOGS.LogPanel(self.log, capacity=LOG_CAPACITY, spill_file=log_file)
+
+        # Pressing t swaps the Log/Status panel for per method and per command timings
+        self.stats_table = TRACE.StatsTable()
+        self.showing_stats = False
+        self.last_stats_refresh = 0
+        TRACE.add_sink(self.stats_table)
+        TRACE.add_sink(self.on_trace)
+
+
+        self.marked_ops = OPS.MarkedOps()
+        self.marked_package_list = self.root.add_scroll_menu('Marked', 2, 0, row_span=2)
+        #self.marked_packages.add_key_command(py_cui.keys.KEY_ENTER, self.unmark_package)
+
+        self.apply_button       = self.root.add_button('Apply',     4, 0, command=self.apply)
+        self.update_all_button  = self.root.add_button('Update',    5, 0, command=self.update_all)
+        self.exit_button        = self.root.add_button('Exit',      6, 0, command=exit)
+
+        self.root.add_key_command(py_cui.keys.KEY_A_LOWER, self.apply)
+        self.root.add_key_command(py_cui.keys.KEY_S_LOWER, self.ask_search_key)
+        self.root.add_key_command(py_cui.keys.KEY_S_UPPER, self.ask_search_everywhere_key)
+        self.root.add_key_command(py_cui.keys.KEY_F_LOWER, self.focus_search_box)
+        self.root.add_key_command(py_cui.keys.KEY_L_LOWER, self.list_packages)
+        self.root.add_key_command(py_cui.keys.KEY_T_LOWER, self.toggle_stats)
+
+
+    def shutdown(self):
+        TRACE.remove_sink(self.stats_table)
+        TRACE.remove_sink(self.on_trace)
+        self.search_cache.save()
+        self.engine.shutdown()
+
+
+    def toggle_stats(self):
+        self.showing_stats = not self.showing_stats
+        if self.showing_stats:
+            self.log_panel.set_paused(True)
+            self.log.set_title('Stats')
+            self.render_stats()
+        else:
+            self.log.set_title('Log/Status')
+            self.log_panel.set_paused(False)
+
+
+    def render_stats(self):
+        self.last_stats_refresh = time.monotonic()
+        self.log.set_text(self.stats_table.get_report())
+
+
+    def on_trace(self, record):
+        if self.showing_stats and time.monotonic() - self.last_stats_refresh >= STATS_REFRESH_INTERVAL:
+            self.render_stats()
+
+
+    def on_draw(self):
+        if not self.first_draw_done:
+            self.first_draw_done = True
+            if PROFILING.get_profile() is not None:
+                self.on_first_draw()
+            # After the first paint, so preparing does not delay it
+            self.prepare_search()
+        # Runs before every redraw, and so after every keystroke in the search box
+        self.live_search.update(self.active_package_manager, self.search_box.get())
+
+
+    def on_first_draw(self):
+        PROFILING.mark('first paint')
+        self.update_log(PROFILING.get_profile().get_report())
+
+
+    def update_all(self):
+        self.root.show_loading_icon_popup('Checking', 'Checking every package manager for updates')
+        self.engine.submit_operation(self.update_all_op, group='updates')
+
+
+    def update_all_op(self):
+        try:
+            managers = self.package_manager_selecter.get_item_list()
+            results, errors = self.update_checker.check(managers, on_result=self.on_update_check_result)
+            update_ops = []
+            for manager in managers:
+                if manager.name in results:
+                    update_ops.extend(UPD.create_update_ops(manager, results[manager.name]))
+
+            self.root.stop_loading_popup()
+            if len(update_ops) == 0:
+                if len(errors) > 0:
+                    self.root.show_error_popup('Update Check Failed', f'Could not check {", ".join(errors)} for updates, see log.')
+                else:
+                    self.root.show_message_popup('Up to Date', 'No package updates were found.')
+                return
+
+            self.show_update_ops(update_ops)
+            self.root.show_yes_no_popup(f'Apply {len(update_ops)} update(s) and all other marked operations?', self.apply_updates)
+        except EXE.CommandCancelled:
+            self.root.stop_loading_popup()
+        except Exception as e:
+            self.root.stop_loading_popup()
+            self.root.show_error_popup('Update Check Failed', f'Checking for updates failed due to: {str(e)}')
+
+
+    def on_update_check_result(self, manager, outdated, error):
+        if error is not None:
+            self.update_log(f'Error: checking {manager.name} for updates failed: {error.strip()}')
+        else:
+            self.update_log(f'{manager.name}: {len(outdated)} package(s) can be updated')
+
+
+    def show_update_ops(self, update_ops):
+        # Update ops replace whatever was marked for the same packages
+        self.available_updates = {}
+        for update_op in update_ops:
+            update_op.pkg.marked_op = update_op
+            self.available_updates[update_op.pkg] = update_op
+            self.marked_ops.add(update_op)
+        self.marked_package_list.clear()
+        self.marked_package_list.add_item_list(list(self.marked_ops))
+
+        with TRACE.trace_block('tui', 'render_packages', rows=len(update_ops)):
+            self.package_view.set_packages([update_op.pkg for update_op in update_ops])
+        self.package_view.set_title('Updates')
+        self.root.move_focus(self.package_selection)
+
+
+    def apply_updates(self, confirmed : bool):
+        if confirmed:
+            self.apply()
+
+    def show_package_info(self):
+
+        pkg = self.package_selection.get()
+        if pkg is None:
+            return
+        if pkg in self.available_updates:
+            self.update_log(str(pkg))
+            return
+        manager = self.get_package_manager(pkg)
+        info = self.details_cache.get(self.get_details_key(manager, pkg))
+        if info is not None:
+            self.update_log(info)
+        else:
+            self.engine.submit_operation(lambda : self.show_package_info_op(manager, pkg), group=manager.name)
+
+
+    def show_package_info_op(self, manager, pkg):
+        try:
+            # Visible packages of other managers can't be fetched in the same call
+            visible_packages = [visible for visible in self.get_visible_packages() if visible.source == pkg.source]
+            self.fetch_package_details(manager, [pkg] + visible_packages)
+            self.update_log(self.details_cache.get(self.get_details_key(manager, pkg), pkg.get_info()))
+        except EXE.CommandCancelled:
+            pass
+
+
+    def get_details_key(self, manager, pkg):
+        return manager.name, pkg.name, manager.get_catalog_version()
+
+
+    def get_visible_packages(self):
+        return self.package_view.get_visible_packages()
+
+
+    def fetch_package_details(self, manager, packages):
+        missing = []
+        for pkg in packages:
+            if pkg not in missing and self.get_details_key(manager, pkg) not in self.details_cache:
+                missing.append(pkg)
+        if len(missing) > 0:
+            for name, info in manager.get_package_details(missing).items():
+                self.details_cache.put((manager.name, name, manager.get_catalog_version()), info)
+
+
+    def prefetch_visible_details(self):
+        manager = self.active_package_manager
+        packages = self.get_visible_packages()
+        self.engine.submit_operation(lambda : self.prefetch_details_op(manager, packages), group=manager.name)
+
+
+    def prefetch_details_op(self, manager, packages):
+        try:
+            self.fetch_package_details(manager, packages)
+        except EXE.CommandCancelled:
+            pass
+
+
+    def get_package_manager(self, pkg):
+        # Packages shown next to packages of other managers carry the name of the one they came from
+        if pkg.source is not None:
+            return unipkg.supported_package_managers[pkg.source]
+        return self.active_package_manager
+
+
+    def mark_package(self):
+        
+        pkg = self.package_selection.get()
+        if pkg.marked_op is not None:
+            self.marked_ops.remove(pkg.marked_op)
+            self.marked_package_list.remove_item(pkg.marked_op)
+            pkg.marked_op = None
+        elif pkg in self.available_updates:
+            pkg.marked_op = self.available_updates[pkg]
+            self.marked_ops.add(pkg.marked_op)
+            self.marked_package_list.add_item(pkg.marked_op)
+        elif pkg.installed:
+            pkg.marked_op = OPS.PackageOp(pkg, OPS.OP_UNINSTALL, self.get_package_manager(pkg))
+            self.marked_ops.add(pkg.marked_op)
+            self.marked_package_list.add_item(pkg.marked_op)
+        else:
+            pkg.marked_op = OPS.PackageOp(pkg, OPS.OP_INSTALL, self.get_package_manager(pkg))
+            self.marked_ops.add(pkg.marked_op)
+            self.marked_package_list.add_item(pkg.marked_op)
+
+
+    def select_package_manager(self) -> None:
+        # Anything still running for the previous manager is stale now, so kill it
+        self.engine.cancel_group(self.active_package_manager.name)
+        self.package_view.clear()
+        self.log_panel.clear()
+        self.active_package_manager.is_selected = False
+        self.active_package_manager = self.package_manager_selecter.get()
+        self.package_view.set_title(f'{self.active_package_manager.name} Packages')
+        # The search box text is searched again on the new manager
+        self.live_search.reset()
+        self.prepare_search()
+
+
+    def prepare_search(self) -> None:
+        manager = self.active_package_manager
+        self.engine.submit_operation(manager.prepare_search, group=manager.name)
+
+
+    def focus_search_box(self) -> None:
+        self.root.move_focus(self.search_box)
+
+
+    def on_live_search_results(self, query : str, packages) -> None:
+        with TRACE.trace_block('tui', 'render_packages', rows=len(packages)):
+            self.package_view.set_packages(self.reconcile_marked_packages(packages))
+        self.package_view.set_title(f'{self.active_package_manager.name} Packages')
+
+
+    def on_live_search_error(self, query : str, error : Exception) -> None:
+        message = error.out if isinstance(error, EXE.CommandError) else str(error)
+        self.update_log(f'Error: searching {self.active_package_manager.name} for {query} failed: {message.strip()}')
+
+
+    def ask_search_key(self) -> None:
+        self.root.show_text_box_popup('Enter a Search Key', self.search_to_install)
+
+
+    def search_to_install(self, search_key : str) -> None:
+
+        self.root.show_loading_icon_popup('Searching', f'Fetching {self.active_package_manager.name} package info')
+        self.engine.submit_operation(lambda : self.search_to_install_op(search_key), group=self.active_package_manager.name)
+
+
+
+    def search_to_install_op(self, search_key: str) -> None:
+        try:
+            self.root._logger.error(self.active_package_manager)
+            manager = self.active_package_manager
+            search_version = (manager.get_catalog_version(), manager.get_installed_version())
+            cached_rows = self.search_cache.get(manager.name, search_key, search_version)
+            if cached_rows is not None:
+                batches = [[manager.package_class(*row) for row in cached_rows]]
+            else:
+                batches = manager.stream_search_for_packages(search_key)
+
+            self.package_view.clear()
+            self.package_view.set_title(f'{manager.name} Packages')
+            found_rows = []
+            for batch in batches:
+                if len(found_rows) == 0:
+                    self.root.stop_loading_popup()
+                    if len(batch) > 0 and batch[0].version == '':
+                        self.update_log('Too many results found, skipped version number collection.')
+                self.append_package_selection_list(batch)
+                found_rows.extend((pkg.name, pkg.version, pkg.description, pkg.installed) for pkg in batch)
+            if cached_rows is None:
+                self.search_cache.put(manager.name, search_key, search_version, found_rows)
+
+            if len(found_rows) == 0:
+                self.root.stop_loading_popup()
+                self.root.show_warning_popup('No Results', f'No packages were found for search key {search_key}')
+            else:
+                self.update_log(f'Found {len(found_rows)} matching result(s)')
+                self.root.move_focus(self.package_selection)
+                self.prefetch_visible_details()
+        except EXE.CommandCancelled:
+            self.root.stop_loading_popup()
+        except EXE.CommandError as e:
+            self.root.stop_loading_popup()
+            self.root.show_error_popup('Failed to Search', f'Unable to search for packages: {e.out}')
+        except Exception as e:
+            self.root.stop_loading_popup()
+            self.root.show_error_popup('Search Failed', f'Searching for {self.active_package_manager.name} packages failed due to: {str(e)}')
+
+
+    def ask_search_everywhere_key(self) -> None:
+        self.root.show_text_box_popup('Search Every Package Manager', self.search_everywhere)
+
+
+    def search_everywhere(self, search_key : str) -> None:
+        self.root.show_loading_icon_popup('Searching', 'Searching every package manager')
+        self.engine.cancel_group('search')
+        self.engine.submit_operation(lambda : self.search_everywhere_op(search_key), group='search')
+
+
+    def search_everywhere_op(self, search_key : str) -> None:
+        try:
+            self.package_view.clear()
+            self.package_view.set_title('All Packages')
+            managers = self.package_manager_selecter.get_item_list()
+            merged, errors = SEARCH.search_all(managers, search_key, search_func=self.search_manager, on_results=self.on_search_results)
+
+            self.root.stop_loading_popup()
+            if len(merged) == 0:
+                if len(errors) > 0:
+                    self.root.show_error_popup('Failed to Search', f'Unable to search {", ".join(errors)}, see log.')
+                else:
+                    self.root.show_warning_popup('No Results', f'No packages were found for search key {search_key}')
+            else:
+                self.update_log(f'Found {len(merged)} matching result(s) across {len(managers)} package manager(s)')
+        except EXE.CommandCancelled:
+            self.root.stop_loading_popup()
+        except Exception as e:
+            self.root.stop_loading_popup()
+            self.root.show_error_popup('Search Failed', f'Searching every package manager failed due to: {str(e)}')
+
+
+    def search_manager(self, manager, search_key : str):
+        """Gets the search results of one manager, from the search cache if its state did not change
+        """
+
+        search_version = (manager.get_catalog_version(), manager.get_installed_version())
+        cached_rows = self.search_cache.get(manager.name, search_key, search_version)
+        if cached_rows is not None:
+            return [manager.package_class(*row) for row in cached_rows]
+        packages = [pkg for batch in manager.stream_search_for_packages(search_key) for pkg in batch]
+        self.search_cache.put(manager.name, search_key, search_version, [(pkg.name, pkg.version, pkg.description, pkg.installed) for pkg in packages])
+        return packages
+
+
+    def on_search_results(self, manager, merged, error):
+        # Results are shown as each manager finishes, the slowest one does not hold back the rest
+        if error is not None:
+            self.update_log(f'Error: searching {manager.name} failed: {error.strip()}')
+        elif len(merged) > 0:
+            self.root.stop_loading_popup()
+            self.update_package_selection_list(merged)
+
+
+    def update_package_selection_list(self, packages):
+        with TRACE.trace_block('tui', 'render_packages', rows=len(packages)):
+            self.package_view.set_packages(self.reconcile_marked_packages(packages))
+        self.root.move_focus(self.package_selection)
+
+
+    def append_package_selection_list(self, packages):
+        with TRACE.trace_block('tui', 'render_packages', rows=len(packages)):
+            self.package_view.append(self.reconcile_marked_packages(packages))
+
+
+    def reconcile_marked_packages(self, packages):
+        # Packages already marked are shown as the marked instance, so the op and checkbox state carry over
+        clean_packages = []
+        for pkg in packages:
+            op = self.marked_ops.get(self.get_package_manager(pkg), pkg.name)
+            if op is not None:
+                clean_packages.append(op.pkg)
+            else:
+                clean_packages.append(pkg)
+        return clean_packages
+
+
+    def list_packages(self):
+        self.root.show_loading_icon_popup('Searching', f'Locating {self.active_package_manager.name} installed packages')
+        self.engine.submit_operation(self.list_packages_op, group=self.active_package_manager.name)
+
+
+    def list_packages_op(self):
+        try:
+            self.package_view.clear()
+            self.package_view.set_title(f'{self.active_package_manager.name} Packages')
+            num_found = 0
+            for batch in self.active_package_manager.stream_list_packages():
+                if num_found == 0:
+                    self.root.stop_loading_popup()
+                self.append_package_selection_list(batch)
+                num_found += len(batch)
+            if num_found == 0:
+                self.root.stop_loading_popup()
+                self.root.show_warning_popup('No Results', 'No packages were found on local system.')
+            else:
+                self.root.move_focus(self.package_selection)
+                self.prefetch_visible_details()
+        except EXE.CommandCancelled:
+            self.root.stop_loading_popup()
+        except EXE.CommandError as e:
+            self.root.stop_loading_popup()
+            self.root.show_error_popup('Failed to Search', f'Unable to locate for packages: {e.out}')
+        except Exception as e:
+            self.root.stop_loading_popup()
+            self.root.show_error_popup('Search Failed', f'Searching for local {self.active_package_manager.name} packages failed due to: {str(e)}')
+
+
+    def apply(self):
+
+        if len(self.marked_ops) == 0:
+            self.root.show_warning_popup('No Packages Selected', 'No packages were selected for install/uninstall!')
+            return
+
+        self.root.show_loading_bar_popup('Applying...', len(self.marked_ops))
+        self.engine.submit_operation(self.apply_op, group='apply', output_listener=self.log_command_output)
+
+
+    def apply_op(self):
+        try:
+            groups = OPS.group_package_ops(list(self.marked_ops), self.active_package_manager)
+            succeeded, failed = OPS.apply_scheduled(groups, self.passwd,
+                                                    on_result=self.on_package_op_result,
+                                                    on_group_start=self.on_package_op_group_start)
+
+            for pkg_op in succeeded:
+                self.marked_ops.remove(pkg_op)
+            self.marked_package_list.clear()
+            self.marked_package_list.add_item_list(list(self.marked_ops))
+
+            self.root.stop_loading_popup()
+            if len(failed) == 0:
+                self.root.show_message_popup('Finished Applying', f'Performed {len(succeeded)} package operations succesffully.')
+                self.update_log(f'Done. {len(succeeded)} operation(s) finished without errors.')
+            else:
+                self.root.show_error_popup('Apply Failed', f'{len(failed)} of {len(succeeded) + len(failed)} package operations failed, see log.')
+        except EXE.CommandCancelled:
+            self.root.stop_loading_popup()
+        except Exception as e:
+            self.root.stop_loading_popup()
+            self.root.show_error_popup('Apply Failed', f'Applying specified packages failed due to: {str(e)}')
+
+
+    def on_package_op_group_start(self, manager, op, package_ops):
+        with self.apply_lock:
+            self.root._popup.set_title(f'{op}ing {len(package_ops)} {manager.name} package(s)...')
+
+
+    def on_package_op_result(self, pkg_op, success, out):
+        with self.apply_lock:
+            self.on_package_op_result_locked(pkg_op, success, out)
+
+
+    def on_package_op_result_locked(self, pkg_op, success, out):
+        if success:
+            if pkg_op.op == OPS.OP_INSTALL:
+                pkg_op.pkg.installed = True
+            elif pkg_op.op == OPS.OP_UNINSTALL:
+                pkg_op.pkg.installed = False
+            elif pkg_op.op == OPS.OP_UPDATE and self.available_updates.pop(pkg_op.pkg, None) is not None:
+                pkg_op.pkg.version = pkg_op.pkg.new_version
+            pkg_op.pkg.marked_op = None
+            if pkg_op.manager is not None:
+                self.update_checker.invalidate(pkg_op.manager)
+            self.update_log(f'Performed {pkg_op.op} operation on package {pkg_op.pkg.name} successfully.')
+        else:
+            self.update_log(f'Error: {pkg_op.op} operation on package {pkg_op.pkg.name} failed: {out.strip()}')
+        self.root.increment_loading_bar()
+
+
+    def update_log(self, text):
+        self.log_panel.write(text)
+
+
+    def log_command_output(self, command, line):
+        if len(line.strip()) > 0:
+            self.log_panel.write(f'    {line}')
+
+
+def start_tui(log_file : str=None) -> None:
+    root = py_cui.PyCUI(7, 7)
+    is_admin = unipkg.check_admin_status()
+    if is_admin:
+        root.set_title(f'UniPkg {unipkg.__version__} - Administrator')
+    else:
+        root.set_title(f'UniPkg {unipkg.__version__}')
+    root.toggle_unicode_borders()
+    manager = UniPkgManager(root, log_file=log_file)
+    PROFILING.mark('build widgets')
+    root.set_on_draw_update_func(manager.on_draw)
+    root.set_refresh_timeout(SCREEN_REFRESH_INTERVAL)
+    root.enable_logging()
+    root.run_on_exit(manager.shutdown)
+    root.start()
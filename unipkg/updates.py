@@ -0,0 +1,142 @@
+"""Module containing the outdated package engine behind the Update button
+
+Every manager is checked for upgradable packages concurrently. Results are kept per manager
+along with the catalog and installed state they were computed from, and only managers whose
+state changed, or whose result is older than the ttl, are checked again.
+"""
+
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import unipkg.command_handler as EXE
+import unipkg.operations as OPS
+import unipkg.packages as PKG
+
+
+# Seconds a result is reused for while the manager's state looks unchanged. Catalog versions
+# don't cover everything, ex. pip asks its index directly, so results can't be kept forever
+UPDATE_CHECK_TTL = 3600
+
+
+def create_update_ops(manager, outdated : Dict[str, Tuple[str, str, str]]) -> List[OPS.PackageOp]:
+    """Function that turns the outdated packages of a manager into update operations, sorted by name
+
+    Parameters
+    ----------
+    manager : PackageManager
+        The manager the packages belong to
+    outdated : dict of str -> (str, str, str)
+        Output of PackageManager.get_outdated_packages
+
+    Returns
+    -------
+    update_ops : list of PackageOp
+        One OP_UPDATE operation on a PKG.UpdatePackage per package
+    """
+
+    update_ops = []
+    for name in sorted(outdated, key=str.lower):
+        installed_version, new_version, description = outdated[name]
+        pkg = PKG.UpdatePackage(name, installed_version, new_version, description, manager.name)
+        update_ops.append(OPS.PackageOp(pkg, OPS.OP_UPDATE, manager))
+    return update_ops
+
+
+class UpdateChecker:
+    """Class that finds the outdated packages of several managers, reusing results for managers whose state did not change
+
+    Attributes
+    ----------
+    ttl : float
+        Seconds a result is reused for
+    """
+
+    def __init__(self, ttl : float=UPDATE_CHECK_TTL):
+        self.ttl = ttl
+        self._results = {}
+        self._lock = threading.Lock()
+
+
+    def get_state(self, manager) -> Tuple:
+        return manager.get_catalog_version(), manager.get_installed_version()
+
+
+    def get_cached(self, manager, state : Tuple) -> Optional[Dict[str, Tuple[str, str, str]]]:
+        with self._lock:
+            entry = self._results.get(manager.name)
+        if entry is None:
+            return None
+        entry_state, checked_time, outdated = entry
+        if entry_state != state or time.monotonic() - checked_time >= self.ttl:
+            return None
+        return outdated
+
+
+    def invalidate(self, manager=None) -> None:
+        """Drops the result for a manager, or for all of them, ex. after applying updates
+        """
+
+        with self._lock:
+            if manager is None:
+                self._results.clear()
+            else:
+                self._results.pop(manager.name, None)
+
+
+    def check_manager(self, manager) -> Dict[str, Tuple[str, str, str]]:
+        """Gets the outdated packages of one manager, from the last result if its state did not change
+
+        Raises EXE.CommandError if the manager can't be checked.
+
+        Returns
+        -------
+        outdated : dict of str -> (str, str, str)
+            Package name -> (installed version, newest version, description)
+        """
+
+        state = self.get_state(manager)
+        outdated = self.get_cached(manager, state)
+        if outdated is not None:
+            return outdated
+
+        outdated, out, err = manager.get_outdated_packages()
+        if outdated is None:
+            raise EXE.CommandError(out, err)
+        with self._lock:
+            self._results[manager.name] = (state, time.monotonic(), outdated)
+        return outdated
+
+
+    def check(self, managers : List, on_result : Callable[[object, Optional[Dict], Optional[str]], None]=None) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+        """Checks several managers concurrently, so the total time is that of the slowest one
+
+        Managers sharing a lock, ex. pip and pip3 installing into the same environment, manage the
+        same packages, so only the first of them is checked.
+
+        Parameters
+        ----------
+        managers : list of PackageManager
+            The managers to check
+        on_result : callable
+            Called with (manager, outdated, error) as soon as each manager is done
+
+        Returns
+        -------
+        results : dict of str -> dict
+            Manager name -> outdated packages, for every manager that could be checked
+        errors : dict of str -> str
+            Manager name -> error output, for every manager that could not
+        """
+
+        results, errors = {}, {}
+        for manager, future in OPS.iter_concurrently(self.check_manager, OPS.get_distinct_managers(managers)):
+            try:
+                results[manager.name] = future.result()
+            except EXE.CommandCancelled:
+                raise
+            except EXE.CommandError as e:
+                errors[manager.name] = e.out
+            if on_result is not None:
+                on_result(manager, results.get(manager.name), errors.get(manager.name))
+        return results, errors
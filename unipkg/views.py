@@ -0,0 +1,150 @@
+"""Module containing view helpers for the unipkg CUI
+"""
+
+import py_cui
+
+from typing import List
+
+
+class PackageListView:
+    """Class that shows an arbitrarily long package list through a py_cui checkbox menu
+
+    Only a window of window_size rows is ever materialized in the menu. When the selection is
+    about to leave the window, the window slides, so rendering and checkbox bookkeeping cost
+    O(window_size) no matter how many packages the list holds.
+
+    Attributes
+    ----------
+    menu : py_cui.widgets.CheckBoxMenu
+        The menu the window is materialized into
+    packages : list of Package
+        The full package list
+    window_start : int
+        Index in packages of the first materialized row
+    window_size : int
+        Number of rows materialized at once
+    """
+
+    def __init__(self, menu, window_size : int=500):
+        self.menu = menu
+        self.packages = []
+        self.window_start = 0
+        self.window_size = window_size
+        self.title = menu.get_title()
+
+        # User key commands run before the menu's own navigation, so the window is moved first
+        self.menu.add_key_command(py_cui.keys.KEY_UP_ARROW,   lambda : self._before_move(-1))
+        self.menu.add_key_command(py_cui.keys.KEY_DOWN_ARROW, lambda : self._before_move(1))
+        self.menu.add_key_command(py_cui.keys.KEY_PAGE_UP,    lambda : self._before_move(-self.get_page_step()))
+        self.menu.add_key_command(py_cui.keys.KEY_PAGE_DOWN,  lambda : self._before_move(self.get_page_step()))
+        self.menu.add_key_command(py_cui.keys.KEY_HOME,       self._jump_to_start)
+        self.menu.add_key_command(py_cui.keys.KEY_END,        self._jump_to_end)
+
+
+    def __len__(self) -> int:
+        return len(self.packages)
+
+
+    # py_cui 0.1.6 has no getters for the page length or the first visible row of a menu, both are only read
+
+    def get_page_step(self) -> int:
+        return getattr(self.menu, '_page_scroll_len', self.menu.get_viewport_height())
+
+
+    def get_top_view(self) -> int:
+        return getattr(self.menu, '_top_view', 0)
+
+
+    def set_title(self, title : str) -> None:
+        self.title = title
+        self._update_title()
+
+
+    def _update_title(self) -> None:
+        if len(self.packages) > self.window_size:
+            window_stop = min(self.window_start + self.window_size, len(self.packages))
+            self.menu.set_title(f'{self.title} [{self.window_start + 1}-{window_stop} of {len(self.packages)}]')
+        else:
+            self.menu.set_title(self.title)
+
+
+    def clear(self) -> None:
+        self.packages = []
+        self.window_start = 0
+        self.menu.clear()
+        self._update_title()
+
+
+    def set_packages(self, packages : List) -> None:
+        self.packages = list(packages)
+        self._materialize(0, 0)
+
+
+    def append(self, packages : List) -> None:
+        """Appends packages, only touching the menu for the rows that land inside the current window
+        """
+
+        window_stop = self.window_start + self.window_size
+        first_new = len(self.packages)
+        self.packages.extend(packages)
+        if first_new < window_stop:
+            self._add_to_menu(self.packages[first_new : window_stop])
+        self._update_title()
+
+
+    def _add_to_menu(self, packages : List) -> None:
+        self.menu.add_item_list(packages)
+        for pkg in packages:
+            if pkg.marked_op is not None:
+                if (pkg.installed and not pkg.marked_op.op == 'Uninstall') or pkg.marked_op.op == 'Install':
+                    self.menu.mark_item_as_checked(pkg)
+            elif pkg.installed:
+                self.menu.mark_item_as_checked(pkg)
+
+
+    def _materialize(self, window_start : int, selected_index : int) -> None:
+        """Fills the menu with the window starting at window_start, and selects packages[selected_index]
+
+        A cleared menu shows its first rows, so the selection has to be within a viewport of window_start,
+        unless the menu moves the view itself afterwards, as it does on Home and End.
+        """
+
+        self.window_start = max(0, window_start)
+        self.menu.clear()
+        self._add_to_menu(self.packages[self.window_start : self.window_start + self.window_size])
+        self.menu.set_selected_item_index(selected_index - self.window_start)
+        self._update_title()
+
+
+    def _before_move(self, offset : int) -> None:
+        if len(self.packages) <= self.window_size:
+            return
+        local_index = self.menu.get_selected_item_index()
+        target_local_index = local_index + offset
+        window_length = len(self.menu.get_item_list())
+        at_start = self.window_start == 0
+        at_end = self.window_start + window_length >= len(self.packages)
+        if (target_local_index < 0 and not at_start) or (target_local_index >= window_length - 1 and not at_end):
+            # Slide the window to start half a viewport above the current row, the menu then applies the move itself
+            selected_index = self.window_start + local_index
+            self._materialize(selected_index - self.menu.get_viewport_height() // 2, selected_index)
+
+
+    def _jump_to_start(self) -> None:
+        if self.window_start > 0:
+            self._materialize(0, 0)
+
+
+    def _jump_to_end(self) -> None:
+        if self.window_start + self.window_size < len(self.packages):
+            # The menu then moves the view to the last row itself
+            self._materialize(len(self.packages) - self.window_size, len(self.packages) - 1)
+
+
+    def get(self):
+        return self.menu.get()
+
+
+    def get_visible_packages(self) -> List:
+        first_visible = self.get_top_view()
+        return self.menu.get_item_list()[first_visible : first_visible + self.menu.get_viewport_height() + 1]